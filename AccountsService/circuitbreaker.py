@@ -1,83 +1,198 @@
 import time
 import logging
+import threading
 import requests
 import os
+import deadline
+import metrics
+
+# Configuration Constants
+TASK_TIMEOUT_LIMIT = 5000  # Task timeout in milliseconds
+RETRY_WINDOW = 3.5 * TASK_TIMEOUT_LIMIT  # Retry window in milliseconds (3.5 times timeout)
+FAILURE_THRESHOLD = 3  # Number of allowed failures within the retry window
+COOLDOWN_PERIOD = 10  # Cooldown period in seconds before a trial call is let through
+WINDOW_BUCKETS = 10  # Slots the retry window is split into, counting is O(WINDOW_BUCKETS) whatever the load
+HALF_OPEN_MAX_CALLS = 1  # Trial calls allowed at once while half-open
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, name):
+        super().__init__(f"Circuit breaker for {name} is open")
+        self.name = name
 
-TASK_TIMEOUT_LIMIT = 5000  
-RETRY_WINDOW = 3.5 * TASK_TIMEOUT_LIMIT  
-FAILURE_THRESHOLD = 3  
-COOLDOWN_PERIOD = 10 
 
 class CircuitBreaker:
-    def __init__(self, timeout_limit, retry_window, failure_threshold, cooldown_period):
-        self.timeout_limit = timeout_limit
-        self.retry_window = retry_window
+    """Thread-safe circuit breaker for one dependency.
+
+    Failures are counted in a ring of time buckets covering the retry window.
+    Once FAILURE_THRESHOLD of them fall in the window the circuit opens and
+    calls fail fast (or use their fallback). After the cooldown the circuit is
+    half-open: a few trial calls go through, one success closes it again and a
+    failure re-opens it for another cooldown.
+    """
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, retry_window=RETRY_WINDOW,
+                 cooldown_period=COOLDOWN_PERIOD, half_open_max_calls=HALF_OPEN_MAX_CALLS,
+                 exceptions=(Exception,), buckets=WINDOW_BUCKETS):
+        self.name = name
         self.failure_threshold = failure_threshold
         self.cooldown_period = cooldown_period
-        self.failures = 0
-        self.last_failure_time = None
-        self.circuit_open = False
-        self.failure_times = []  
-
-    def trip(self, service_name):
-        #Logs n trips circuit breaker if the failure threshold is reached
-        self.failures += 1
-        current_time = time.time()
-        self.failure_times.append(current_time)
-
-        # Remove failures outside the retry window
-        self.failure_times = [ft for ft in self.failure_times if current_time - ft <= self.retry_window]
-
-        if len(self.failure_times) >= self.failure_threshold:
-            self.circuit_open = True
-            logging.error(f"Service {service_name} has failed {self.failures} times within the retry window. Circuit breaker tripped.")
-
-    def reset(self):
-        #resets the circuit breaker after cooldown 
-        self.failures = 0
-        self.failure_times = []
-        self.circuit_open = False
-        logging.info("Circuit breaker reset. Ready to make calls again.")
+        self.half_open_max_calls = half_open_max_calls
+        self.exceptions = exceptions  # Only these count as the dependency failing
+        self.bucket_width = retry_window / 1000 / buckets  # Seconds per bucket
+        self.bucket_epochs = [-1] * buckets
+        self.bucket_failures = [0] * buckets
+        self.state = CLOSED
+        self.opened_at = None
+        self.trial_calls = 0
+        self.lock = threading.Lock()
+
+    def _failures_in_window(self, epoch):
+        buckets = len(self.bucket_epochs)
+        return sum(failures for bucket_epoch, failures in zip(self.bucket_epochs, self.bucket_failures)
+                   if epoch - bucket_epoch < buckets)
+
+    def _set_state(self, state):
+        self.state = state
+        metrics.set_breaker_state(self.name, state != CLOSED)
+
+    def allow_request(self):
+        """True if a call may go through now. Moves an open circuit to half-open after the cooldown."""
+        with self.lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown_period:
+                    return False
+                self._set_state(HALF_OPEN)
+                self.trial_calls = 0
+                logging.info(f"Circuit breaker for {self.name} is half-open, letting a trial call through.")
+            if self.state == HALF_OPEN:
+                if self.trial_calls >= self.half_open_max_calls:
+                    return False
+                self.trial_calls += 1
+            return True
+
+    def record_success(self):
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.bucket_epochs = [-1] * len(self.bucket_epochs)
+                self.bucket_failures = [0] * len(self.bucket_failures)
+                self._set_state(CLOSED)
+                logging.info(f"Circuit breaker for {self.name} reset. Ready to make calls again.")
+
+    def release_trial(self):
+        """Give back a half-open trial slot whose call ended without a verdict, leaving the state as it is."""
+        with self.lock:
+            if self.state == HALF_OPEN and self.trial_calls:
+                self.trial_calls -= 1
+
+    def record_failure(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self.opened_at = now
+                self._set_state(OPEN)
+                logging.error(f"Trial call to {self.name} failed. Circuit breaker tripped again.")
+                return
+
+            epoch = int(now / self.bucket_width)
+            index = epoch % len(self.bucket_epochs)
+            if self.bucket_epochs[index] != epoch:
+                self.bucket_epochs[index] = epoch
+                self.bucket_failures[index] = 0
+            self.bucket_failures[index] += 1
+
+            failures = self._failures_in_window(epoch)
+            if self.state == CLOSED and failures >= self.failure_threshold:
+                self.opened_at = now
+                self._set_state(OPEN)
+                logging.error(f"Service {self.name} has failed {failures} times within the retry window. Circuit breaker tripped.")
 
     def is_open(self):
-        #Checks if the circuit is open 
-        if self.circuit_open:
-            if time.time() - self.failure_times[0] >= self.cooldown_period:
-                self.reset()
-            else:
-                return True
-        return False
-
-    def call_service(self, service_name, service_url):
-        #Makes the service call and handles failure and retries.
-        if self.is_open():
-            logging.warning(f"Circuit breaker is open for service {service_name}. Skipping service call.")
-            return None
+        """Checks if calls are currently being refused (open, or half-open with its trial in flight)."""
+        with self.lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at < self.cooldown_period
+            return self.state == HALF_OPEN and self.trial_calls >= self.half_open_max_calls
+
+    def call(self, func, *args, fallback=None, **kwargs):
+        """Run func through the breaker.
 
+        When the circuit is open, or func raises one of the breaker's exceptions,
+        fallback() is returned if given; otherwise CircuitOpenError (or the
+        original error) is raised. A request whose deadline has passed gets
+        DeadlineExceeded without calling func or its fallback.
+        """
+        deadline.check()
+        if not self.allow_request():
+            if fallback is not None:
+                return fallback()
+            raise CircuitOpenError(self.name)
         try:
-            # Try to make the service call
-            response = requests.get(service_url, timeout=self.timeout_limit / 1000)  # Convert timeout to seconds
-            if response.status_code == 200:
-                logging.info(f"Service {service_name} call successful.")
-                return response
-            else:
-                logging.error(f"Service {service_name} responded with {response.status_code}.")
-                self.trip(service_name)
-                return None
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Service {service_name} failed due to error: {e}")
-            self.trip(service_name)
-            return None
+            result = func(*args, **kwargs)
+        except self.exceptions as e:
+            self.record_failure()
+            if fallback is not None:
+                logging.warning(f"Call to {self.name} failed ({e}), using fallback.")
+                return fallback()
+            raise
+        except BaseException:
+            # Anything else (a spent deadline, a bug in the caller) says nothing about the dependency either way
+            self.release_trial()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "state": self.state,
+                "failures_in_window": self._failures_in_window(int(time.monotonic() / self.bucket_width)),
+                "failure_threshold": self.failure_threshold,
+                "open_for_seconds": round(time.monotonic() - self.opened_at, 3) if self.state != CLOSED else 0
+            }
+
+
+_breakers = {}  # dependency name -> CircuitBreaker, shared by every thread in the process
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name, **settings):
+    """The process-wide breaker for a dependency; settings only apply when it is first created."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **settings)
+            metrics.set_breaker_state(name, False)
+        return breaker
+
+
+def breaker_states():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
 
+    # Retrieve service name and URL from environment variables
     service_name = os.getenv('SERVICE_NAME', 'game-service')  # Default to 'game-service'
     service_port = os.getenv('SERVICE_PORT', '8080')  # Default to '8080'
     service_url = f"http://{service_name}:{service_port}/status"  # Construct URL
 
-    breaker = CircuitBreaker(TASK_TIMEOUT_LIMIT, RETRY_WINDOW, FAILURE_THRESHOLD, COOLDOWN_PERIOD)
+    breaker = get_breaker(service_name, exceptions=(requests.exceptions.RequestException,))
 
+    # Simulating service calls
     for _ in range(5):
-        breaker.call_service(service_name, service_url)
+        try:
+            response = breaker.call(requests.get, service_url, timeout=TASK_TIMEOUT_LIMIT / 1000)
+            logging.info(f"Service {service_name} responded with {response.status_code}.")
+        except (CircuitOpenError, requests.exceptions.RequestException) as e:
+            logging.error(f"Service {service_name} call failed: {e}")
         time.sleep(2)  # Simulating time between service calls
@@ -0,0 +1,117 @@
+import os
+import hmac
+import base64
+import hashlib
+import secrets
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+import deadline
+
+# Configuration Constants
+HASH_ALGORITHM = 'pbkdf2_sha256'
+HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', '200000'))  # Cost factor, raise as hardware gets faster
+SALT_BYTES = 16
+HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 1)))  # Hashing processes per worker
+MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', str(HASH_WORKERS * 8)))  # Queued derivations before 503
+HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))  # Seconds a request waits for its derivation
+
+
+class CredentialsBusy(Exception):
+    """Raised when too many hash derivations are already queued."""
+
+
+def _derive(password, salt, iterations):
+    # Runs in the worker processes, keep it a plain module-level function so it pickles
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+
+
+def _encode(salt, iterations, derived):
+    return "$".join([HASH_ALGORITHM, str(iterations),
+                     base64.b64encode(salt).decode('ascii'), base64.b64encode(derived).decode('ascii')])
+
+
+class CredentialHasher:
+    """Salted PBKDF2 hashing, derived in a bounded process pool.
+
+    Request threads only wait on a future, so a login storm queues up in the
+    pool instead of pinning every web worker on key derivation. Once MAX_PENDING
+    derivations are waiting, new ones fail fast with CredentialsBusy.
+    """
+
+    def __init__(self, iterations=HASH_ITERATIONS, workers=HASH_WORKERS, max_pending=MAX_PENDING):
+        self.iterations = iterations
+        self.workers = workers
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        # Looks like a real hash at the current cost but matches no password, see verify_missing()
+        self.dummy_hash = _encode(secrets.token_bytes(SALT_BYTES), iterations, secrets.token_bytes(32))
+
+    def _get_pool(self):
+        # A pool is only valid in the process that created it (gunicorn forks workers after import)
+        with self.lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                context = multiprocessing.get_context('forkserver')
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self, password, salt, iterations):
+        if not self.slots.acquire(blocking=False):
+            raise CredentialsBusy("Too many logins in progress, try again shortly")
+        try:
+            timeout = deadline.cap(HASH_TIMEOUT)
+            future = self._get_pool().submit(_derive, password, salt, iterations)
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()  # Still queued means nobody is waiting for it any more
+            deadline.check()
+            raise
+        except BrokenProcessPool:
+            with self.lock:
+                self._pool = None  # A worker died, start a fresh pool on the next call
+            raise
+        finally:
+            self.slots.release()
+
+    def hash_password(self, password):
+        salt = secrets.token_bytes(SALT_BYTES)
+        return _encode(salt, self.iterations, self._run(password, salt, self.iterations))
+
+    def verify_password(self, password, stored):
+        """Check a password. Returns (matches, needs_rehash).
+
+        Rows written before hashing existed hold the plaintext password; they
+        match by constant-time comparison and are flagged for an upgrade, as are
+        hashes made with a lower cost than the current setting.
+        """
+        if not stored.startswith(HASH_ALGORITHM + "$"):
+            return hmac.compare_digest(stored.encode('utf-8'), password.encode('utf-8')), True
+
+        _, iterations, salt, expected = stored.split("$")
+        iterations = int(iterations)
+        derived = self._run(password, base64.b64decode(salt), iterations)
+        matches = hmac.compare_digest(derived, base64.b64decode(expected))
+        return matches, matches and iterations < self.iterations
+
+    def verify_missing(self, password):
+        """Spend what verify_password would on a login for a name that does not exist. Always False.
+
+        Answering such logins straight away would tell a caller which names
+        are registered, from the response time alone.
+        """
+        self.verify_password(password, self.dummy_hash)
+        return False
+
+    def shutdown(self):
+        with self.lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+hasher = CredentialHasher()
@@ -0,0 +1,126 @@
+# deadline.py
+import time
+import sqlite3
+import contextvars
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Configuration Constants
+DEADLINE_HEADER = 'X-Request-Budget-Ms'  # Milliseconds the caller is still prepared to wait
+PROGRESS_STEPS = 10_000  # SQLite VM instructions between deadline checks inside one statement
+BUSY_TIMEOUT_STEP_MS = 100  # busy_timeout is shortened in steps of this, not re-set before every statement
+
+_deadline = contextvars.ContextVar('request_deadline', default=None)  # time.monotonic() value, or None
+_sqlite_limited = False
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget is spent; the work is abandoned instead of finished late."""
+
+    def __init__(self, message="Request deadline exceeded"):
+        super().__init__(message)
+
+
+def start(headers, budget):
+    """Set the deadline of the current request. Returns the budget in seconds, or None if unlimited.
+
+    budget is the route's own limit in seconds (None for none). A caller's
+    DEADLINE_HEADER can only shorten it, so a budget handed down by an
+    upstream service is honoured all the way through.
+    """
+    value = headers.get(DEADLINE_HEADER)
+    if value is not None:
+        try:
+            caller_budget = max(0, int(value)) / 1000
+        except ValueError:
+            caller_budget = None
+        if caller_budget is not None:
+            budget = caller_budget if budget is None else min(budget, caller_budget)
+    _deadline.set(None if budget is None else time.monotonic() + budget)
+    return budget
+
+
+def clear():
+    _deadline.set(None)
+
+
+def remaining():
+    """Seconds left before the deadline (negative once passed), or None outside a deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check():
+    """Raise DeadlineExceeded if the current deadline has passed."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+
+
+def cap(timeout):
+    """timeout (seconds, None for none) shortened to the budget that is left. Raises once nothing is left."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded()
+    return left if timeout is None else min(timeout, left)
+
+
+def outgoing_headers():
+    """Headers passing the remaining budget on to the service being called."""
+    left = remaining()
+    return {} if left is None else {DEADLINE_HEADER: str(max(0, int(left * 1000)))}
+
+
+def _expired():
+    deadline = _deadline.get()
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def limit_sqlite(busy_timeout_ms):
+    """Bound every SQLite statement run under a deadline by the time left.
+
+    Statements are refused once the budget is spent, waits for the write
+    lock are capped by PRAGMA busy_timeout, and a progress handler interrupts
+    a statement that is still running when the deadline passes. Work outside
+    a request (migrations, the live-state flusher) keeps busy_timeout_ms and
+    is never interrupted.
+    """
+    global _sqlite_limited
+    if _sqlite_limited:
+        return
+    _sqlite_limited = True
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _limit_statement(conn, cursor, statement, parameters, context, executemany):
+        dbapi_connection = conn.connection.driver_connection
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        info = conn.connection.info
+        if 'busy_timeout_ms' not in info:
+            dbapi_connection.set_progress_handler(_expired, PROGRESS_STEPS)
+            info['busy_timeout_ms'] = busy_timeout_ms
+        left = remaining()
+        if left is None:
+            wanted = busy_timeout_ms
+        elif left <= 0:
+            raise DeadlineExceeded()
+        else:
+            wanted = min(busy_timeout_ms, max(1, int(left * 1000) // BUSY_TIMEOUT_STEP_MS * BUSY_TIMEOUT_STEP_MS))
+        if info['busy_timeout_ms'] != wanted:
+            dbapi_connection.execute(f"PRAGMA busy_timeout = {wanted}")
+            info['busy_timeout_ms'] = wanted
+
+    @event.listens_for(Engine, 'handle_error')
+    def _interrupted(context):
+        error = context.original_exception
+        if not isinstance(error, sqlite3.OperationalError):
+            return None
+        if str(error) == 'interrupted' and _expired():
+            return DeadlineExceeded()
+        if str(error) == 'database is locked' and context.connection is not None:
+            # Only a deadline shortens the lock wait, so giving up early is the deadline's doing
+            if context.connection.connection.info.get('busy_timeout_ms', busy_timeout_ms) < busy_timeout_ms:
+                return DeadlineExceeded()
+        return None
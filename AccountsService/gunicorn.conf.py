@@ -0,0 +1,50 @@
+# gunicorn.conf.py -- production server for create_app()
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# create_app() runs once in the master (preload_app), so discovery registration
+# and migrations happen once per container. Workers are forked afterwards and
+# reset every connection they inherited in post_fork.
+import os
+import shutil
+import multiprocessing
+
+SERVICE_PORT = os.getenv('SERVICE_PORT', '5001')
+
+bind = f"0.0.0.0:{SERVICE_PORT}"
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')  # or gevent/eventlet for cooperative workers
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))  # Seconds to hold idle gateway connections open
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '15'))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+preload_app = True
+
+# Every worker starts its own password hashing pool (credentials.py). Split the cores
+# between them, so a container runs about one hashing process per core, not workers * cores.
+os.environ.setdefault('PASSWORD_HASH_WORKERS', str(max(1, multiprocessing.cpu_count() // workers)))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')  # e.g. "-" for stdout, off by default
+
+# Prometheus needs a shared directory to merge samples from all workers; it has to
+# be set before the app (and prometheus_client) is imported and start out empty.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus_multiproc')
+shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def post_fork(server, worker):
+    from wsgi import app
+    from models.database import db
+    from server import redis_client
+
+    # Connections opened by the master must not be shared with the children
+    with app.app_context():
+        db.engine.dispose(close=False)
+    redis_client.connection_pool.reset()
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.mark_process_dead(worker.pid)
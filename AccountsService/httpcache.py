@@ -0,0 +1,78 @@
+# httpcache.py
+import os
+import hashlib
+import logging
+import redis
+from flask import current_app, request
+from circuitbreaker import CircuitOpenError
+
+# Configuration Constants
+VERSION_TTL = int(os.getenv('RESOURCE_VERSION_TTL', '3600'))  # Seconds a version outlives its last change
+
+
+class ResourceVersions:
+    """Version tokens in Redis, replaced on every change to a resource, for ETags.
+
+    A token is random rather than a counter: a version that expired or was
+    evicted comes back as a new token, never as one a client saw before, so
+    an old ETag can only stop matching. Read the version before the resource
+    and bump it after the change commits; a response is then never tagged
+    newer than its body.
+    """
+
+    def __init__(self, redis_conn, breaker, key, ttl=VERSION_TTL):
+        self.redis = redis_conn
+        self.breaker = breaker
+        self.key = key  # e.g. "game_version:{id}"
+        self.ttl = ttl or None
+
+    def current(self, resource_id=''):
+        """The resource's version, starting one if it has none. None while Redis is unavailable."""
+        key = self.key.format(id=resource_id)
+        try:
+            version = self.breaker.call(self.redis.get, key)
+            if version is None:
+                self.breaker.call(self.redis.set, key, os.urandom(8).hex(), ex=self.ttl, nx=True)
+                version = self.breaker.call(self.redis.get, key)
+        except (redis.exceptions.RedisError, CircuitOpenError) as e:
+            logging.debug(f"No version for {key}: {e}")
+            return None
+        return version
+
+    def bump(self, resource_id=''):
+        """Give the resource a new version, so every ETag handed out for it stops matching."""
+        key = self.key.format(id=resource_id)
+        try:
+            self.breaker.call(self.redis.set, key, os.urandom(8).hex(), ex=self.ttl)
+        except (redis.exceptions.RedisError, CircuitOpenError) as e:
+            # Clients holding the old ETag may see 304s until the version expires
+            logging.error(f"Could not bump {key}: {e}")
+
+    def etag(self, resource_id='', *parts):
+        """Weak ETag for the resource's current version (plus any parts of the URL it depends on), or None."""
+        version = self.current(resource_id)
+        if version is None:
+            return None
+        return "-".join(str(part) for part in (self.key.split(':')[0], resource_id, *parts, version) if part != '')
+
+
+def content_etag(*parts):
+    """Weak ETag derived from the content itself, for small resources already at hand in a cache."""
+    return hashlib.blake2b("\x1f".join(str(part) for part in parts).encode(), digest_size=8).hexdigest()
+
+
+def not_modified(etag):
+    """A 304 if the request's If-None-Match already holds etag, else None."""
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def tagged(rv, etag):
+    """The view result rv as a response carrying etag, if it is a 200."""
+    response = current_app.make_response(rv)
+    if etag is not None and response.status_code == 200:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,138 @@
+# idempotency.py
+import os
+import json
+import time
+import hashlib
+import logging
+import functools
+import redis
+from flask import current_app, jsonify, request
+from circuitbreaker import CircuitOpenError
+import deadline
+
+# Configuration Constants
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+RESULT_TTL = int(os.getenv('IDEMPOTENCY_TTL', '600'))  # Seconds a response is kept for replay
+PENDING_TTL_MS = 60_000  # A claim whose request died without finishing is dropped after this
+MAX_WAIT = 10  # Seconds a duplicate waits for the first request (less if its deadline is sooner)
+POLL_INTERVAL = 0.05  # Seconds between checks while waiting
+MAX_KEY_LENGTH = 255
+KEPT_HEADERS = ('Retry-After', 'Location')  # Response headers replayed along with status and body
+
+IDEMPOTENCY_KEY = "idempotency:{endpoint}:{key}"  # Hash with fingerprint, state, owner, response
+
+# Returns nil if this request now owns the key, else {fingerprint, state, response}
+CLAIM_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  return redis.call('HMGET', KEYS[1], 'fingerprint', 'state', 'response')
+end
+redis.call('HSET', KEYS[1], 'fingerprint', ARGV[1], 'state', 'pending', 'owner', ARGV[2])
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+return false
+"""
+
+# Stores the response (or drops the claim when ARGV[2] is empty), if ARGV[1] still owns the key
+FINISH_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'owner') ~= ARGV[1] then
+  return 0
+end
+if ARGV[2] == '' then
+  redis.call('DEL', KEYS[1])
+  return 1
+end
+redis.call('HSET', KEYS[1], 'state', 'done', 'response', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class IdempotencyStore:
+    """Runs a POST once per Idempotency-Key and replays its response to every retry.
+
+    The first request with a key claims it in Redis and stores its response
+    when done. A duplicate arriving meanwhile waits for that response rather
+    than running the view again; one arriving later gets it straight away.
+    Responses of 500 and above are not stored, so the retry runs for real.
+    Without Redis the views run as if no key had been sent.
+    """
+
+    def __init__(self, redis_conn, breaker, result_ttl=RESULT_TTL):
+        self.redis = redis_conn
+        self.breaker = breaker
+        self.result_ttl = result_ttl
+        self.claim_script = self.redis.register_script(CLAIM_SCRIPT)
+        self.finish_script = self.redis.register_script(FINISH_SCRIPT)
+
+    def idempotent(self, view):
+        """Decorator for a view that should honour the Idempotency-Key header."""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if key is None:
+                return view(*args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return jsonify({"error": f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters."}), 400
+
+            redis_key = IDEMPOTENCY_KEY.format(endpoint=request.endpoint, key=key)
+            fingerprint = hashlib.sha256(
+                b"\n".join([request.method.encode(), request.full_path.encode(), request.get_data()])
+            ).hexdigest()
+            owner = os.urandom(8).hex()
+            give_up = time.monotonic() + deadline.cap(MAX_WAIT)
+            while True:
+                try:
+                    existing = self.breaker.call(self.claim_script, keys=[redis_key],
+                                                 args=[fingerprint, owner, PENDING_TTL_MS])
+                except (redis.exceptions.RedisError, CircuitOpenError) as e:
+                    logging.warning(f"Idempotency check skipped, Redis unavailable: {e}")
+                    return view(*args, **kwargs)
+                if not existing:
+                    return self._run(view, args, kwargs, redis_key, owner)
+
+                stored_fingerprint, state, stored = existing
+                if stored_fingerprint != fingerprint:
+                    return jsonify({"error": f"{IDEMPOTENCY_HEADER} already used for a different request."}), 422
+                if state == 'done':
+                    return self._replay(json.loads(stored))
+                # The first request is still running. If it fails its claim is dropped and this one takes over
+                if time.monotonic() >= give_up:
+                    deadline.check()
+                    return jsonify({"error": f"A request with this {IDEMPOTENCY_HEADER} is still in progress."}), \
+                        409, {'Retry-After': '1'}
+                time.sleep(POLL_INTERVAL)
+
+        return wrapper
+
+    def _run(self, view, args, kwargs, redis_key, owner):
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except BaseException:
+            self._finish(redis_key, owner, '')
+            raise
+        self._finish(redis_key, owner, '' if response.status_code >= 500 else json.dumps({
+            "status": response.status_code,
+            "body": response.get_data(as_text=True),
+            "mimetype": response.mimetype,
+            "headers": {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+        }))
+        return response
+
+    def _finish(self, redis_key, owner, stored):
+        """Store the response for replay, or with stored='' drop the claim so a retry runs the view.
+
+        Called directly rather than through the breaker: the work is done, so
+        recording it must not be skipped because the request's deadline passed.
+        """
+        try:
+            self.finish_script(keys=[redis_key], args=[owner, stored, self.result_ttl])
+        except redis.exceptions.RedisError as e:
+            # Duplicates keep waiting (then get 409) until the claim expires after PENDING_TTL_MS
+            logging.error(f"Could not record the result for {redis_key}: {e}")
+
+    @staticmethod
+    def _replay(stored):
+        response = current_app.response_class(stored["body"], status=stored["status"],
+                                              mimetype=stored["mimetype"], headers=stored["headers"])
+        response.headers[REPLAYED_HEADER] = 'true'
+        return response
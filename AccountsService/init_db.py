@@ -1,12 +1,13 @@
 # init_db.py
 from app import create_app, db, User
+from credentials import hasher
 def init_database():
     app = create_app()
     with app.app_context():
     # Create the database tables
         db.create_all()
         # Initialize the database with sample data (optional)
-        sample_user = User(name="andreea", password="test")
+        sample_user = User(name="andreea", password=hasher.hash_password("test"))
         db.session.add(sample_user)
         db.session.commit()
 if __name__ == "__main__":
@@ -0,0 +1,102 @@
+import os
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+# When the app runs with several worker processes, each one writes its samples to
+# PROMETHEUS_MULTIPROC_DIR and /metrics merges them, so whichever worker answers
+# the scrape reports totals for the whole container.
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency per route',
+    ['method', 'endpoint', 'status'])
+IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Requests currently being processed',
+    multiprocess_mode='livesum')
+DB_QUERY_LATENCY = Histogram(
+    'db_query_duration_seconds', 'Latency of single SQLAlchemy queries',
+    ['operation'], buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1))
+DB_QUERIES_PER_REQUEST = Histogram(
+    'db_queries_per_request', 'SQLAlchemy queries issued by one request',
+    ['endpoint'], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50))
+DB_TIME_PER_REQUEST = Histogram(
+    'db_time_per_request_seconds', 'Time one request spent in SQLAlchemy queries',
+    ['endpoint'])
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Redis cache lookups by result',
+    ['cache', 'result'])
+CIRCUIT_BREAKER_OPEN = Gauge(
+    'circuit_breaker_open', '1 while the circuit breaker for a dependency is open',
+    ['service'], multiprocess_mode='livemax')  # An exited worker's last state is dropped
+
+
+def endpoint_label():
+    """Route pattern (not the raw path) so ids do not explode the label set."""
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def request_started():
+    IN_FLIGHT.inc()
+    g.metrics_in_flight = True
+    g.db_queries = 0
+    g.db_time = 0.0
+
+
+def request_finished(response, elapsed_time):
+    endpoint = endpoint_label()
+    REQUEST_LATENCY.labels(request.method, endpoint, response.status_code).observe(elapsed_time)
+    DB_QUERIES_PER_REQUEST.labels(endpoint).observe(g.get('db_queries', 0))
+    DB_TIME_PER_REQUEST.labels(endpoint).observe(g.get('db_time', 0.0))
+
+
+def request_torn_down():
+    # teardown runs even when a view raised, so the gauge never leaks
+    if g.pop('metrics_in_flight', False):
+        IN_FLIGHT.dec()
+
+
+def cache_hit(cache, count=1):
+    CACHE_REQUESTS.labels(cache, 'hit').inc(count)
+
+
+def cache_miss(cache, count=1):
+    CACHE_REQUESTS.labels(cache, 'miss').inc(count)
+
+
+def set_breaker_state(service, is_open):
+    CIRCUIT_BREAKER_OPEN.labels(service).set(1 if is_open else 0)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own context: a statement that fails (or that a later listener refuses)
+    # never reaches after_cursor_execute, and must not leave anything on the pooled connection
+    context._query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    DB_QUERY_LATENCY.labels(statement.lstrip().split(' ', 1)[0].upper()).observe(elapsed)
+    if has_request_context():
+        g.db_queries = g.get('db_queries', 0) + 1
+        g.db_time = g.get('db_time', 0.0) + elapsed
+
+
+def render():
+    """Body and content type for the /metrics endpoint."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Call from the WSGI server when a worker exits so its live gauges are dropped."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
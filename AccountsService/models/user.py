@@ -3,7 +3,7 @@ from models.database import db
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    password = db.Column(db.String(100), nullable=False)
+    password = db.Column(db.String(255), nullable=False)  # pbkdf2_sha256$<iterations>$<salt>$<hash>
     def __init__(self, name, password):
         self.name = name
         self.password = password
\ No newline at end of file
@@ -0,0 +1,79 @@
+# responses.py
+import os
+import gzip
+import zlib
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional, the stdlib encoder is used without it
+    orjson = None
+
+# Configuration Constants
+FAST_JSON = os.getenv('FAST_JSON', '1') == '1'  # Use orjson for JSON bodies when it is installed
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))  # Smaller bodies are sent as they are
+COMPRESS_LEVEL = 5  # gzip level, most of level 9's saving at a fraction of the CPU
+COMPRESSIBLE_TYPES = ('application/json', 'text/plain', 'text/html')
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's JSON provider backed by orjson. Output matches the default one: sorted keys, compact."""
+
+    # Dates go through Flask's default() like they do without orjson
+    option = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self.option | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def _gzip_stream(chunks):
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response):
+    """gzip a response the client accepts it for, when it is worth it.
+
+    Streamed bodies are compressed as they are produced; others only once
+    they reach COMPRESS_MIN_BYTES.
+    """
+    if (response.status_code != 200 or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES
+            or 'gzip' not in request.accept_encodings):
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.is_streamed:
+        response.response = _gzip_stream(response.response)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_BYTES:
+            return response
+        response.set_data(gzip.compress(body, COMPRESS_LEVEL, mtime=0))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def init_responses(app):
+    """Use orjson for the app's JSON if available and gzip what it sends."""
+    if FAST_JSON and orjson is not None:
+        app.json = OrjsonProvider(app)
+    app.after_request(compress_response)
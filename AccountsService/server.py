@@ -1,15 +1,49 @@
 # server.py
-from flask import request, jsonify
+from flask import Response, request, jsonify, stream_with_context
+from sqlalchemy import select
 from models.database import db
 from models.user import User
 import redis
-import json
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+import os
+import deadline
+import tracing
+import metrics
+from concurrent.futures import TimeoutError as HashTimeout
+from credentials import hasher, CredentialsBusy
+from usercache import UserCache
+from circuitbreaker import CircuitOpenError, breaker_states, get_breaker
+from idempotency import IdempotencyStore
+from httpcache import ResourceVersions, content_etag, not_modified, tagged
 
-redis_client = redis.StrictRedis(host='redis', port=6379, db=0, decode_responses=True)
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', '1.0'))  # Seconds a connect or reply may take
+
+# No retries inside redis-py, so a call against a dead Redis costs at most REDIS_SOCKET_TIMEOUT
+# and the breaker alone decides when to try again
+redis_client = tracing.trace_redis(redis.StrictRedis(  # Commands run for a sampled request become spans
+    host='redis', port=6379, db=0, decode_responses=True, retry=Retry(NoBackoff(), 0),
+    socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_SOCKET_TIMEOUT))
+redis_breaker = get_breaker('redis', exceptions=(redis.exceptions.RedisError,))
+user_cache = UserCache(redis_client)  # Local LRU in front of the user:{id} entries in Redis
+idempotency = IdempotencyStore(redis_client, redis_breaker)  # Idempotency-Key handling for register and login
 
 import time
 
-REQUEST_TIMEOUT = 100
+REQUEST_TIMEOUT = 100  # Seconds of budget for a request, unless its route or the caller sets less
+ROUTE_BUDGETS = {  # endpoint -> seconds, for the lookups other services make while serving their own requests
+    'get_user_info': 2,
+    'lookup_users': 2,
+}
+USERS_PAGE_SIZE = 50  # Default page size for GET /api/users?after=
+MAX_USERS_PAGE_SIZE = 500
+USERS_CACHE_TTL = 300
+MAX_LOOKUP_IDS = 500  # Most ids accepted by POST /api/users/lookup
+USERS_VERSION_KEY = "users_version"  # Replaced on every register/delete, part of every page's ETag and cache key
+
+# Bumping it invalidates every cached user page and list ETag at once; pages cached under
+# an old version expire on their own after USERS_CACHE_TTL
+users_version = ResourceVersions(redis_client, redis_breaker, USERS_VERSION_KEY, ttl=0)
 
 
 def register_routes(app):
@@ -17,57 +51,95 @@ def register_routes(app):
     def start_timer():
         """Start the timer before each request."""
         request.start_time = time.time()
+        tracing.start_request(request.headers, f"{request.method} {metrics.endpoint_label()}")
+        metrics.request_started()
+        deadline.start(request.headers, ROUTE_BUDGETS.get(request.endpoint, REQUEST_TIMEOUT))
+        deadline.check()  # The caller's budget may already be spent
 
     @app.after_request
-    def check_timeout(response):
-        """Check if the request processing exceeded the timeout."""
-        elapsed_time = time.time() - request.start_time
-        if elapsed_time > REQUEST_TIMEOUT:
-            response.status_code = 408
-            response.data = json.dumps({"error": "Request timed out"})
-            response.headers['Content-Type'] = 'application/json'
-        return response
+    def record_request(response):
+        metrics.request_finished(response, time.time() - request.start_time)
+        return tracing.tag_response(response)
+
+    @app.errorhandler(deadline.DeadlineExceeded)
+    def deadline_exceeded(e):
+        """The request's budget ran out on the way; stop rather than answer after the caller gave up."""
+        return jsonify({"error": str(e)}), 504
+
+    @app.teardown_request
+    def finish_request(exc):
+        metrics.request_torn_down()
+        deadline.clear()
+        tracing.end_request(exc)
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        body, content_type = metrics.render()
+        return Response(body, mimetype=content_type)
     
     @app.route('/api/users', methods=['POST'])
+    @idempotency.idempotent
     def register_user():
         try:
             data = request.get_json()
             name = data['name']
             password = data['password']
+            if not isinstance(name, str) or not isinstance(password, str):
+                return jsonify({"error": "Invalid request data"}), 400
             existing_user = User.query.filter_by(name=name).first()
             if existing_user:
                 return jsonify({"error": "User already exists"}), 400
-            user = User(name=name, password=password)
+            user = User(name=name, password=hasher.hash_password(password))
             db.session.add(user)
             db.session.commit()
+            users_version.bump()
             return jsonify({"message": "User registered successfully"}), 201
         except KeyError:
             return jsonify({"error": "Invalid request data"}), 400
+        except (CredentialsBusy, HashTimeout):
+            return jsonify({"error": "Too many requests in progress, try again shortly"}), 503, {"Retry-After": "1"}
+        except deadline.DeadlineExceeded:
+            raise
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
     @app.route('/api/users/login', methods=['POST'])
+    @idempotency.idempotent
     def login_user():
         try:
             data = request.get_json()
             name = data['name']
             password = data['password']
+            if not isinstance(name, str) or not isinstance(password, str):
+                return jsonify({"error": "Invalid request data"}), 400
             user = User.query.filter_by(name=name).first()
-            if user and user.password == password:
-                return jsonify({"message": "Login successful", "user_id": user.id}), 200
-            else:
+            if not user:
+                hasher.verify_missing(password)  # As slow as a wrong password, so names cannot be probed
                 return jsonify({"error": "Invalid credentials"}), 401
+            matches, needs_rehash = hasher.verify_password(password, user.password)
+            if not matches:
+                return jsonify({"error": "Invalid credentials"}), 401
+            if needs_rehash:
+                # Plaintext rows (and hashes below the current cost) are upgraded on their next login
+                user.password = hasher.hash_password(password)
+                db.session.commit()
+            return jsonify({"message": "Login successful", "user_id": user.id}), 200
         except KeyError:
             return jsonify({"error": "Invalid request data"}), 400
+        except (CredentialsBusy, HashTimeout):
+            return jsonify({"error": "Too many requests in progress, try again shortly"}), 503, {"Retry-After": "1"}
+        except deadline.DeadlineExceeded:
+            raise
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
     @app.route('/api/users/<int:user_id>', methods=['GET'])
     def get_user_info(user_id):
+        """A user's id and name. The ETag is a digest of those, so a cached user answers 304 without SQLite."""
         try:
-            cached_user = redis_client.get(f"user:{user_id}")
+            cached_user = user_cache.get(user_id)
             if cached_user:
-                return jsonify(json.loads(cached_user)), 200  
+                return user_info_response(cached_user)
 
             user = User.query.get(user_id)
             if user:
@@ -75,10 +147,46 @@ def register_routes(app):
                     "id": user.id,
                     "name": user.name
                 }
-                redis_client.setex(f"user:{user_id}", 300, json.dumps(user_info))  
-                return jsonify(user_info), 200
+                user_cache.set(user_info)
+                return user_info_response(user_info)
             else:
                 return jsonify({"error": "User not found"}), 404
+        except deadline.DeadlineExceeded:
+            raise
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    def user_info_response(user_info):
+        etag = content_etag(user_info["id"], user_info["name"])
+        return not_modified(etag) or tagged(jsonify(user_info), etag)
+
+    @app.route('/api/users/lookup', methods=['POST'])
+    def lookup_users():
+        """Resolve many user ids at once: local cache, then one Redis MGET, then one SQL query for the misses."""
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids')
+        if not isinstance(ids, list) or not all(isinstance(user_id, int) for user_id in ids):
+            return jsonify({"error": "Expected {\"ids\": [<int>, ...]}"}), 400
+        if len(ids) > MAX_LOOKUP_IDS:
+            return jsonify({"error": f"At most {MAX_LOOKUP_IDS} ids per lookup"}), 400
+
+        ids = list(dict.fromkeys(ids))  # Drop duplicates, keep request order
+        try:
+            found = user_cache.get_many(ids)
+            missing = [user_id for user_id in ids if user_id not in found]
+
+            if missing:
+                rows = db.session.execute(select(User.id, User.name).where(User.id.in_(missing))).all()
+                loaded = [{"id": row.id, "name": row.name} for row in rows]
+                found.update((user_info["id"], user_info) for user_info in loaded)
+                user_cache.set_many(loaded)
+
+            return jsonify({
+                "users": [found[user_id] for user_id in ids if user_id in found],
+                "unknown": [user_id for user_id in ids if user_id not in found]
+            }), 200
+        except deadline.DeadlineExceeded:
+            raise
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
@@ -89,31 +197,99 @@ def register_routes(app):
             if user:
                 db.session.delete(user)
                 db.session.commit()
-                # Remove from Redis cache
-                redis_client.delete(f"user:{user_id}")
+                # Remove from Redis and from the local cache of every replica
+                user_cache.invalidate(user_id)
+                users_version.bump()
                 return jsonify({"message": "User deleted successfully"}), 200
             else:
                 return jsonify({"error": "User not found"}), 404
+        except deadline.DeadlineExceeded:
+            raise
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
     @app.route('/api/users', methods=['GET'])
     def get_all_users():
-        try:
-            
-            cached_users = redis_client.get("users_list")
-            if cached_users:
-                return jsonify(json.loads(cached_users)), 200  
+        """Keyset-paginated with ?after=<id>&limit=<n>, or the full list streamed when no page is asked for.
+
+        Both carry an ETag of the users version, so an unchanged list answers
+        304 from one Redis read.
+        """
+        if 'after' not in request.args and 'limit' not in request.args:
+            deadline.clear()  # The export runs for as long as the client keeps reading
+            etag = users_version.etag('', 'all')
+            return not_modified(etag) or tagged(stream_all_users(), etag)
 
-            users = User.query.all()
-            user_list = [{"id": user.id, "name": user.name} for user in users]  
-            
-            redis_client.setex("users_list", 300, json.dumps(user_list))  
+        after = request.args.get('after', 0, type=int)
+        limit = request.args.get('limit', USERS_PAGE_SIZE, type=int)
+        if limit < 1 or limit > MAX_USERS_PAGE_SIZE or after < 0:
+            return jsonify({"error": f"limit must be 1-{MAX_USERS_PAGE_SIZE} and after non-negative"}), 400
+        try:
+            etag = users_version.etag('', after, limit)  # None while Redis is unavailable
+            unchanged = not_modified(etag)
+            if unchanged:
+                return unchanged
+            page_key = f"users_page:{etag}" if etag else None
+            try:
+                cached_page = redis_breaker.call(redis_client.get, page_key) if page_key else None
+            except (redis.exceptions.RedisError, CircuitOpenError):
+                cached_page = None  # Redis is unavailable, go straight to SQLite
+            if cached_page:
+                metrics.cache_hit('users_page')
+                return tagged(Response(cached_page, mimetype='application/json'), etag)
+            metrics.cache_miss('users_page')
 
-            return jsonify(user_list), 200  
+            users = db.session.execute(
+                select(User.id, User.name).where(User.id > after).order_by(User.id).limit(limit)
+            ).all()
+            page = app.json.dumps({
+                "users": [{"id": user.id, "name": user.name} for user in users],
+                "next_after": users[-1].id if len(users) == limit else None
+            })
+            if page_key:
+                redis_breaker.call(redis_client.setex, page_key, USERS_CACHE_TTL, page, fallback=lambda: None)
+            return tagged(Response(page, mimetype='application/json'), etag)
+        except deadline.DeadlineExceeded:
+            raise
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+    def stream_all_users():
+        """Full export as a JSON array, written a batch of rows at a time instead of built in memory."""
+        def generate():
+            yield '['
+            rows = db.session.execute(
+                select(User.id, User.name).order_by(User.id).execution_options(yield_per=1000)
+            )
+            for index, batch in enumerate(rows.partitions()):
+                yield (',' if index else '') + ','.join(
+                    app.json.dumps({"id": user.id, "name": user.name}) for user in batch)
+            yield ']'
+
+        return Response(stream_with_context(generate()), mimetype='application/json')
+
+    @app.route('/internal/user-cache/stats', methods=['GET'])
+    def user_cache_stats():
+        return jsonify(user_cache.get_stats()), 200
+
+    @app.route('/internal/breakers', methods=['GET'])
+    def circuit_breakers():
+        """State of every circuit breaker in this process."""
+        return jsonify(breaker_states()), 200
+
+    @app.route('/internal/traces', methods=['GET'])
+    def traces():
+        """Spans of one trace (?trace_id=), or the newest request spans taking at least ?min_ms=."""
+        trace_id = request.args.get('trace_id')
+        if trace_id:
+            spans = tracing.find_trace(trace_id)
+            if not spans:
+                return jsonify({"error": "No spans recorded for this trace."}), 404
+            return jsonify({"trace_id": trace_id, "spans": spans}), 200
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        min_ms = request.args.get('min_ms', 0, type=float)
+        return jsonify({"traces": tracing.recent_traces(limit, min_ms)}), 200
+
     @app.route('/status', methods=['GET'])
     def status():
         return jsonify({
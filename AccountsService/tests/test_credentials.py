@@ -0,0 +1,49 @@
+"""Password hashing and verification, at a low iteration count to keep the tests quick."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from credentials import CredentialHasher, CredentialsBusy, HASH_ALGORITHM  # noqa: E402
+
+
+@pytest.fixture
+def hasher():
+    hasher = CredentialHasher(iterations=1000, workers=1, max_pending=4)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hashes_are_salted_and_verify(hasher):
+    first, second = hasher.hash_password("hunter2"), hasher.hash_password("hunter2")
+    assert first.startswith(f"{HASH_ALGORITHM}$1000$") and first != second
+    assert hasher.verify_password("hunter2", first) == (True, False)
+    assert hasher.verify_password("hunter3", first) == (False, False)
+
+
+def test_plaintext_and_cheaper_hashes_are_flagged_for_rehash(hasher):
+    assert hasher.verify_password("hunter2", "hunter2") == (True, True)
+    assert hasher.verify_password("hunter3", "hunter2") == (False, True)
+    cheaper = CredentialHasher(iterations=500, workers=1)
+    try:
+        stored = cheaper.hash_password("hunter2")
+    finally:
+        cheaper.shutdown()
+    assert hasher.verify_password("hunter2", stored) == (True, True)
+    assert hasher.verify_password("hunter3", stored) == (False, False)
+
+
+def test_unknown_users_never_match(hasher):
+    assert hasher.verify_missing("hunter2") is False
+
+
+def test_derivations_beyond_max_pending_fail_fast():
+    hasher = CredentialHasher(iterations=1000, workers=1, max_pending=1)
+    assert hasher.slots.acquire(blocking=False)  # As if one derivation were already queued
+    with pytest.raises(CredentialsBusy):
+        hasher.hash_password("hunter2")
+    hasher.slots.release()
+    assert hasher.verify_password("hunter2", hasher.hash_password("hunter2"))[0]
+    hasher.shutdown()
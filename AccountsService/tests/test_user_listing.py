@@ -0,0 +1,71 @@
+"""GET /api/users pages, ETags and the streamed export, against a scratch SQLite file and fakeredis."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('PASSWORD_HASH_ITERATIONS', '1000')
+
+import redis  # noqa: E402
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+redis.StrictRedis = fakeredis.FakeStrictRedis
+
+from flask import Flask  # noqa: E402
+from models.database import db  # noqa: E402
+from models.user import User  # noqa: E402
+from server import redis_client, register_routes  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path):
+    redis_client.flushall()
+    app = Flask('user_listing_test')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'user.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(User(f"user{index}", "unused") for index in range(1, 6))
+        db.session.commit()
+    register_routes(app)
+    yield app.test_client()
+    with app.app_context():
+        db.engine.dispose()
+
+
+def names(response):
+    return [user["name"] for user in response.json["users"]]
+
+
+def test_pages_follow_next_after(client):
+    first = client.get('/api/users?limit=2')
+    assert names(first) == ["user1", "user2"] and first.json["next_after"] == 2
+    second = client.get('/api/users?after=2&limit=2')
+    assert names(second) == ["user3", "user4"]
+    last = client.get(f"/api/users?after={second.json['next_after']}&limit=2")
+    assert names(last) == ["user5"] and last.json["next_after"] is None
+    assert client.get('/api/users?limit=0').status_code == 400
+    assert client.get('/api/users?after=-1').status_code == 400
+
+
+def test_unchanged_page_answers_304_until_a_user_registers(client):
+    page = client.get('/api/users?after=4&limit=2')
+    etag = page.headers['ETag']
+    assert client.get('/api/users?after=4&limit=2', headers={'If-None-Match': etag}).status_code == 304
+
+    assert client.post('/api/users', json={"name": "user6", "password": "pw"}).status_code == 201
+    fresh = client.get('/api/users?after=4&limit=2', headers={'If-None-Match': etag})
+    assert fresh.status_code == 200 and names(fresh) == ["user5", "user6"]
+    assert fresh.headers['ETag'] != etag
+
+    assert client.delete('/api/users/6').status_code == 200
+    assert names(client.get('/api/users?after=4&limit=2')) == ["user5"]
+
+
+def test_full_list_is_streamed_as_one_array(client):
+    response = client.get('/api/users')
+    assert response.is_streamed
+    assert [user["name"] for user in response.json] == [f"user{index}" for index in range(1, 6)]
+    assert client.get('/api/users', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
@@ -0,0 +1,58 @@
+"""POST /api/users/lookup against a scratch SQLite file and fakeredis (pip install fakeredis lupa)."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import redis  # noqa: E402
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+redis.StrictRedis = fakeredis.FakeStrictRedis
+
+from flask import Flask  # noqa: E402
+from models.database import db  # noqa: E402
+from models.user import User  # noqa: E402
+from server import MAX_LOOKUP_IDS, redis_client, register_routes, user_cache  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    redis_client.flushall()
+    user_cache.local.clear()
+    app = Flask('user_lookup_test')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'user.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(User(f"user{index}", "unused") for index in range(1, 4))
+        db.session.commit()
+    register_routes(app)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+def test_known_users_come_back_in_request_order(app):
+    response = app.test_client().post('/api/users/lookup', json={"ids": [3, 9, 1, 3]})
+    assert response.json == {"users": [{"id": 3, "name": "user3"}, {"id": 1, "name": "user1"}], "unknown": [9]}
+
+
+def test_repeated_lookups_are_answered_from_the_cache(app):
+    client = app.test_client()
+    client.post('/api/users/lookup', json={"ids": [1, 2]})
+    with app.app_context():
+        db.session.execute(db.text("UPDATE user SET name = 'renamed'"))
+        db.session.commit()
+    assert sorted(redis_client.keys('user:*')) == ['user:1', 'user:2']
+
+    user_cache.local.clear()  # Only the Redis tier is left
+    response = client.post('/api/users/lookup', json={"ids": [1, 2, 3]})
+    assert [user["name"] for user in response.json["users"]] == ["user1", "user2", "renamed"]
+
+
+@pytest.mark.parametrize('body', [{}, {"ids": "1,2"}, {"ids": [1, "2"]}, {"ids": list(range(MAX_LOOKUP_IDS + 1))}])
+def test_malformed_lookups_are_rejected(app, body):
+    assert app.test_client().post('/api/users/lookup', json=body).status_code == 400
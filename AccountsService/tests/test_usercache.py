@@ -0,0 +1,64 @@
+"""Two-tier user cache, with two replicas sharing one fakeredis server (pip install fakeredis)."""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+fakeredis = pytest.importorskip('fakeredis')
+
+import usercache  # noqa: E402
+from usercache import UserCache  # noqa: E402
+
+ALICE = {"id": 1, "name": "alice"}
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def replica(server, **kwargs):
+    cache = UserCache(fakeredis.FakeStrictRedis(server=server, decode_responses=True), **kwargs)
+    cache.ensure_listener()  # As the first lookup in a worker would
+    return cache
+
+
+def wait_for(condition):
+    give_up = time.monotonic() + 5
+    while not condition() and time.monotonic() < give_up:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_users_are_served_from_local_memory_then_redis(server):
+    first, second = replica(server), replica(server)
+    first.set(ALICE)
+    assert first.get(1) == ALICE and first.get_stats()["local_hits"] == 1
+    assert second.get(1) == ALICE and second.get_stats()["redis_hits"] == 1
+    assert second.get(1) == ALICE and second.get_stats()["local_hits"] == 1
+    assert second.get_many([1, 2]) == {1: ALICE}
+
+
+def test_invalidation_reaches_every_replicas_local_copy(server):
+    first, second = replica(server), replica(server)
+    first.set(ALICE)
+    assert second.get(1) == ALICE
+    assert wait_for(lambda: second.redis.pubsub_numsub(usercache.INVALIDATION_CHANNEL)[0][1] == 2)
+
+    first.invalidate(1)
+    assert wait_for(lambda: second.get_stats()["invalidations_received"] == 1)
+    assert first.get(1) is None and second.get(1) is None
+
+
+def test_local_tier_is_bounded_in_size_and_age(server, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(usercache.time, 'monotonic', lambda: now[0])
+    cache = replica(server, size=2, ttl=30)
+    cache.set_many([{"id": user_id, "name": f"user{user_id}"} for user_id in (1, 2, 3)])
+    assert sorted(cache.local) == [2, 3] and cache.get_stats()["local_evictions"] == 1
+    now[0] += 31
+    assert cache._local_get(2) is None  # Expired locally, still in Redis
+    assert cache.get(2) == {"id": 2, "name": "user2"} and cache.get_stats()["redis_hits"] == 1
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+import redis
+import metrics
+from circuitbreaker import CircuitOpenError, get_breaker
+
+# Configuration Constants
+LOCAL_CACHE_SIZE = int(os.getenv('USER_LOCAL_CACHE_SIZE', '5000'))  # Users kept in process memory
+LOCAL_CACHE_TTL = float(os.getenv('USER_LOCAL_CACHE_TTL', '30'))  # Seconds, bounds staleness if a message is lost
+REDIS_CACHE_TTL = 300  # Seconds a user:{id} entry lives in Redis
+INVALIDATION_CHANNEL = "user_invalidations"
+LISTEN_POLL_SECONDS = 5  # Longest single wait for an invalidation message
+
+
+class UserCache:
+    """Two-tier cache for user:{id} entries: an in-process LRU in front of Redis.
+
+    Hot users are answered from local memory. Invalidations are published on a
+    Redis channel and every replica's listener thread evicts its local copy, so
+    a deleted or changed user disappears from all replicas right away. Redis
+    calls go through the 'redis' circuit breaker; while it is open the Redis
+    tier simply misses and callers read SQLite.
+    """
+
+    def __init__(self, redis_conn, size=LOCAL_CACHE_SIZE, ttl=LOCAL_CACHE_TTL):
+        self.redis = redis_conn
+        self.breaker = get_breaker('redis', exceptions=(redis.exceptions.RedisError,))
+        self.size = size
+        self.ttl = ttl
+        self.local = OrderedDict()  # user_id -> (user_info, expires_at)
+        self.lock = threading.Lock()
+        self.stats = {"local_hits": 0, "local_misses": 0, "redis_hits": 0, "redis_misses": 0,
+                      "local_evictions": 0, "invalidations_received": 0}
+        self._listener = None
+        self._listener_pid = None
+
+    # -- local tier ---------------------------------------------------------
+
+    def _local_get(self, user_id):
+        with self.lock:
+            entry = self.local.get(user_id)
+            if entry and entry[1] > time.monotonic():
+                self.local.move_to_end(user_id)
+                self.stats["local_hits"] += 1
+                return entry[0]
+            if entry:
+                del self.local[user_id]
+            self.stats["local_misses"] += 1
+            return None
+
+    def _local_set(self, user_id, user_info):
+        with self.lock:
+            self.local[user_id] = (user_info, time.monotonic() + self.ttl)
+            self.local.move_to_end(user_id)
+            while len(self.local) > self.size:
+                self.local.popitem(last=False)
+                self.stats["local_evictions"] += 1
+
+    def _local_evict(self, user_id):
+        with self.lock:
+            self.local.pop(user_id, None)
+
+    # -- public API ---------------------------------------------------------
+
+    def get(self, user_id):
+        """Cached user info, or None when neither tier has it."""
+        self.ensure_listener()
+        user_info = self._local_get(user_id)
+        if user_info is not None:
+            metrics.cache_hit('user_local')
+            return user_info
+        metrics.cache_miss('user_local')
+
+        cached_user = self.breaker.call(lambda: self.redis.get(f"user:{user_id}"), fallback=lambda: None)
+        if cached_user:
+            self._count_redis(hits=1)
+            user_info = json.loads(cached_user)
+            self._local_set(user_id, user_info)
+            return user_info
+        self._count_redis(misses=1)
+        return None
+
+    def get_many(self, user_ids):
+        """Cached user info for every id found in either tier, as {user_id: info}."""
+        self.ensure_listener()
+        found = {}
+        for user_id in user_ids:
+            user_info = self._local_get(user_id)
+            if user_info is not None:
+                found[user_id] = user_info
+        metrics.cache_hit('user_local', len(found))
+        remote = [user_id for user_id in user_ids if user_id not in found]
+        metrics.cache_miss('user_local', len(remote))
+
+        if remote:
+            cached = self.breaker.call(lambda: self.redis.mget([f"user:{user_id}" for user_id in remote]),
+                                       fallback=lambda: [None] * len(remote))
+            for user_id, cached_user in zip(remote, cached):
+                if cached_user:
+                    found[user_id] = json.loads(cached_user)
+                    self._local_set(user_id, found[user_id])
+            hits = sum(1 for user_id in remote if user_id in found)
+            self._count_redis(hits=hits, misses=len(remote) - hits)
+        return found
+
+    def set(self, user_info):
+        self.set_many([user_info])
+
+    def set_many(self, user_infos):
+        pipe = self.redis.pipeline(transaction=False)
+        for user_info in user_infos:
+            pipe.setex(f"user:{user_info['id']}", REDIS_CACHE_TTL, json.dumps(user_info))
+            self._local_set(user_info['id'], user_info)
+        self.breaker.call(pipe.execute, fallback=lambda: None)
+
+    def invalidate(self, user_id):
+        """Drop a user from Redis and from the local tier of every replica."""
+        self._local_evict(user_id)
+        pipe = self.redis.pipeline()
+        pipe.delete(f"user:{user_id}")
+        pipe.publish(INVALIDATION_CHANNEL, str(user_id))
+        try:
+            self.breaker.call(pipe.execute)
+        except (redis.exceptions.RedisError, CircuitOpenError) as e:
+            logging.error(f"Could not invalidate user:{user_id}, cached copies expire on their own: {e}")
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["local_entries"] = len(self.local)
+        for tier in ("local", "redis"):
+            lookups = stats[f"{tier}_hits"] + stats[f"{tier}_misses"]
+            stats[f"{tier}_hit_ratio"] = round(stats[f"{tier}_hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _count_redis(self, hits=0, misses=0):
+        with self.lock:
+            self.stats["redis_hits"] += hits
+            self.stats["redis_misses"] += misses
+        metrics.cache_hit('user', hits)
+        metrics.cache_miss('user', misses)
+
+    # -- invalidation listener ----------------------------------------------
+
+    def ensure_listener(self):
+        """Start the pub/sub listener in this process (again after a fork)."""
+        if self._listener_pid == os.getpid():
+            return
+        with self.lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self.local.clear()  # Anything inherited from the parent may have missed invalidations
+            self._listener = threading.Thread(target=self._listen, name='user-cache-invalidation', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        delay = 1
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                delay = 1
+                while True:
+                    # Polled rather than listen(), so the client's socket_timeout never fires on a quiet channel
+                    message = pubsub.get_message(timeout=LISTEN_POLL_SECONDS)
+                    if message is None:
+                        continue
+                    try:
+                        user_id = int(message["data"])
+                    except (TypeError, ValueError):
+                        continue
+                    self._local_evict(user_id)
+                    with self.lock:
+                        self.stats["invalidations_received"] += 1
+            except redis.exceptions.RedisError as e:
+                logging.warning(f"User cache invalidation listener lost Redis: {e}")
+                # While disconnected we may miss invalidations, so stop trusting the local tier
+                with self.lock:
+                    self.local.clear()
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
@@ -0,0 +1,214 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import requests
+from requests.adapters import HTTPAdapter
+from circuitbreaker import CircuitOpenError, get_breaker
+import deadline
+import tracing
+
+# Configuration Constants
+USER_SERVICE_URL = os.getenv('USER_SERVICE_URL', 'http://accounts_service:5001')
+ACCOUNTS_TIMEOUT = float(os.getenv('ACCOUNTS_TIMEOUT', '2.0'))  # Seconds per upstream call
+POOL_SIZE = int(os.getenv('ACCOUNTS_POOL_SIZE', '20'))  # Keep-alive connections kept open
+CACHE_SIZE = int(os.getenv('ACCOUNTS_CACHE_SIZE', '10000'))  # Max users remembered
+POSITIVE_TTL = float(os.getenv('ACCOUNTS_CACHE_TTL', '300'))  # Seconds an existing user stays cached
+NEGATIVE_TTL = float(os.getenv('ACCOUNTS_NEGATIVE_TTL', '5'))  # Seconds an unknown user stays cached
+LOOKUP_BATCH = 500  # Ids per POST /api/users/lookup, the accounts service's limit
+
+
+class _Flight:
+    """One upstream lookup that concurrent callers for the same user wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class AccountsClient:
+    """Pooled, cached client for user lookups against the accounts service.
+
+    Existence checks are kept in a bounded LRU with a TTL (short for users that
+    were not found), and concurrent lookups for the same user share one request.
+    Upstream calls go through the 'accounts' circuit breaker; while accounts is
+    failing, an expired cache entry is served rather than failing the request.
+    """
+
+    def __init__(self, base_url=USER_SERVICE_URL, timeout=ACCOUNTS_TIMEOUT, pool_size=POOL_SIZE,
+                 cache_size=CACHE_SIZE, positive_ttl=POSITIVE_TTL, negative_ttl=NEGATIVE_TTL):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.cache = OrderedDict()  # user_id -> (exists, expires_at)
+        self.flights = {}  # user_id -> _Flight currently in progress
+        self.lock = threading.Lock()
+        self.breaker = get_breaker('accounts', exceptions=(requests.exceptions.RequestException,))
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "coalesced": 0,
+                      "upstream_calls": 0, "errors": 0, "evictions": 0, "stale_served": 0}
+
+    def user_exists(self, user_id):
+        """Return True/False for whether the user exists. Raises RequestException if accounts is unreachable."""
+        key = str(user_id)
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry and entry[1] > time.monotonic():
+                self.cache.move_to_end(key)
+                self.stats["hits" if entry[0] else "negative_hits"] += 1
+                return entry[0]
+
+            flight = self.flights.get(key)
+            if flight:
+                self.stats["coalesced"] += 1
+                leader = False
+            else:
+                self.stats["misses"] += 1
+                flight = self.flights[key] = _Flight()
+                leader = True
+
+        if not leader:
+            if not flight.done.wait(deadline.cap(None)):
+                raise deadline.DeadlineExceeded()
+            if flight.error:
+                raise flight.error
+            if flight.result is None:
+                return self.user_exists(user_id)  # The leader ran out of its own budget first, try again
+            return flight.result
+
+        try:
+            flight.result = self.breaker.call(self._fetch, key)
+            self._store(key, flight.result)
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
+            stale = self._stale(key)
+            if stale is None:
+                flight.error = requests.exceptions.ConnectionError(str(e))
+                raise flight.error from e
+            flight.result = stale
+        finally:
+            with self.lock:
+                self.flights.pop(key, None)
+            flight.done.set()
+        return flight.result
+
+    def users_exist(self, user_ids):
+        """user_id -> True/False for many users, fetching the uncached ones in bulk lookups.
+
+        Raises RequestException if accounts is unreachable and some user was never cached.
+        """
+        result, missing = {}, []
+        now = time.monotonic()
+        with self.lock:
+            for user_id in dict.fromkeys(int(user_id) for user_id in user_ids):
+                entry = self.cache.get(str(user_id))
+                if entry and entry[1] > now:
+                    self.cache.move_to_end(str(user_id))
+                    self.stats["hits" if entry[0] else "negative_hits"] += 1
+                    result[user_id] = entry[0]
+                else:
+                    self.stats["misses"] += 1
+                    missing.append(user_id)
+
+        for start in range(0, len(missing), LOOKUP_BATCH):
+            batch = missing[start:start + LOOKUP_BATCH]
+            try:
+                found = self.breaker.call(self._fetch_many, batch)
+            except (requests.exceptions.RequestException, CircuitOpenError) as e:
+                for user_id in batch:
+                    stale = self._stale(str(user_id))
+                    if stale is None:
+                        raise requests.exceptions.ConnectionError(str(e)) from e
+                    result[user_id] = stale
+                continue
+            for user_id in batch:
+                result[user_id] = user_id in found
+                self._store(str(user_id), user_id in found)
+        return result
+
+    def _request(self, method, path, **kwargs):
+        """One upstream call, limited to the current request's remaining budget and passing it on.
+
+        A timeout or 504 that comes from our own deadline running out raises
+        DeadlineExceeded, which the breaker does not hold against accounts.
+        The call is a span of the current trace, which accounts continues.
+        """
+        with self.lock:
+            self.stats["upstream_calls"] += 1
+        with tracing.span(f"{method} accounts", kind='client', url=path) as span:
+            try:
+                response = self.session.request(method, f"{self.base_url}{path}", timeout=deadline.cap(self.timeout),
+                                                headers={**deadline.outgoing_headers(), **tracing.outgoing_headers()},
+                                                **kwargs)
+            except requests.exceptions.RequestException as e:
+                if isinstance(e, requests.exceptions.Timeout):
+                    deadline.check()
+                with self.lock:
+                    self.stats["errors"] += 1
+                raise
+            if span is not None:
+                span.attributes['status'] = response.status_code
+        if response.status_code == 504:
+            deadline.check()
+        return response
+
+    def _fetch_many(self, user_ids):
+        """Ids among user_ids that exist, from one bulk lookup."""
+        response = self._request('POST', "/api/users/lookup", json={"ids": user_ids})
+        if response.status_code != 200:
+            with self.lock:
+                self.stats["errors"] += 1
+            raise requests.exceptions.HTTPError(f"Accounts service responded with {response.status_code}",
+                                                response=response)
+        return {user["id"] for user in response.json()["users"]}
+
+    def _fetch(self, key):
+        response = self._request('GET', f"/api/users/{key}")
+        if response.status_code == 200:
+            return True
+        if response.status_code == 404:
+            return False
+        with self.lock:
+            self.stats["errors"] += 1
+        raise requests.exceptions.HTTPError(f"Accounts service responded with {response.status_code}",
+                                            response=response)
+
+    def _stale(self, key):
+        """Expired cache entry for the user, if the LRU still holds one."""
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                return None
+            self.stats["stale_served"] += 1
+            return entry[0]
+
+    def _store(self, key, exists):
+        ttl = self.positive_ttl if exists else self.negative_ttl
+        with self.lock:
+            self.cache[key] = (exists, time.monotonic() + ttl)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.cache.pop(str(user_id), None)
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["cached_users"] = len(self.cache)
+        lookups = stats["hits"] + stats["negative_hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_ratio"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+accounts_client = AccountsClient()
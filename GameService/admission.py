@@ -0,0 +1,132 @@
+# admission.py
+import os
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from redis_client import redis_client, redis_breaker
+
+# Configuration Constants
+ADMISSION_CONTROL = os.getenv('ADMISSION_CONTROL', '1') == '1'  # 0 turns the limits off
+USER_RATE = float(os.getenv('ADMISSION_USER_RATE', '10'))  # Requests per second refilled per user
+USER_BURST = float(os.getenv('ADMISSION_USER_BURST', '20'))  # Requests a user may send at once
+GAME_RATE = float(os.getenv('ADMISSION_GAME_RATE', '20'))  # Requests per second refilled per game
+GAME_BURST = float(os.getenv('ADMISSION_GAME_BURST', '40'))
+LOCAL_BUCKETS = 100_000  # Most buckets the in-process fallback remembers
+
+BUCKET_KEY = "admission:{kind}:{id}"  # Hash with tokens and ts (seconds, Redis clock)
+
+# Checks every bucket first and only takes tokens if all of them can pay, so a
+# rejected request costs nothing. Returns the seconds to wait, "0" when admitted.
+# ARGV holds rate, burst, cost for each key in turn.
+TAKE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local wait, levels = 0, {}
+for i, key in ipairs(KEYS) do
+  local rate, burst, cost = tonumber(ARGV[i * 3 - 2]), tonumber(ARGV[i * 3 - 1]), tonumber(ARGV[i * 3])
+  local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(bucket[1]) or burst
+  local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+  tokens = math.min(burst, tokens + elapsed * rate)
+  levels[i] = tokens
+  if tokens < cost then
+    wait = math.max(wait, (cost - tokens) / rate)
+  end
+end
+if wait > 0 then
+  return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+  local rate, burst, cost = tonumber(ARGV[i * 3 - 2]), tonumber(ARGV[i * 3 - 1]), tonumber(ARGV[i * 3])
+  redis.call('HSET', key, 'tokens', levels[i] - cost, 'ts', now)
+  redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+end
+return "0"
+"""
+
+
+class AdmissionController:
+    """Token buckets per user and per game, shared by every replica through Redis.
+
+    take() charges all the buckets a request touches in one atomic script.
+    While Redis is unavailable the same buckets are kept in this process
+    instead, so limits still hold per replica rather than not at all.
+    """
+
+    def __init__(self, redis_conn, limits=None):
+        self.redis = redis_conn
+        self.take_script = self.redis.register_script(TAKE_SCRIPT)
+        self.limits = limits or {"user": (USER_RATE, USER_BURST), "game": (GAME_RATE, GAME_BURST)}
+        self.local = OrderedDict()  # key -> [tokens, monotonic time of last update]
+        self.lock = threading.Lock()
+
+    def take(self, charges):
+        """Charge {(kind, id): cost}. Returns 0 if admitted, else the seconds until it would be."""
+        keys, args = [], []
+        for (kind, id_), cost in charges.items():
+            rate, burst = self.limits[kind]
+            keys.append(BUCKET_KEY.format(kind=kind, id=id_))
+            args.extend((rate, burst, min(cost, burst)))  # A bigger request than the burst waits for a full bucket
+        if not keys:
+            return 0
+        wait = redis_breaker.call(self.take_script, keys=keys, args=args,
+                                  fallback=lambda: self._take_local(keys, args))
+        return float(wait)
+
+    def _take_local(self, keys, args):
+        now = time.monotonic()
+        with self.lock:
+            wait, levels = 0, []
+            for index, key in enumerate(keys):
+                rate, burst, cost = args[index * 3:index * 3 + 3]
+                tokens, updated = self.local.get(key, (burst, now))
+                tokens = min(burst, tokens + (now - updated) * rate)
+                levels.append(tokens)
+                if tokens < cost:
+                    wait = max(wait, (cost - tokens) / rate)
+            if wait:
+                return wait
+            for index, key in enumerate(keys):
+                self.local[key] = [levels[index] - args[index * 3 + 2], now]
+                self.local.move_to_end(key)
+            while len(self.local) > LOCAL_BUCKETS:
+                self.local.popitem(last=False)
+            return 0
+
+
+admission = AdmissionController(redis_client)
+
+
+def request_charges(view_args, body):
+    """Buckets a request draws from: its user and game ids, from the URL or the JSON body.
+
+    A /guess/batch body pays one token per item to each user and game in it.
+    """
+    if isinstance(body, dict) and isinstance(body.get('guesses'), list):
+        items = body['guesses']
+    elif isinstance(body, list):
+        items = body
+    else:
+        items = [dict(body if isinstance(body, dict) else {}, **view_args)]
+    charges = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        for kind in ("user", "game"):
+            value = item.get(f"{kind}_id")
+            if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+                charges[(kind, int(value))] = charges.get((kind, int(value)), 0) + 1
+    return charges
+
+
+def admit(view_args, body):
+    """None if the request may run, else the Retry-After seconds to answer 429 with."""
+    if not ADMISSION_CONTROL:
+        return None
+    wait = admission.take(request_charges(view_args, body))
+    if wait <= 0:
+        return None
+    logging.debug(f"Request throttled for {wait:.2f}s")
+    return max(1, math.ceil(wait))
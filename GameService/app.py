@@ -1,50 +1,72 @@
 import os
-import time
+import atexit
 import requests
 from flask import Flask
-from models.database import db  
+from models.database import db, configure_shards, create_shards, BUSY_TIMEOUT_MS
 from models.game import Game
 from server import register_routes  
-from circuitbreaker import CircuitBreaker  # Import CircuitBreaker
+from livestate import init_live_store
+from archive import init_archive
+from migrate_db import migrate
+from realtime import socketio, init_realtime
+from circuitbreaker import CircuitOpenError, get_breaker
+from registration import RegistrationWorker
+from responses import init_responses
+import deadline
+import tracing
 
 # Service discovery URL (ensure it's correct in production or container environments)
-SERVICE_DISCOVERY_URL = os.getenv('SERVICE_DISCOVERY_URL', 'http://discovery:3005/register')
+DISCOVERY_HOST = os.getenv('DISCOVERY_HOST', 'http://discovery:3005')
+SERVICE_DISCOVERY_URL = os.getenv('SERVICE_DISCOVERY_URL', f'{DISCOVERY_HOST}/register')
 
 # Configuration Constants
 TASK_TIMEOUT_LIMIT = 5000  # Task timeout in milliseconds
 RETRY_WINDOW = 3.5 * TASK_TIMEOUT_LIMIT  # Retry window in milliseconds (3.5 times timeout)
 FAILURE_THRESHOLD = 3  # Number of allowed failures within the retry window
-COOLDOWN_PERIOD = 10  # Cooldown period in seconds before resetting the circuit
+COOLDOWN_PERIOD = 10  # Cooldown period in seconds before a trial registration is let through
 
-# Initialize CircuitBreaker
-breaker = CircuitBreaker(TASK_TIMEOUT_LIMIT, RETRY_WINDOW, FAILURE_THRESHOLD, COOLDOWN_PERIOD)
+# Shared with every other discovery call in this process
+breaker = get_breaker('discovery', failure_threshold=FAILURE_THRESHOLD, retry_window=RETRY_WINDOW,
+                      cooldown_period=COOLDOWN_PERIOD, exceptions=(requests.exceptions.RequestException,))
 
 def register_service(service_name, service_address, service_port, replica_id):
     """Register service with service discovery, using CircuitBreaker to manage retries on failure."""
-    try:
-        # Check if circuit breaker is open before making the service call
-        if breaker.is_open():
-            print(f"Circuit breaker is open, skipping service registration for {service_name}.")
-            return
-
+    def post_registration():
         response = requests.post(SERVICE_DISCOVERY_URL, json={
             'name': service_name,
             'address': service_address,
             'port': service_port,
             'replicaId': replica_id  # Add the replicaId field
         }, timeout=TASK_TIMEOUT_LIMIT / 1000)  # Convert timeout to seconds
-        
-        # Check the response status
-        if response.status_code == 201:
-            print(f"Service registered: {service_name} at {service_address}:{service_port} with replicaId {replica_id}")
-            return response
-        else:
-            print(f"Failed to register service {service_name}: {response.json()}")
-            breaker.trip(service_name)  # Trip the circuit breaker on failure
+        # 409 means discovery still has us, which is what a heartbeat wants
+        if response.status_code not in (201, 409):
+            raise requests.exceptions.HTTPError(f"Failed to register service {service_name}: {response.text}",
+                                                response=response)
+        return response
+
+    try:
+        response = breaker.call(post_registration)
+    except CircuitOpenError:
+        print(f"Circuit breaker is open, skipping service registration for {service_name}.")
+        return False
     except requests.exceptions.RequestException as e:
-        # Handle network-related errors
+        # Handle network-related errors and unexpected responses
         print(f"Error while registering service: {e}")
-        breaker.trip(service_name)  # Trip the circuit breaker on error
+        return False
+
+    if response.status_code == 201:
+        print(f"Service registered: {service_name} at {service_address}:{service_port} with replicaId {replica_id}")
+    return True
+
+def deregister_service(service_name, service_address, service_port, replica_id):
+    """Remove this replica from service discovery, used on shutdown."""
+    breaker.call(requests.delete, f"{DISCOVERY_HOST}/service", json={
+        'name': service_name,
+        'address': service_address,
+        'port': service_port,
+        'replicaId': replica_id
+    }, timeout=TASK_TIMEOUT_LIMIT / 1000)
+    print(f"Service deregistered: {service_name} at {service_address}:{service_port} with replicaId {replica_id}")
 
 def create_app():
     app = Flask(__name__)
@@ -52,28 +74,35 @@ def create_app():
     # Get database URI from environment or use a default for development
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'sqlite:///game.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)  # Extra game databases when GAME_DB_SHARDS > 1
     db.init_app(app)  
     
     with app.app_context():
         db.create_all()  # Create tables if they don't exist
+        create_shards()
+        for engine in db.engines.values():
+            migrate(engine)  # Bring existing databases up to the current schema
 
+    init_live_store(app)  # Optional in-memory game state (LIVE_GAME_STATE=1)
+    init_archive(app)  # Read side of the completed-game archive written by `python archive.py`
+    deadline.limit_sqlite(BUSY_TIMEOUT_MS)  # Statements run for a request stop at its deadline
+    tracing.trace_sqlalchemy()  # Statements run for a sampled request become spans
+    init_responses(app)  # orjson when installed, gzip for large bodies
     register_routes(app)
+    init_realtime(app)  # Socket.IO namespace /games for pushed game updates
 
     # Fetch dynamic service details from environment variables
     service_name = os.getenv('SERVICE_NAME', 'game_service')  # Fetch service name, like 'game_service_1'
     service_address = os.getenv('HOSTNAME', 'localhost')  # Docker container hostname
     service_port = int(os.getenv('SERVICE_PORT', '5002'))  # Dynamic port based on container (5002 is default)
     replica_id = os.getenv('REPLICA_ID', '1')  # This could be dynamically set to differentiate replicas
-    while True:
-        try:
-            response = requests.get("http://discovery:3005/status")
-            if response.status_code == 200:
-                break
-        except requests.ConnectionError:
-            print("Discovery service not available, retrying...")
-        time.sleep(5)
-    # Register service with circuit breaker logic
-    register_service(service_name, service_address, service_port, replica_id)
+
+    # Register in the background so the app can take traffic while discovery is unavailable
+    service_details = (service_name, service_address, service_port, replica_id)
+    registration = RegistrationWorker(lambda: register_service(*service_details),
+                                      lambda: deregister_service(*service_details))
+    app.extensions['registration'] = registration.start()
+    atexit.register(registration.stop)
 
     return app
 
@@ -81,4 +110,4 @@ if __name__ == "__main__":
     # Ensure production-ready environment variables or defaults
     app = create_app()
     service_port = int(os.getenv('SERVICE_PORT', 5002))  # Default to 5002 if not specified
-    app.run(port=service_port, host="0.0.0.0", debug=True)
+    socketio.run(app, port=service_port, host="0.0.0.0", debug=True, allow_unsafe_werkzeug=True)
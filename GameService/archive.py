@@ -0,0 +1,292 @@
+# archive.py
+import os
+import json
+import mmap
+import time
+import zlib
+import fcntl
+import heapq
+import struct
+import logging
+import threading
+from flask import Flask
+from sqlalchemy import delete, select
+from models.database import db, configure_shards, each_shard, shard_bind_key
+from models.game import Game
+from models.gameowner import GameOwner
+from models.playerscore import PlayerScore
+
+# Configuration Constants
+ARCHIVE_DIR = os.getenv('GAME_ARCHIVE_DIR', 'archive')  # Relative paths are inside the app's instance folder
+ARCHIVE_AFTER_DAYS = float(os.getenv('GAME_ARCHIVE_AFTER_DAYS', '7'))  # Completed games older than this are moved
+ARCHIVE_BATCH_SIZE = 5000  # Games read from, and later deleted from, SQLite per statement
+BLOCK_GAMES = 256  # Games compressed together; a lookup inflates one block
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024  # Start a new segment file once the current one is this large
+
+SEGMENT_FILE = "segment-{:06d}.dat"
+INDEX_FILE = "index.bin"
+LOCK_FILE = "archive.lock"
+# One entry per game, sorted by game_id:
+# game_id, segment, block offset, block length, record offset, record length (inside the inflated block)
+INDEX_ENTRY = struct.Struct('<qIQIII')
+
+
+class ArchiveBusyError(Exception):
+    """Another archiver already holds the archive lock."""
+
+
+class GameArchive:
+    """Completed games moved out of SQLite, kept in append-only segment files.
+
+    Games are stored as JSON records, BLOCK_GAMES to a zlib-compressed block,
+    and blocks are only ever appended. index.bin holds one fixed-width entry
+    per game sorted by id; it is memory-mapped and binary searched, so a
+    lookup costs O(log n) index reads plus one block read. The archiver
+    replaces index.bin atomically, readers pick the new one up on their next
+    lookup.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.lock = threading.Lock()
+        self._index = (None, None)  # (stat signature, mmap or None)
+        self._segments = {}  # segment number -> read-only fd
+
+    def _current_index(self):
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if self._index[0] != signature:
+                index = None
+                if stat.st_size:
+                    with open(self.index_path, 'rb') as f:
+                        index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                # The previous map is closed once no lookup still holds it
+                self._index = (signature, index)
+            return self._index[1]
+
+    def __len__(self):
+        index = self._current_index()
+        return len(index) // INDEX_ENTRY.size if index else 0
+
+    def _find(self, index, game_id):
+        low, high = 0, len(index) // INDEX_ENTRY.size
+        while low < high:
+            middle = (low + high) // 2
+            entry = INDEX_ENTRY.unpack_from(index, middle * INDEX_ENTRY.size)
+            if entry[0] == game_id:
+                return entry
+            if entry[0] < game_id:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _read_block(self, segment, offset, length):
+        with self.lock:
+            fd = self._segments.get(segment)
+            if fd is None:
+                fd = self._segments[segment] = os.open(
+                    os.path.join(self.directory, SEGMENT_FILE.format(segment)), os.O_RDONLY)
+        return zlib.decompress(os.pread(fd, length, offset))
+
+    def lookup(self, game_id):
+        """The archived record of a game ({game_id, status, winner_id, completed_at, players_scores}), or None."""
+        index = self._current_index()
+        entry = self._find(index, int(game_id)) if index else None
+        if entry is None:
+            return None
+        _, segment, offset, length, record_offset, record_length = entry
+        block = self._read_block(segment, offset, length)
+        return json.loads(block[record_offset:record_offset + record_length])
+
+    def records(self):
+        """Every archived game in id order, inflating each block once per run of games it holds."""
+        index = self._current_index()
+        if not index:
+            return
+        cached_key, block = None, None
+        for _, segment, offset, length, record_offset, record_length in INDEX_ENTRY.iter_unpack(index):
+            if (segment, offset) != cached_key:
+                cached_key, block = (segment, offset), self._read_block(segment, offset, length)
+            yield json.loads(block[record_offset:record_offset + record_length])
+
+    def _entries(self):
+        index = self._current_index()
+        return INDEX_ENTRY.iter_unpack(index) if index else iter(())
+
+    def _open_segment(self):
+        """Append handle and number of the segment new blocks go to."""
+        numbers = sorted(int(name[8:14]) for name in os.listdir(self.directory)
+                         if name.startswith("segment-") and name.endswith(".dat"))
+        segment = numbers[-1] if numbers else 1
+        path = os.path.join(self.directory, SEGMENT_FILE.format(segment))
+        if os.path.exists(path) and os.path.getsize(path) >= SEGMENT_MAX_BYTES:
+            segment += 1
+            path = os.path.join(self.directory, SEGMENT_FILE.format(segment))
+        return segment, open(path, 'ab')
+
+    def append(self, records):
+        """Write records to the current segment and index them. Returns how many were written.
+
+        The segment is synced before the new index replaces the old one, and
+        the index before this returns, so callers may delete the originals
+        afterwards. A crash in between leaves unreferenced bytes in the
+        segment and nothing else; re-archiving a game replaces its entry.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise ArchiveBusyError(f"{self.directory} is locked by another archiver")
+
+            new_entries = []
+            segment, out = self._open_segment()
+            with out:
+                block = []
+                for record in records:
+                    block.append(record)
+                    if len(block) == BLOCK_GAMES:
+                        new_entries.extend(self._write_block(out, segment, block))
+                        block = []
+                if block:
+                    new_entries.extend(self._write_block(out, segment, block))
+                out.flush()
+                os.fsync(out.fileno())
+            if new_entries:
+                self._write_index(sorted(new_entries))
+            return len(new_entries)
+
+    @staticmethod
+    def _write_block(out, segment, block):
+        payload, positions = bytearray(), []
+        for record in block:
+            encoded = json.dumps(record, separators=(',', ':')).encode()
+            positions.append((record["game_id"], len(payload), len(encoded)))
+            payload += encoded + b"\n"
+        compressed = zlib.compress(bytes(payload))
+        offset = out.tell()
+        out.write(compressed)
+        return [(game_id, segment, offset, len(compressed), record_offset, record_length)
+                for game_id, record_offset, record_length in positions]
+
+    def _write_index(self, new_entries):
+        """Merge sorted new entries into index.bin and swap it in. New entries win on duplicate ids."""
+        tmp_path = self.index_path + ".tmp"
+        new_ids = {entry[0] for entry in new_entries}
+        old_entries = (entry for entry in self._entries() if entry[0] not in new_ids)
+        with open(tmp_path, 'wb') as out:
+            for entry in heapq.merge(old_entries, new_entries):
+                out.write(INDEX_ENTRY.pack(*entry))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, self.index_path)
+        directory_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+
+
+def init_archive(app):
+    """Open the game archive under the instance folder (or GAME_ARCHIVE_DIR) for lookups."""
+    archive = GameArchive(os.path.join(app.instance_path, ARCHIVE_DIR))
+    app.extensions['game_archive'] = archive
+    return archive
+
+
+def archivable_games(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Records of the current shard's games completed before cutoff, in id order, read in batches."""
+    last_id = 0
+    while True:
+        games = db.session.execute(
+            select(Game.id, Game.status, Game.winner_id, Game.completed_at)
+            .where(Game.completed_at < cutoff, Game.id > last_id)
+            .order_by(Game.id).limit(batch_size)
+        ).all()
+        if not games:
+            return
+        scores = {}
+        for row in db.session.execute(
+            select(PlayerScore.game_id, PlayerScore.user_id, PlayerScore.attempts, PlayerScore.target_number)
+            .where(PlayerScore.game_id.in_([game.id for game in games]))
+        ):
+            scores.setdefault(row.game_id, {})[str(row.user_id)] = {
+                "attempts": row.attempts, "target_number": row.target_number}
+        for game in games:
+            yield {"game_id": game.id, "status": game.status, "winner_id": game.winner_id,
+                   "completed_at": game.completed_at, "players_scores": scores.get(game.id, {})}
+        last_id = games[-1].id
+        db.session.rollback()  # Do not hold the read snapshot across batches
+
+
+def delete_games(game_ids, batch_size=ARCHIVE_BATCH_SIZE):
+    for start in range(0, len(game_ids), batch_size):
+        batch = game_ids[start:start + batch_size]
+        db.session.execute(delete(PlayerScore).where(PlayerScore.game_id.in_(batch)))
+        db.session.execute(delete(GameOwner).where(GameOwner.game_id.in_(batch)))
+        db.session.execute(delete(Game).where(Game.id.in_(batch)))
+        db.session.commit()
+
+
+def reclaim_space(engine):
+    """Return free pages to the filesystem. Returns the number of pages released.
+
+    Needs auto_vacuum=INCREMENTAL, which new databases get on connect; a
+    database created before that is converted with one full VACUUM here.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            logging.info(f"Enabling incremental vacuum on {engine.url.database}, running a full VACUUM once")
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+        free_pages = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        # executescript() steps the pragma to the end; execute() would free a single page
+        conn.connection.driver_connection.executescript("PRAGMA incremental_vacuum")
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")  # In WAL mode the file shrinks at checkpoint
+        return free_pages
+
+
+def archive_completed_games(archive, older_than_days=ARCHIVE_AFTER_DAYS):
+    """Move games completed more than older_than_days ago from every shard into the archive.
+
+    Returns {shard: (games archived, pages reclaimed)}. Rows are deleted
+    only after the archive holds them, so a failed run loses nothing.
+    """
+    cutoff = time.time() - older_than_days * 86400
+    summary = {}
+    for shard in each_shard():
+        archived_ids = []
+
+        def collect(records):
+            for record in records:
+                archived_ids.append(record["game_id"])
+                yield record
+
+        archive.append(collect(archivable_games(cutoff)))
+        delete_games(archived_ids)
+        engine = db.engines[shard_bind_key(shard) if shard else None]
+        summary[shard] = (len(archived_ids), reclaim_space(engine))
+    return summary
+
+
+if __name__ == "__main__":
+    # python archive.py  ->  move old completed games out of the game database(s)
+    logging.basicConfig(level=logging.INFO)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'sqlite:///game.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)
+    db.init_app(app)
+    game_archive = init_archive(app)
+    with app.app_context():
+        try:
+            for shard, (games, pages) in archive_completed_games(game_archive).items():
+                print(f"Shard {shard}: archived {games} games, reclaimed {pages} pages")
+        except ArchiveBusyError as e:
+            print(f"Archive skipped: {e}")
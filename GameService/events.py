@@ -0,0 +1,23 @@
+import logging
+
+# In-process hooks for things that react to game progress (leaderboard, ...).
+# Listeners run after the change is committed; a failing listener is logged
+# and never fails the request that triggered it.
+_listeners = {
+    "guess_applied": [],  # game_id, user_id, attempts, message
+    "game_completed": [],  # game_id, user_id, attempts
+    "games_flushed": [],  # game_ids, live games whose changes just reached SQLite
+}
+
+
+def subscribe(event, listener):
+    _listeners[event].append(listener)
+    return listener
+
+
+def emit(event, **payload):
+    for listener in _listeners[event]:
+        try:
+            listener(**payload)
+        except Exception as e:
+            logging.error(f"{event} listener {listener.__name__} failed: {e}")
@@ -0,0 +1,67 @@
+# gunicorn.conf.py -- production server for create_app()
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# create_app() runs once in the master (preload_app), so discovery registration
+# and migrations happen once per container. Workers are forked afterwards and
+# reset every connection they inherited in post_fork.
+import os
+import shutil
+import multiprocessing
+
+SERVICE_PORT = os.getenv('SERVICE_PORT', '5002')
+
+bind = f"0.0.0.0:{SERVICE_PORT}"
+# One process by default: Socket.IO long-polling (how default clients connect) only works when
+# every request of a session reaches the same worker, which gunicorn cannot guarantee.
+# The threads make up for the workers the AccountsService default would have.
+workers = int(os.getenv('GUNICORN_WORKERS', '1'))
+threads = int(os.getenv('GUNICORN_THREADS', (multiprocessing.cpu_count() * 2 + 1) * 4))
+if workers > 1:
+    # Read by realtime.init_app: clients that try long-polling get an error instead of broken sessions
+    os.environ['SOCKETIO_TRANSPORTS'] = 'websocket'
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')  # or gevent/eventlet for cooperative workers
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))  # Seconds to hold idle gateway connections open
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '15'))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+preload_app = True
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')  # e.g. "-" for stdout, off by default
+
+# Prometheus needs a shared directory to merge samples from all workers; it has to
+# be set before the app (and prometheus_client) is imported and start out empty.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus_multiproc')
+shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def on_starting(server):
+    # The live game store hands games off by container address, which would land on
+    # an arbitrary worker, so it only works with a single worker process.
+    if os.getenv('LIVE_GAME_STATE', '0') == '1' and server.cfg.workers > 1:
+        raise RuntimeError("LIVE_GAME_STATE=1 requires GUNICORN_WORKERS=1 (use GUNICORN_THREADS to scale)")
+
+
+def post_fork(server, worker):
+    from wsgi import app
+    from models.database import db
+    from redis_client import redis_client
+    from accounts_client import accounts_client
+
+    # Connections opened by the master must not be shared with the children
+    with app.app_context():
+        for engine in db.engines.values():  # Default database plus any game shards
+            engine.dispose(close=False)
+    redis_client.connection_pool.reset()
+    accounts_client.session.close()  # Drop pooled keep-alive sockets, new ones open on demand
+
+    # Threads do not survive fork(), restart the write-behind flusher in the worker
+    live_store = app.extensions.get('live_store')
+    if live_store:
+        live_store.restart()
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.mark_process_dead(worker.pid)
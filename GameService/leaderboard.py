@@ -0,0 +1,210 @@
+# leaderboard.py
+import os
+import logging
+import redis
+from flask import Flask
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+from models.database import db, configure_shards, each_shard, SHARD_COUNT
+from models.game import Game
+from models.playerscore import PlayerScore
+from redis_client import redis_client, redis_breaker
+from circuitbreaker import CircuitOpenError
+from archive import init_archive
+import events
+
+# Configuration Constants
+MAX_PAGE_SIZE = 100  # Most entries returned by one leaderboard page
+SCORE_SCALE = 1_000_000_000  # Wins dominate, fewer total attempts breaks ties
+
+RANKING_KEY = "leaderboard:ranking"  # Sorted set user_id -> wins * SCORE_SCALE - total attempts
+WINS_KEY = "leaderboard:wins"  # Hash user_id -> games won
+ATTEMPTS_KEY = "leaderboard:attempts"  # Hash user_id -> attempts summed over won games
+
+# Both counters and the ranking move together, so readers never see them disagree
+RECORD_WIN_SCRIPT = """
+local wins = redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+local attempts = redis.call('HINCRBY', KEYS[3], ARGV[1], ARGV[2])
+redis.call('ZADD', KEYS[1], wins * tonumber(ARGV[3]) - attempts, ARGV[1])
+return wins
+"""
+
+
+class Leaderboard:
+    """Ranking of players by games won, kept up to date as games complete.
+
+    Pages and ranks come straight from a Redis sorted set, so both are
+    O(log n) instead of an aggregate over player_scores. While the Redis
+    circuit breaker is open, pages are computed from SQLite instead, without
+    the games that have been moved to the archive.
+    """
+
+    def __init__(self, redis_conn):
+        self.redis = redis_conn
+        self.record_win_script = self.redis.register_script(RECORD_WIN_SCRIPT)
+
+    def record_win(self, user_id, attempts):
+        self.record_win_script(keys=[RANKING_KEY, WINS_KEY, ATTEMPTS_KEY], args=[user_id, attempts, SCORE_SCALE])
+
+    def page(self, offset, limit):
+        """(total_players, entries) for one page of the ranking."""
+        return redis_breaker.call(self._redis_page, offset, limit,
+                                  fallback=lambda: self._database_page(offset, limit))
+
+    def _redis_page(self, offset, limit):
+        total = self.redis.zcard(RANKING_KEY)
+        user_ids = self.redis.zrevrange(RANKING_KEY, offset, offset + limit - 1)
+        if not user_ids:
+            return total, []
+        pipe = self.redis.pipeline()
+        pipe.hmget(WINS_KEY, user_ids)
+        pipe.hmget(ATTEMPTS_KEY, user_ids)
+        wins, attempts = pipe.execute()
+        return total, [self._entry(user_id, offset + index + 1, wins[index], attempts[index])
+                       for index, user_id in enumerate(user_ids)]
+
+    def _database_page(self, offset, limit):
+        if SHARD_COUNT > 1:
+            ordered = sorted(self._merged_standings().items(),
+                             key=lambda item: (-item[1][0], item[1][1], item[0]))
+            return len(ordered), [self._entry(user_id, offset + index + 1, wins, attempts)
+                                  for index, (user_id, (wins, attempts)) in enumerate(ordered[offset:offset + limit])]
+
+        standings = self._standings().subquery()
+        total = db.session.execute(select(func.count()).select_from(standings)).scalar()
+        rows = db.session.execute(
+            select(standings).order_by(standings.c.wins.desc(), standings.c.attempts, standings.c.user_id)
+            .offset(offset).limit(limit)
+        ).all()
+        return total, [self._entry(row.user_id, offset + index + 1, row.wins, row.attempts)
+                       for index, row in enumerate(rows)]
+
+    def rank(self, user_id):
+        return redis_breaker.call(self._rank, user_id)
+
+    def _rank(self, user_id):
+        pipe = self.redis.pipeline()
+        pipe.zrevrank(RANKING_KEY, user_id)
+        pipe.hget(WINS_KEY, user_id)
+        pipe.hget(ATTEMPTS_KEY, user_id)
+        position, wins, attempts = pipe.execute()
+        if position is None:
+            return None
+        return self._entry(str(user_id), position + 1, wins, attempts)
+
+    @staticmethod
+    def _entry(user_id, rank, wins, attempts):
+        wins, attempts = int(wins or 0), int(attempts or 0)
+        return {
+            "rank": rank,
+            "user_id": int(user_id),
+            "wins": wins,
+            "total_attempts": attempts,
+            "average_attempts": round(attempts / wins, 2) if wins else None
+        }
+
+    @staticmethod
+    def _standings():
+        """Wins and attempts summed over won games, one row per player.
+
+        Games completed before winner_id existed count for their player when
+        they only had one; older multi-player games have no known winner.
+        Attempts are taken as stored, so guesses sent after a game was won
+        are counted here but not by record_win.
+        """
+        other_scores = aliased(PlayerScore)
+        player_count = (select(func.count(other_scores.id))
+                        .where(other_scores.game_id == Game.id).scalar_subquery())
+        return (
+            select(PlayerScore.user_id.label('user_id'), func.count(PlayerScore.id).label('wins'),
+                   func.sum(PlayerScore.attempts).label('attempts'))
+            .join(Game, Game.id == PlayerScore.game_id)
+            .where(Game.status == 'completed')
+            .where((Game.winner_id == PlayerScore.user_id) | (Game.winner_id.is_(None) & (player_count == 1)))
+            .group_by(PlayerScore.user_id)
+        )
+
+    def _merged_standings(self):
+        """user_id -> [wins, attempts] summed over every database shard."""
+        merged = {}
+        for _ in each_shard():
+            for user_id, wins, attempts in db.session.execute(self._standings()):
+                totals = merged.setdefault(user_id, [0, 0])
+                totals[0] += wins
+                totals[1] += attempts
+        return merged
+
+    @staticmethod
+    def _archived_wins(archive, merged):
+        """Add the wins of archived games to merged, by the same rule as _standings()."""
+        for record in archive.records():
+            scores = record["players_scores"]
+            winner = record["winner_id"]
+            if winner is None and len(scores) == 1:
+                winner = next(iter(scores))
+            score = scores.get(str(winner)) if winner is not None else None
+            if score:
+                totals = merged.setdefault(int(winner), [0, 0])
+                totals[0] += 1
+                totals[1] += score["attempts"]
+
+    def rebuild(self, batch_size=1000, archive=None):
+        """Recompute the leaderboard from SQLite, plus archived games if given, and swap it in atomically."""
+        if SHARD_COUNT > 1 or (archive is not None and len(archive)):
+            merged = self._merged_standings()
+            if archive is not None:
+                self._archived_wins(archive, merged)
+            rows = [(user_id, wins, attempts) for user_id, (wins, attempts) in merged.items()]
+        else:
+            rows = db.session.execute(self._standings()).yield_per(batch_size)
+
+        staging = [f"{key}:rebuild" for key in (RANKING_KEY, WINS_KEY, ATTEMPTS_KEY)]
+        self.redis.delete(*staging)
+        pipe = self.redis.pipeline(transaction=False)
+        players = 0
+        for user_id, wins, attempts in rows:
+            pipe.zadd(staging[0], {user_id: wins * SCORE_SCALE - attempts})
+            pipe.hset(staging[1], user_id, wins)
+            pipe.hset(staging[2], user_id, attempts)
+            players += 1
+            if players % batch_size == 0:
+                pipe.execute()
+        pipe.execute()
+
+        pipe = self.redis.pipeline()
+        for key, staged in zip((RANKING_KEY, WINS_KEY, ATTEMPTS_KEY), staging):
+            if players:
+                pipe.rename(staged, key)
+            else:
+                pipe.delete(key)
+        pipe.execute()
+        return players
+
+
+leaderboard = Leaderboard(redis_client)
+
+
+def update_leaderboard(game_id, user_id, attempts):
+    try:
+        redis_breaker.call(leaderboard.record_win, user_id, attempts)
+    except CircuitOpenError:
+        # The win is still in SQLite; `python leaderboard.py` puts the ranking back in step
+        logging.warning(f"Redis circuit open, game {game_id} not added to the leaderboard")
+
+
+events.subscribe("game_completed", update_leaderboard)
+
+
+if __name__ == "__main__":
+    # python leaderboard.py  ->  rebuild the Redis leaderboard from the game database
+    logging.basicConfig(level=logging.INFO)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'sqlite:///game.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)
+    db.init_app(app)
+    with app.app_context():
+        try:
+            print(f"Leaderboard rebuilt with {leaderboard.rebuild(archive=init_archive(app))} players")
+        except redis.exceptions.RedisError as e:
+            print(f"Could not rebuild leaderboard: {e}")
@@ -0,0 +1,283 @@
+import os
+import time
+import logging
+import threading
+import requests
+from models.database import db, each_shard, shard_of, use_shard
+from models.game import Game
+from models.playerscore import PlayerScore
+from models.gameowner import GameOwner
+from playerstats import record_completed_games
+import events
+import deadline
+import tracing
+
+# Configuration Constants
+FLUSH_INTERVAL = float(os.getenv('LIVE_GAME_FLUSH_INTERVAL', '1.0'))  # Seconds between write-behind flushes
+LEASE_PERIOD = 3 * FLUSH_INTERVAL  # A claim not renewed for this long can be taken over
+HANDOFF_TIMEOUT = 2  # Seconds to wait for the owning replica to release a game
+
+
+class GameHandoffError(Exception):
+    """Raised when another replica holds a game and would not release it."""
+
+
+class LiveGame:
+    """In-memory copy of one game: status plus attempts/target for every player."""
+
+    def __init__(self, game_id, status, players):
+        self.game_id = game_id
+        self.status = status
+        self.winner_id = None
+        self.players = players  # user_id -> {"attempts": int, "target_number": int}
+        self.dirty = False
+        self.evicted = False  # Set once flushed and dropped, holders must reload
+        self.lock = threading.Lock()
+
+    def to_status(self):
+        return {
+            "game_id": self.game_id,
+            "status": self.status,
+            "players_scores": {user_id: dict(score) for user_id, score in self.players.items()}
+        }
+
+
+class LiveGameStore:
+    """Answers guesses from memory and writes attempts/status back to SQLite in batches.
+
+    Every game held here is claimed in the game_owners table. When a guess reaches a
+    replica that does not hold the game, it asks the current owner to flush and release
+    it (or waits out an expired lease) before loading it from the database.
+    """
+
+    def __init__(self, app, owner, address, flush_interval=FLUSH_INTERVAL):
+        self.app = app
+        self.owner = owner
+        self.address = address
+        self.flush_interval = flush_interval
+        self.games = {}
+        self.lock = threading.Lock()  # Guards self.games, each LiveGame has its own lock
+        self.flush_lock = threading.Lock()  # Only one flush writes at a time
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background write-behind thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='live-game-flusher', daemon=True)
+            self._thread.start()
+
+    def restart(self):
+        """Start a fresh flusher after fork(), the parent's thread and lock state are not usable here."""
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        for live_game in self.games.values():
+            live_game.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.start()
+
+    def stop(self):
+        """Stop the flusher and write out everything still pending."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self.app.app_context():
+            self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                logging.error(f"Live game flush failed: {e}")
+
+    def adopt(self, game_id, status, players):
+        """Hold a game that was just created on this replica."""
+        live_game = LiveGame(game_id, status, players)
+        with use_shard(shard_of(game_id)):
+            db.session.merge(GameOwner(game_id, self.owner, self.address, time.time() + LEASE_PERIOD))
+            db.session.commit()
+        with self.lock:
+            self.games[game_id] = live_game
+        return live_game
+
+    def get(self, game_id):
+        """Return the game if this replica already holds it."""
+        with self.lock:
+            return self.games.get(game_id)
+
+    def get_or_load(self, game_id):
+        """Return the live game, claiming it from the database (and its owner) if needed.
+
+        Returns None for unknown or completed games, those are served straight from SQLite.
+        """
+        live_game = self.get(game_id)
+        if live_game:
+            return live_game
+        shard = shard_of(game_id)
+        if shard is None:
+            return None
+        with use_shard(shard):
+            return self._load(game_id)
+
+    def _load(self, game_id):
+        claim = db.session.get(GameOwner, game_id)
+        if claim and claim.owner != self.owner and claim.lease_expires > time.time():
+            if not self._request_handoff(claim):
+                raise GameHandoffError(f"Game {game_id} is held by {claim.owner}")
+
+        game = db.session.get(Game, game_id)
+        if not game or game.status == 'completed':
+            return None
+        player_scores = PlayerScore.query.filter_by(game_id=game_id).all()
+        players = {ps.user_id: {"attempts": ps.attempts, "target_number": ps.target_number} for ps in player_scores}
+
+        with self.lock:
+            live_game = self.games.get(game_id)
+            if live_game:
+                return live_game
+            live_game = LiveGame(game.id, game.status, players)
+            self.games[game_id] = live_game
+        db.session.merge(GameOwner(game_id, self.owner, self.address, time.time() + LEASE_PERIOD))
+        db.session.commit()
+        return live_game
+
+    def _request_handoff(self, claim):
+        """Ask the owning replica to flush and drop the game. Returns True once it is free."""
+        try:
+            with tracing.span("POST handoff", kind='client', owner=claim.owner, game_id=claim.game_id):
+                response = requests.post(f"{claim.address}/internal/games/{claim.game_id}/release",
+                                         json={"requested_by": self.owner}, timeout=deadline.cap(HANDOFF_TIMEOUT),
+                                         headers={**deadline.outgoing_headers(), **tracing.outgoing_headers()})
+            if response.status_code == 200:
+                db.session.expire_all()  # Pick up the rows the owner just flushed
+                return True
+            logging.warning(f"Handoff of game {claim.game_id} from {claim.owner} refused: {response.status_code}")
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"Handoff of game {claim.game_id} from {claim.owner} failed: {e}")
+        return False
+
+    def guess(self, live_game, user_id, guess):
+        """Apply one guess. Returns (payload, status_code) just like make_guess, or None if the game was released."""
+        with live_game.lock:
+            if live_game.evicted:
+                return None
+            score = live_game.players.get(user_id)
+            if score is None:
+                return {"error": f"User {user_id} is not part of this game"}, 404
+
+            # Compare before counting the attempt, so a guess that cannot be compared costs nothing
+            correct = guess == score["target_number"]
+            message = None if correct else ("Higher!" if guess < score["target_number"] else "Lower!")
+            score["attempts"] += 1
+            live_game.dirty = True
+            attempts = score["attempts"]
+            first_completion = correct and live_game.status != 'completed'
+            if first_completion:
+                live_game.status = 'completed'
+                live_game.winner_id = user_id
+
+        # Listeners do Redis and Socket.IO I/O, which must not hold up other guesses or the flusher
+        if not correct:
+            events.emit("guess_applied", game_id=live_game.game_id, user_id=user_id, attempts=attempts,
+                        message=message)
+            return {"message": message, "attempts": attempts}, 200
+
+        # A finished game is written through right away instead of waiting for the timer
+        self.flush(game_ids=[live_game.game_id])
+        message = "Correct! You've guessed the number!"
+        events.emit("guess_applied", game_id=live_game.game_id, user_id=user_id, attempts=attempts, message=message)
+        if first_completion:
+            events.emit("game_completed", game_id=live_game.game_id, user_id=user_id, attempts=attempts)
+        return {"message": message, "attempts": attempts}, 200
+
+    def release(self, game_id):
+        """Flush and forget a game so another replica can take it over."""
+        self.flush(game_ids=[game_id], evict=True)
+
+    def flush(self, game_ids=None, evict=False):
+        """Write dirty games back in one transaction and renew this replica's leases."""
+        with self.flush_lock:
+            with self.lock:
+                if game_ids is None:
+                    candidates = list(self.games.values())
+                else:
+                    candidates = [self.games[gid] for gid in game_ids if gid in self.games]
+
+            score_rows, game_rows, finished = [], [], []
+            for live_game in candidates:
+                with live_game.lock:
+                    if live_game.dirty:
+                        for user_id, score in live_game.players.items():
+                            score_rows.append({"game_id": live_game.game_id, "user_id": user_id,
+                                               "attempts": score["attempts"]})
+                        game_rows.append({"id": live_game.game_id, "status": live_game.status,
+                                          "winner_id": live_game.winner_id, "completed_at": time.time()})
+                        live_game.dirty = False
+                    if evict or live_game.status == 'completed':
+                        live_game.evicted = True
+                        finished.append(live_game.game_id)
+
+            try:
+                # One transaction per database shard, each only writing its own games
+                for shard in each_shard():
+                    completed_ids = []
+                    for row in score_rows:
+                        if shard_of(row["game_id"]) == shard:
+                            PlayerScore.query.filter_by(game_id=row["game_id"], user_id=row["user_id"]).update(
+                                {"attempts": row["attempts"]}, synchronize_session=False)
+                    for row in game_rows:
+                        if shard_of(row["id"]) == shard:
+                            values = {"status": row["status"]}
+                            if row["winner_id"] is not None:
+                                values["winner_id"] = row["winner_id"]
+                            query = Game.query.filter_by(id=row["id"])
+                            if row["status"] != 'completed':
+                                query.update(values, synchronize_session=False)
+                                continue
+                            values["completed_at"] = row["completed_at"]
+                            # Stats count a game once, even when a failed flush is retried
+                            if query.filter(Game.status != 'completed').update(values, synchronize_session=False):
+                                completed_ids.append(row["id"])
+                    record_completed_games(completed_ids)
+                    shard_finished = [game_id for game_id in finished if shard_of(game_id) == shard]
+                    if shard_finished:
+                        GameOwner.query.filter(GameOwner.game_id.in_(shard_finished),
+                                               GameOwner.owner == self.owner).delete(synchronize_session=False)
+                    GameOwner.query.filter_by(owner=self.owner).update(
+                        {"lease_expires": time.time() + LEASE_PERIOD}, synchronize_session=False)
+                    db.session.commit()
+            except Exception:
+                db.session.rollback()
+                # Put the changes back so the next flush retries them
+                flushed_ids = {row["id"] for row in game_rows}
+                for live_game in candidates:
+                    with live_game.lock:
+                        if live_game.game_id in flushed_ids:
+                            live_game.dirty = True
+                        if live_game.game_id in finished:
+                            live_game.evicted = False
+                raise
+
+            if finished:
+                with self.lock:
+                    for game_id in finished:
+                        self.games.pop(game_id, None)
+
+        if game_rows:
+            events.emit("games_flushed", game_ids=[row["id"] for row in game_rows])
+
+
+def init_live_store(app):
+    """Create and start the live game store when LIVE_GAME_STATE is enabled."""
+    if os.getenv('LIVE_GAME_STATE', '0') != '1':
+        return None
+    owner = os.getenv('SERVICE_NAME', 'game_service')
+    address = f"http://{os.getenv('HOSTNAME', 'localhost')}:{os.getenv('SERVICE_PORT', '5002')}"
+    store = LiveGameStore(app, owner, address)
+    app.extensions['live_store'] = store
+    store.start()
+    return store
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import random
+import logging
+from sqlalchemy import insert
+from models.database import db, new_game_shard, use_shard
+from models.game import Game
+from models.playerscore import PlayerScore
+from redis_client import redis_client
+from playerstats import get_stats
+
+# Configuration Constants
+ROOM_SIZE = int(os.getenv('MATCH_ROOM_SIZE', '2'))  # Players per matched game
+BUCKET_WIDTH = float(os.getenv('MATCH_BUCKET_WIDTH', '2'))  # Average-attempts range sharing one queue
+WIDEN_AFTER = float(os.getenv('MATCH_WIDEN_AFTER', '10'))  # Seconds of waiting per extra bucket of skill distance
+MAX_WIDEN = int(os.getenv('MATCH_MAX_WIDEN', '2'))  # Furthest neighbouring bucket a room may draw from
+IDLE_TIMEOUT = int(os.getenv('MATCH_IDLE_TIMEOUT', '30'))  # Seconds without a join or poll before a player is dropped
+MAX_WAIT = int(os.getenv('MATCH_MAX_WAIT', '300'))  # Seconds in the queue after which a player has to join again
+DEFAULT_SKILL = 7.0  # Average attempts assumed for players without completed games (~log2(100))
+ASSIGNMENT_TTL = 600  # Seconds a match assignment can be polled
+
+QUEUE_KEY = "mm:queue:{bucket}"  # Sorted set of waiting user_ids, scored by enqueue time
+USER_KEY = "mm:user:{user_id}"  # Bucket a waiting user is queued in, expires IDLE_TIMEOUT after their last poll
+ASSIGNMENT_KEY = "mm:assignment:{user_id}"  # JSON match assignment once a room is formed
+
+# Enqueue (ARGV[6] == '1') or re-check a polling player, and form a room, in one atomic
+# step so replicas never hand the same player to two rooms. Every key it touches is
+# passed in KEYS: KEYS[1] is the player's USER_KEY, then ARGV[9] queues (their own
+# first, then the neighbours nearest first, bucket numbers in ARGV[10..]), then the
+# USER_KEY of each candidate read from those queues beforehand, whose queue number and
+# user_id follow in ARGV. Entries older than ARGV[8] seconds are trimmed, and candidates
+# whose USER_KEY expired (they stopped polling) are removed instead of matched. Own
+# bucket candidates come first, oldest first; a neighbour at distance d joins once either
+# of the two has waited d * ARGV[5] seconds. Returns {user_id, bucket, ...} of the room,
+# or {} while short.
+MATCH_SCRIPT = """
+local now = tonumber(ARGV[2])
+local room_size = tonumber(ARGV[3])
+local queue_count = tonumber(ARGV[9])
+if ARGV[6] == '1' then
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        return {}
+    end
+    redis.call('ZADD', KEYS[2], now, ARGV[1])
+    redis.call('SET', KEYS[1], ARGV[4], 'EX', ARGV[7])
+elseif redis.call('GET', KEYS[1]) ~= ARGV[4] then
+    return {}
+else
+    redis.call('EXPIRE', KEYS[1], ARGV[7])
+end
+for q = 1, queue_count do
+    redis.call('ZREMRANGEBYSCORE', KEYS[q + 1], '-inf', now - tonumber(ARGV[8]))
+end
+local joined = redis.call('ZSCORE', KEYS[2], ARGV[1])
+if not joined then
+    redis.call('DEL', KEYS[1])
+    return {}
+end
+local waited = now - tonumber(joined)
+local picked = {{KEYS[2], KEYS[1], ARGV[1], ARGV[4]}}
+local first = 10 + queue_count
+for c = 0, (#ARGV - first + 1) / 2 - 1 do
+    if #picked == room_size then
+        break
+    end
+    local q = tonumber(ARGV[first + 2 * c])
+    local member = ARGV[first + 2 * c + 1]
+    local queue, user_key, bucket = KEYS[q + 1], KEYS[queue_count + 2 + c], ARGV[9 + q]
+    local score = redis.call('ZSCORE', queue, member)
+    if member ~= ARGV[1] and score then
+        if redis.call('GET', user_key) ~= bucket then
+            redis.call('ZREM', queue, member)
+        else
+            local patience = math.abs(tonumber(bucket) - tonumber(ARGV[4])) * tonumber(ARGV[5])
+            if waited >= patience or now - tonumber(score) >= patience then
+                picked[#picked + 1] = {queue, user_key, member, bucket}
+            end
+        end
+    end
+end
+if #picked < room_size then
+    return {}
+end
+local members = {}
+for _, entry in ipairs(picked) do
+    redis.call('ZREM', entry[1], entry[3])
+    redis.call('DEL', entry[2])
+    members[#members + 1] = entry[3]
+    members[#members + 1] = entry[4]
+end
+return members
+"""
+
+
+class Matchmaker:
+    """Skill-bucketed matchmaking queue backed by Redis sorted sets.
+
+    Players are matched within their bucket. The longer someone waits, the
+    further into neighbouring buckets their room may reach, up to MAX_WIDEN,
+    so a player in a sparse bucket is not left waiting. Both joins and polls
+    try to form a room. A player who stops polling for IDLE_TIMEOUT, or has
+    waited MAX_WAIT, is dropped from the queue.
+    """
+
+    def __init__(self, redis_conn, room_size=ROOM_SIZE, bucket_width=BUCKET_WIDTH, widen_after=WIDEN_AFTER,
+                 max_widen=MAX_WIDEN, idle_timeout=IDLE_TIMEOUT, max_wait=MAX_WAIT):
+        self.redis = redis_conn
+        self.room_size = room_size
+        self.bucket_width = bucket_width
+        self.widen_after = widen_after
+        self.max_widen = max_widen
+        self.idle_timeout = idle_timeout
+        self.max_wait = max_wait
+        self.candidates_per_queue = 4 * room_size  # Leaves room for entries of players who stopped polling
+        self.match_script = self.redis.register_script(MATCH_SCRIPT)
+
+    def skill_of(self, user_id):
+        """Historical average attempts over the user's completed games, from player_stats."""
+        average = get_stats([user_id])[user_id]["average_attempts"]
+        return average if average is not None else DEFAULT_SKILL
+
+    def bucket_of(self, skill):
+        return int(skill // self.bucket_width)
+
+    def join(self, user_id):
+        """Queue a player. Returns the assignment if this join completed a room, else None."""
+        bucket = self.bucket_of(self.skill_of(user_id))
+        self.redis.delete(ASSIGNMENT_KEY.format(user_id=user_id))  # Forget the previous match
+        return self.match(user_id, bucket, enqueue=True)
+
+    def match(self, user_id, bucket, enqueue=False):
+        """Form a room around a queued player if enough compatible players wait. Returns the assignment or None."""
+        buckets = [bucket] + [bucket + sign * distance for distance in range(1, self.max_widen + 1)
+                              for sign in (-1, 1) if bucket + sign * distance >= 0]
+        # Read the heads of the queues first, so the script is given every key it touches
+        pipe = self.redis.pipeline()
+        for queue_bucket in buckets:
+            pipe.zrange(QUEUE_KEY.format(bucket=queue_bucket), 0, self.candidates_per_queue - 1)
+        candidates = [(number, int(member)) for number, members in enumerate(pipe.execute(), start=1)
+                      for member in members if int(member) != user_id]
+
+        result = self.match_script(
+            keys=[USER_KEY.format(user_id=user_id)]
+            + [QUEUE_KEY.format(bucket=queue_bucket) for queue_bucket in buckets]
+            + [USER_KEY.format(user_id=member) for _, member in candidates],
+            args=[user_id, time.time(), self.room_size, bucket, self.widen_after, '1' if enqueue else '0',
+                  self.idle_timeout, self.max_wait, len(buckets), *buckets,
+                  *(value for candidate in candidates for value in candidate)]
+        )
+        if not result:
+            return None
+        members = {int(member): int(member_bucket) for member, member_bucket in zip(result[::2], result[1::2])}
+
+        try:
+            assignment = self.create_room(list(members), bucket)
+        except Exception:
+            logging.error(f"Could not create a room for {list(members)}, putting them back in the queue")
+            db.session.rollback()
+            now = time.time()
+            pipe = self.redis.pipeline()
+            for member, member_bucket in members.items():
+                pipe.zadd(QUEUE_KEY.format(bucket=member_bucket), {member: now})
+                pipe.set(USER_KEY.format(user_id=member), member_bucket, ex=self.idle_timeout)
+            pipe.execute()
+            raise
+        return assignment
+
+    def leave(self, user_id):
+        """Remove a waiting player from the queue. Returns False if they were not waiting."""
+        bucket = self.redis.get(USER_KEY.format(user_id=user_id))
+        if bucket is None:
+            return False
+        pipe = self.redis.pipeline()
+        pipe.zrem(QUEUE_KEY.format(bucket=bucket), user_id)
+        pipe.delete(USER_KEY.format(user_id=user_id))
+        pipe.execute()
+        return True
+
+    def poll(self, user_id):
+        """Return the player's match assignment, their place in the queue, or None."""
+        assignment = self.redis.get(ASSIGNMENT_KEY.format(user_id=user_id))
+        if assignment:
+            return json.loads(assignment)
+
+        bucket = self.redis.get(USER_KEY.format(user_id=user_id))
+        if bucket is None:
+            return None
+        # A poll may find the player has now waited long enough to be matched with a neighbouring bucket
+        assignment = self.match(user_id, int(bucket))
+        if assignment:
+            return assignment
+        pipe = self.redis.pipeline()
+        pipe.zrank(QUEUE_KEY.format(bucket=bucket), user_id)
+        pipe.zcard(QUEUE_KEY.format(bucket=bucket))
+        position, waiting = pipe.execute()
+        if position is None:
+            return None
+        return {"status": "waiting", "bucket": int(bucket), "position": position + 1, "waiting": waiting}
+
+    def create_room(self, user_ids, bucket):
+        """Create the Game and every PlayerScore row for a formed room, then publish the assignment."""
+        target_number = random.randint(1, 100)
+        with use_shard(new_game_shard()):
+            game = Game(status='in_progress')
+            db.session.add(game)
+            db.session.flush()  # Assigns game.id inside the same transaction
+            game_id = game.id
+            db.session.execute(insert(PlayerScore), [
+                {"game_id": game_id, "user_id": user_id, "attempts": 0, "target_number": target_number}
+                for user_id in user_ids
+            ])
+            db.session.commit()
+
+        assignment = {"status": "matched", "game_id": game_id, "players": user_ids, "bucket": bucket}
+        pipe = self.redis.pipeline()
+        for user_id in user_ids:
+            pipe.setex(ASSIGNMENT_KEY.format(user_id=user_id), ASSIGNMENT_TTL, json.dumps(assignment))
+        pipe.execute()
+        return assignment
+
+
+matchmaker = Matchmaker(redis_client)
@@ -0,0 +1,107 @@
+# migrate_db.py
+import os
+import logging
+from flask import Flask
+from sqlalchemy.schema import CreateIndex, CreateTable
+from models.database import db, configure_shards, create_shards
+from models.game import Game
+from models.playerscore import PlayerScore
+from playerstats import backfill_history
+
+
+def add_column(table, column, ddl):
+    """Migration step adding a column, skipped when create_all() already made it."""
+    def step(conn):
+        columns = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    return step
+
+
+def use_autoincrement(model):
+    """Migration step rebuilding a table created without AUTOINCREMENT, so deleted ids are never handed out again.
+
+    Without it SQLite reuses the highest rowid once that row is deleted, which
+    the archiver does to the newest completed games. The copied rows leave
+    sqlite_sequence at the current max(id).
+    """
+    table = model.__table__
+
+    def step(conn):
+        sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                   (table.name,)).scalar()
+        if sql is None or 'AUTOINCREMENT' in sql.upper():
+            return
+        old_columns = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+        columns = ", ".join(column.name for column in table.columns if column.name in old_columns)
+        create = str(CreateTable(table).compile(dialect=conn.dialect))
+        conn.exec_driver_sql(create.replace(f"TABLE {table.name} ", f"TABLE {table.name}_rebuilt ", 1))
+        conn.exec_driver_sql(f"INSERT INTO {table.name}_rebuilt ({columns}) SELECT {columns} FROM {table.name}")
+        conn.exec_driver_sql(f"DROP TABLE {table.name}")  # Its indexes go with it
+        conn.exec_driver_sql(f"ALTER TABLE {table.name}_rebuilt RENAME TO {table.name}")
+        for index in table.indexes:
+            conn.exec_driver_sql(str(CreateIndex(index).compile(dialect=conn.dialect)))
+    return step
+
+
+# Each migration runs once, tracked through SQLite's PRAGMA user_version.
+# db.create_all() only creates missing tables, so anything that changes an
+# existing table (indexes, columns) has to be added here as well. A step is
+# either an idempotent SQL string or a callable taking the connection.
+MIGRATIONS = [
+    (1, "Unique index on player_scores (game_id, user_id)", [
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_player_scores_game_user ON player_scores (game_id, user_id)",
+    ]),
+    (2, "Index on player_scores (user_id)", [
+        "CREATE INDEX IF NOT EXISTS ix_player_scores_user ON player_scores (user_id)",
+    ]),
+    (3, "Record the winner of completed games", [
+        add_column("games", "winner_id", "INTEGER"),
+    ]),
+    (4, "Record when games were completed, for archiving", [
+        add_column("games", "completed_at", "FLOAT"),
+        # Older games are dated to the migration, so they reach the archive one threshold later
+        "UPDATE games SET completed_at = CAST(strftime('%s', 'now') AS REAL) "
+        "WHERE status = 'completed' AND completed_at IS NULL",
+        "CREATE INDEX IF NOT EXISTS ix_games_completed_at ON games (completed_at)",
+    ]),
+    (5, "Fill player_stats from the games completed so far", [
+        backfill_history,
+    ]),
+    (6, "Stop reusing the ids of deleted (archived) games", [
+        use_autoincrement(Game),
+        use_autoincrement(PlayerScore),
+    ]),
+]
+
+
+def migrate(engine=None):
+    """Apply pending migrations to one database, by default the one bound to the current app context."""
+    with (engine or db.engine).begin() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        for number, description, statements in MIGRATIONS:
+            if number <= version:
+                continue
+            logging.info(f"Applying migration {number}: {description}")
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.exec_driver_sql(statement)
+            conn.exec_driver_sql(f"PRAGMA user_version = {number}")
+            version = number
+    return version
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'sqlite:///game.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        create_shards()
+        for key, engine in db.engines.items():
+            print(f"Database {key or 'default'} is at schema version {migrate(engine)}")
@@ -1,3 +1,107 @@
+import os
+import sqlite3
+import random
+import contextvars
+from contextlib import contextmanager
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
-db = SQLAlchemy()
+# Configuration Constants
+SHARD_COUNT = int(os.getenv('GAME_DB_SHARDS', '1'))  # Database files games are spread across
+SHARD_ID_SPAN = 1_000_000_000  # Shard k hands out ids from k * SHARD_ID_SPAN + 1, so an id names its shard
+SHARD_URI_SUFFIX = "_shard{shard}"  # game.db -> game_shard1.db, game_shard2.db, ...
+SEQUENCED_TABLES = ("games", "player_scores", "tournaments")  # Tables whose ids are allocated per shard
+JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')  # WAL lets readers run alongside the writer
+BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))  # Wait this long for the write lock
+
+_current_shard = contextvars.ContextVar('game_shard', default=None)
+
+
+class ShardedSession(Session):
+    """db.session that sends every statement to the shard selected with use_shard().
+
+    Outside use_shard() (and for shard 0) it behaves like the stock session and
+    uses SQLALCHEMY_DATABASE_URI.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        shard = _current_shard.get()
+        if bind is None and shard:
+            return self._db.engines[shard_bind_key(shard)]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': ShardedSession})
+
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")  # Only takes effect on new files, see archive.reclaim_space
+    cursor.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+    if JOURNAL_MODE.upper() == 'WAL':
+        cursor.execute("PRAGMA synchronous = NORMAL")  # Durable at checkpoints, safe against corruption
+    cursor.close()
+
+
+def shard_bind_key(shard):
+    return f"shard{shard}"
+
+
+def shard_of(game_id):
+    """Shard holding a game, or None if the id belongs to no configured shard."""
+    shard = int(game_id) // SHARD_ID_SPAN
+    return shard if 0 <= shard < SHARD_COUNT else None
+
+
+def new_game_shard():
+    """Shard a new game is created in. Random, so every replica spreads its writes over all files."""
+    return random.randrange(SHARD_COUNT)
+
+
+@contextmanager
+def use_shard(shard):
+    """Route db.session to one shard for the duration of the block. None leaves routing unchanged."""
+    if shard is None:
+        yield
+        return
+    token = _current_shard.set(shard)
+    try:
+        yield
+    finally:
+        _current_shard.reset(token)
+
+
+def each_shard():
+    """Yield every shard number with db.session routed to it, for queries that span all games."""
+    for shard in range(SHARD_COUNT):
+        with use_shard(shard):
+            yield shard
+
+
+def configure_shards(app):
+    """Add a bind per extra shard, derived from SQLALCHEMY_DATABASE_URI. Call before db.init_app()."""
+    base_uri = app.config['SQLALCHEMY_DATABASE_URI']
+    root, extension = os.path.splitext(base_uri)
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    for shard in range(1, SHARD_COUNT):
+        binds.setdefault(shard_bind_key(shard), root + SHARD_URI_SUFFIX.format(shard=shard) + extension)
+
+
+def create_shards():
+    """Create the tables on every extra shard and start its id sequences at the shard's range."""
+    for shard in range(1, SHARD_COUNT):
+        engine = db.engines[shard_bind_key(shard)]
+        db.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            for table in SEQUENCED_TABLES:
+                conn.exec_driver_sql(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT ?, 0 "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)", (table, table))
+                conn.exec_driver_sql("UPDATE sqlite_sequence SET seq = ? WHERE name = ? AND seq < ?",
+                                     (shard * SHARD_ID_SPAN, table, shard * SHARD_ID_SPAN))
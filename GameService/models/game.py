@@ -2,9 +2,15 @@ from models.database import db
 
 class Game(db.Model):
     __tablename__ = 'games'
+    __table_args__ = (
+        db.Index('ix_games_completed_at', 'completed_at'),  # Archiver picks old completed games
+        {'sqlite_autoincrement': True},  # Ids follow sqlite_sequence, which each shard seeds
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     status = db.Column(db.String(50), nullable=False)
+    winner_id = db.Column(db.Integer, nullable=True)  # user_id of the player who guessed the number
+    completed_at = db.Column(db.Float, nullable=True)  # Unix time the game was won
     players = db.relationship('PlayerScore', backref='game', lazy=True)  # Relationship to PlayerScore
 
     def __init__(self, status):
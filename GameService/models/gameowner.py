@@ -0,0 +1,15 @@
+from models.database import db
+
+class GameOwner(db.Model):
+    __tablename__ = 'game_owners'
+
+    game_id = db.Column(db.Integer, db.ForeignKey('games.id'), primary_key=True)  # Game held in memory
+    owner = db.Column(db.String(100), nullable=False)  # SERVICE_NAME of the replica holding it
+    address = db.Column(db.String(200), nullable=False)  # Base URL used for handoff requests
+    lease_expires = db.Column(db.Float, nullable=False)  # Unix time after which the claim is stale
+
+    def __init__(self, game_id, owner, address, lease_expires):
+        self.game_id = game_id
+        self.owner = owner
+        self.address = address
+        self.lease_expires = lease_expires
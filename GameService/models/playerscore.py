@@ -2,6 +2,11 @@ from models.database import db
 
 class PlayerScore(db.Model):
     __tablename__ = 'player_scores'
+    __table_args__ = (
+        db.Index('ix_player_scores_game_user', 'game_id', 'user_id', unique=True),  # make_guess lookup key
+        db.Index('ix_player_scores_user', 'user_id'),  # Per-player history (matchmaking skill)
+        {'sqlite_autoincrement': True},  # Ids follow sqlite_sequence, which each shard seeds
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     game_id = db.Column(db.Integer, db.ForeignKey('games.id'), nullable=False)  # Foreign key to Game
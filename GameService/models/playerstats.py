@@ -0,0 +1,10 @@
+from models.database import db
+
+class PlayerStats(db.Model):
+    __tablename__ = 'player_stats'
+
+    user_id = db.Column(db.Integer, primary_key=True)  # One row per player and database shard
+    games_played = db.Column(db.Integer, nullable=False, default=0)  # Completed games the player was in
+    games_won = db.Column(db.Integer, nullable=False, default=0)
+    total_attempts = db.Column(db.Integer, nullable=False, default=0)  # Summed over games_played
+    best_attempts = db.Column(db.Integer, nullable=True)  # Fewest attempts in a won game, None until a win
@@ -0,0 +1,13 @@
+from models.database import db
+
+class Tournament(db.Model):
+    __tablename__ = 'tournaments'
+    __table_args__ = {'sqlite_autoincrement': True}  # Ids follow sqlite_sequence, which each shard seeds
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(50), nullable=False)  # registering, running or finished
+    round = db.Column(db.Integer, nullable=False, default=0)  # Round being played, 0 while registering
+    group_size = db.Column(db.Integer, nullable=False)  # Players per game in a round
+    winner_id = db.Column(db.Integer, nullable=True)  # user_id of the last player left
+    created_at = db.Column(db.Float, nullable=False)  # Unix time
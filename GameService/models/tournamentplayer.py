@@ -0,0 +1,14 @@
+from models.database import db
+
+class TournamentPlayer(db.Model):
+    __tablename__ = 'tournament_players'
+    __table_args__ = (
+        db.Index('ix_tournament_players_user', 'tournament_id', 'user_id', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)  # Join order, seeds round 1
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.id'), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    seed = db.Column(db.Integer, nullable=True)  # 1 is the strongest player in the current round
+    game_id = db.Column(db.Integer, nullable=True)  # Game of the current round, same shard as the tournament
+    eliminated_round = db.Column(db.Integer, nullable=True)  # Round the player dropped out in, None while playing
@@ -0,0 +1,145 @@
+# playerstats.py
+import os
+import logging
+from flask import Flask
+from sqlalchemy import case, delete, func, select, true
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import aliased
+from models.database import db, configure_shards, each_shard, shard_of
+from models.game import Game
+from models.playerscore import PlayerScore
+from models.playerstats import PlayerStats
+from archive import init_archive
+
+# Configuration Constants
+MAX_STATS_BATCH = 500  # Most users accepted by one POST /stats call
+
+STAT_COLUMNS = ("user_id", "games_played", "games_won", "total_attempts", "best_attempts")
+
+
+def _won():
+    """Whether a player_scores row won its game, by the same rule as the leaderboard."""
+    other_scores = aliased(PlayerScore)
+    player_count = (select(func.count(other_scores.id))
+                    .where(other_scores.game_id == Game.id).scalar_subquery())
+    return (Game.winner_id == PlayerScore.user_id) | (Game.winner_id.is_(None) & (player_count == 1))
+
+
+def _aggregate(condition):
+    """Stats per player over the completed games matching condition, in STAT_COLUMNS order."""
+    won = _won()
+    return (
+        select(PlayerScore.user_id, func.count(PlayerScore.id), func.sum(case((won, 1), else_=0)),
+               func.sum(PlayerScore.attempts), func.min(case((won, PlayerScore.attempts))))
+        .join(Game, Game.id == PlayerScore.game_id)
+        .where(Game.status == 'completed', condition)
+        .group_by(PlayerScore.user_id)
+    )
+
+
+def _upsert(source):
+    """INSERT ... ON CONFLICT adding source (a select or list of rows) to the stats already stored."""
+    stmt = insert(PlayerStats)
+    stmt = stmt.from_select(STAT_COLUMNS, source) if not isinstance(source, list) else stmt.values(source)
+    excluded = stmt.excluded
+    return stmt.on_conflict_do_update(index_elements=[PlayerStats.user_id], set_={
+        "games_played": PlayerStats.games_played + excluded.games_played,
+        "games_won": PlayerStats.games_won + excluded.games_won,
+        "total_attempts": PlayerStats.total_attempts + excluded.total_attempts,
+        "best_attempts": func.min(func.coalesce(PlayerStats.best_attempts, excluded.best_attempts),
+                                  func.coalesce(excluded.best_attempts, PlayerStats.best_attempts)),
+    })
+
+
+def record_completed_games(game_ids):
+    """Add just-completed games to their players' stats.
+
+    Runs on the session's current transaction and shard, so callers do this
+    next to the UPDATE that completes the games and commit both together.
+    """
+    if game_ids:
+        db.session.execute(_upsert(_aggregate(PlayerScore.game_id.in_(list(game_ids)))))
+
+
+def get_stats(user_ids):
+    """user_id -> stats summed over every database shard. Players without completed games get zeros."""
+    totals = {user_id: {"games_played": 0, "games_won": 0, "total_attempts": 0, "best_attempts": None}
+              for user_id in user_ids}
+    for _ in each_shard():
+        for row in db.session.execute(select(PlayerStats).where(PlayerStats.user_id.in_(list(totals)))).scalars():
+            entry = totals[row.user_id]
+            entry["games_played"] += row.games_played
+            entry["games_won"] += row.games_won
+            entry["total_attempts"] += row.total_attempts
+            if row.best_attempts is not None:
+                entry["best_attempts"] = min(entry["best_attempts"] or row.best_attempts, row.best_attempts)
+    return {user_id: {
+        "user_id": user_id,
+        "games_played": entry["games_played"],
+        "games_won": entry["games_won"],
+        "average_attempts": round(entry["total_attempts"] / entry["games_played"], 2)
+        if entry["games_played"] else None,
+        "best_attempts": entry["best_attempts"],
+    } for user_id, entry in totals.items()}
+
+
+def backfill_history(conn):
+    """Migration step filling an empty player_stats table from the games already completed."""
+    if conn.execute(select(func.count()).select_from(PlayerStats)).scalar() == 0:
+        conn.execute(insert(PlayerStats).from_select(STAT_COLUMNS, _aggregate(true())))
+
+
+def _archived_stats(archive):
+    """shard -> {user_id: row} for games moved to the archive, which are no longer in player_scores."""
+    per_shard = {}
+    for record in archive.records():
+        scores = record["players_scores"]
+        winner = record["winner_id"]
+        if winner is None and len(scores) == 1:
+            winner = next(iter(scores))
+        rows = per_shard.setdefault(shard_of(record["game_id"]) or 0, {})
+        for user_id, score in scores.items():
+            row = rows.setdefault(int(user_id), {"user_id": int(user_id), "games_played": 0, "games_won": 0,
+                                                 "total_attempts": 0, "best_attempts": None})
+            row["games_played"] += 1
+            row["total_attempts"] += score["attempts"]
+            if winner is not None and int(user_id) == int(winner):
+                row["games_won"] += 1
+                row["best_attempts"] = min(row["best_attempts"] or score["attempts"], score["attempts"])
+    return per_shard
+
+
+def backfill(archive=None, batch_size=1000):
+    """Rebuild player_stats on every shard from player_scores and the archive. Returns players per shard.
+
+    Each shard is rebuilt in one transaction by a single INSERT ... SELECT,
+    which SQLite streams through the player_scores user_id index; readers
+    keep seeing the old rows until it commits. Attempts are taken as stored,
+    so guesses sent after a game was won are counted here but not by
+    record_completed_games.
+    """
+    archived = _archived_stats(archive) if archive is not None else {}
+    summary = {}
+    for shard in each_shard():
+        db.session.execute(delete(PlayerStats))
+        db.session.execute(insert(PlayerStats).from_select(STAT_COLUMNS, _aggregate(true())))
+        rows = list(archived.get(shard, {}).values())
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(_upsert(rows[start:start + batch_size]))
+        summary[shard] = db.session.execute(select(func.count()).select_from(PlayerStats)).scalar()
+        db.session.commit()
+    return summary
+
+
+if __name__ == "__main__":
+    # python playerstats.py  ->  rebuild player_stats from game history
+    logging.basicConfig(level=logging.INFO)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'sqlite:///game.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)
+    db.init_app(app)
+    game_archive = init_archive(app)
+    with app.app_context():
+        for shard, players in backfill(game_archive).items():
+            print(f"Shard {shard}: stats rebuilt for {players} players")
@@ -0,0 +1,112 @@
+import os
+from flask import current_app
+from flask_socketio import SocketIO, emit, join_room, leave_room
+from sqlalchemy import select
+from models.database import db, shard_of, use_shard
+from models.game import Game
+from models.playerscore import PlayerScore
+from redis_client import REDIS_HOST, REDIS_PORT
+import events
+
+# Every replica publishes through the same Redis channel, so a client connected
+# to game_service_1 still hears about guesses handled by game_service_3.
+# Set SOCKETIO_MESSAGE_QUEUE to an empty string for a single process without Redis.
+MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', f'redis://{REDIS_HOST}:{REDIS_PORT}/0') or None
+NAMESPACE = '/games'
+# Comma-separated transports to accept, e.g. "websocket" when several workers share a port. Default: all
+TRANSPORTS = os.getenv('SOCKETIO_TRANSPORTS', '')
+
+socketio = SocketIO()
+
+
+def init_realtime(app):
+    """Attach the Socket.IO server to the app. Handlers below are registered at import time."""
+    socketio.init_app(app, cors_allowed_origins='*', message_queue=MESSAGE_QUEUE,
+                      transports=TRANSPORTS.split(',') if TRANSPORTS else None)
+    return socketio
+
+
+def room_for(game_id):
+    return f"game:{game_id}"
+
+
+def game_snapshot(game_id):
+    """Current attempts and status of a game, sent once when a client subscribes."""
+    live_store = current_app.extensions.get('live_store')
+    live_game = live_store.get(game_id) if live_store else None
+    if live_game:
+        with live_game.lock:
+            return {
+                "game_id": game_id,
+                "status": live_game.status,
+                "players_scores": {user_id: {"attempts": score["attempts"]}
+                                   for user_id, score in live_game.players.items()}
+            }
+
+    shard = shard_of(game_id)
+    rows = []
+    if shard is not None:
+        with use_shard(shard):
+            rows = db.session.execute(
+                select(Game.id, Game.status, PlayerScore.user_id, PlayerScore.attempts)
+                .outerjoin(PlayerScore, PlayerScore.game_id == Game.id)
+                .where(Game.id == game_id)
+            ).all()
+    if not rows:
+        archived = current_app.extensions['game_archive'].lookup(game_id)
+        if not archived:
+            return None
+        return {
+            "game_id": archived["game_id"],
+            "status": archived["status"],
+            "players_scores": {user_id: {"attempts": score["attempts"]}
+                               for user_id, score in archived["players_scores"].items()}
+        }
+    return {
+        "game_id": rows[0].id,
+        "status": rows[0].status,
+        "players_scores": {row.user_id: {"attempts": row.attempts} for row in rows if row.user_id is not None}
+    }
+
+
+@socketio.on('subscribe', namespace=NAMESPACE)
+def subscribe(data):
+    """Client asks for updates on one game: {"game_id": 123}."""
+    try:
+        game_id = int(data['game_id'])
+    except (KeyError, TypeError, ValueError):
+        emit('error', {"error": "subscribe needs an integer game_id"})
+        return
+    snapshot = game_snapshot(game_id)
+    if not snapshot:
+        emit('error', {"error": "Game not found", "game_id": game_id})
+        return
+    join_room(room_for(game_id))
+    emit('game_status', snapshot)
+
+
+@socketio.on('unsubscribe', namespace=NAMESPACE)
+def unsubscribe(data):
+    try:
+        leave_room(room_for(int(data['game_id'])))
+    except (KeyError, TypeError, ValueError):
+        emit('error', {"error": "unsubscribe needs an integer game_id"})
+
+
+def push_guess(game_id, user_id, attempts, message):
+    if socketio.server is None:  # Socket.IO not attached (scripts, benchmarks)
+        return
+    socketio.emit('guess', {"game_id": game_id, "user_id": int(user_id), "attempts": attempts, "message": message},
+                  to=room_for(game_id), namespace=NAMESPACE)
+
+
+def push_completion(game_id, user_id, attempts):
+    if socketio.server is None:
+        return
+    socketio.emit('game_status', {"game_id": game_id, "status": "completed", "winner_id": int(user_id),
+                                  "attempts": attempts},
+                  to=room_for(game_id), namespace=NAMESPACE)
+
+
+events.subscribe("guess_applied", push_guess)
+events.subscribe("game_completed", push_completion)
@@ -0,0 +1,23 @@
+import os
+import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+from circuitbreaker import get_breaker
+import tracing
+
+# Shared Redis connection for GameService (matchmaking, leaderboards, ...)
+REDIS_HOST = os.getenv('REDIS_HOST', 'redis')
+REDIS_PORT = int(os.getenv('REDIS_PORT', '6379'))
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', '1.0'))  # Seconds a connect or reply may take
+
+# A Redis that stops answering costs a request at most REDIS_SOCKET_TIMEOUT per call: redis-py's
+# default of retrying with backoff is turned off, as the breaker already decides when to try again.
+# The breaker also refuses further calls once the request's deadline has passed. Commands run
+# for a sampled request are recorded as spans
+redis_client = tracing.trace_redis(redis.StrictRedis(
+    host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True, retry=Retry(NoBackoff(), 0),
+    socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_SOCKET_TIMEOUT))
+
+# Matchmaking, leaderboard and the other Redis users share one breaker, so a Redis
+# outage is noticed once and every caller fails fast (or falls back) together
+redis_breaker = get_breaker('redis', exceptions=(redis.exceptions.RedisError,))
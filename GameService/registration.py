@@ -0,0 +1,70 @@
+import os
+import time
+import random
+import logging
+import threading
+
+# Configuration Constants
+HEARTBEAT_INTERVAL = float(os.getenv('DISCOVERY_HEARTBEAT_INTERVAL', '10'))  # Seconds between re-registrations
+BACKOFF_BASE = 0.5  # First retry delay in seconds
+BACKOFF_CAP = 30  # Longest retry delay in seconds
+
+
+class RegistrationWorker:
+    """Keeps this replica registered with service discovery from a background thread.
+
+    The app starts serving straight away. Registration is retried with jittered
+    exponential backoff until it succeeds, then repeated every heartbeat interval
+    (discovery drops replicas that fail its health checks, and re-registering is
+    how we get back in). stop() deregisters.
+    """
+
+    def __init__(self, register, deregister, heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.register = register  # () -> bool, True once discovery knows about us
+        self.deregister = deregister  # () -> None
+        self.heartbeat_interval = heartbeat_interval
+        self.registered = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        if self._thread is None:
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='discovery-registration', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop heartbeating and remove this replica from discovery."""
+        # Forked gunicorn workers inherit the atexit hook, only the process that registered may deregister
+        if self._thread is None or os.getpid() != self._pid:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        if self.registered.is_set():
+            try:
+                self.deregister()
+            except Exception as e:
+                logging.warning(f"Deregistration failed: {e}")
+            self.registered.clear()
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                ok = self.register()
+            except Exception as e:
+                logging.warning(f"Registration attempt failed: {e}")
+                ok = False
+
+            if ok:
+                failures = 0
+                self.registered.set()
+                delay = self.heartbeat_interval
+            else:
+                failures += 1
+                # Full exponential backoff with +-50% jitter so replicas do not retry in lockstep
+                delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (failures - 1)) * random.uniform(0.5, 1.5)
+            self._stop.wait(delay)
@@ -1,37 +1,128 @@
 import uuid
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import bindparam, select, update
 import requests
-from models.database import db  # Import your existing db
+from models.database import db, each_shard, new_game_shard, shard_of, use_shard
 from models.game import Game  # Import your updated models
 from models.playerscore import PlayerScore  # Import your updated models
-import json
+from livestate import GameHandoffError
+from accounts_client import accounts_client
+from matchmaking import matchmaker
+from leaderboard import leaderboard, MAX_PAGE_SIZE
+from admission import admit
+from playerstats import get_stats, record_completed_games, MAX_STATS_BATCH
+from tournaments import (TournamentError, advance_tournament, create_tournament, get_player, get_tournament,
+                         join_tournament, DEFAULT_GROUP_SIZE, MAX_GROUP_SIZE, MAX_JOIN_BATCH)
+from redis_client import redis_client, redis_breaker
+from idempotency import IdempotencyStore
+from httpcache import ResourceVersions, not_modified, tagged
+from circuitbreaker import CircuitOpenError, breaker_states
+import deadline
+import tracing
+import events
+import metrics
+import redis
 
 
 
-USER_SERVICE_URL = "http://accounts_service:5001"  # Updated to point to accounts_service
-
 import time
 
-REQUEST_TIMEOUT = 10
+REQUEST_TIMEOUT = 10  # Seconds of budget for a request, unless its route or the caller sets less
+ROUTE_BUDGETS = {  # endpoint -> seconds, for routes that should give up sooner or later than REQUEST_TIMEOUT
+    'start_game': 5,
+    'make_guess': 2,
+    'get_game_status': 2,
+    'advance': 30,
+}
+MAX_BATCH_SIZE = 500  # Most guesses accepted by one /guess/batch call
+
+idempotency = IdempotencyStore(redis_client, redis_breaker)  # Replays start_game and make_guess on retries
+game_versions = ResourceVersions(redis_client, redis_breaker, "game_version:{id}")  # ETags of GET /game/status
+
+
+def bump_game_version(game_id, **_):
+    """Every guess changes the game's status body, live or in SQLite."""
+    game_versions.bump(game_id)
+
+
+def bump_flushed_versions(game_ids):
+    """A live game's guesses reach SQLite up to a flush interval after the guess bumped its version.
+
+    Other replicas serve its status from SQLite and may have tagged the older
+    rows with that version meanwhile; bumping again once the rows are written
+    stops those ETags from matching.
+    """
+    for game_id in game_ids:
+        game_versions.bump(game_id)
+
+
+events.subscribe("guess_applied", bump_game_version)
+events.subscribe("games_flushed", bump_flushed_versions)
 
 
+def evaluate_guess(guess, target_number, attempts):
+    """Build the Higher/Lower/Correct response body for a guess."""
+    if guess < target_number:
+        return {"message": "Higher!", "attempts": attempts}
+    elif guess > target_number:
+        return {"message": "Lower!", "attempts": attempts}
+    return {"message": "Correct! You've guessed the number!", "attempts": attempts}
+
 
 def register_routes(app):
     @app.before_request
     def start_timer():
         """Start the timer before each request."""
         request.start_time = time.time()
+        tracing.start_request(request.headers, f"{request.method} {metrics.endpoint_label()}")
+        metrics.request_started()
+        deadline.start(request.headers, ROUTE_BUDGETS.get(request.endpoint, REQUEST_TIMEOUT))
+        deadline.check()  # The caller's budget may already be spent
+
+    @app.before_request
+    def admission_control():
+        """Turn away users and games sending writes faster than their token buckets allow."""
+        if request.method != 'POST' or request.path.startswith('/internal/'):
+            return None
+        retry_after = admit(request.view_args or {}, request.get_json(silent=True))
+        if retry_after:
+            return jsonify({"error": "Too many requests, slow down."}), 429, {'Retry-After': str(retry_after)}
+        return None
+
+    @app.before_request
+    def route_to_shard():
+        """Routes with a game id in the URL only touch that game's database shard."""
+        try:
+            shard = shard_of((request.view_args or {})['game_id'])
+        except (KeyError, TypeError, ValueError):
+            return
+        g.shard_scope = use_shard(shard)
+        g.shard_scope.__enter__()
 
     @app.after_request
-    def check_timeout(response):
-        """Check if the request processing exceeded the timeout."""
-        elapsed_time = time.time() - request.start_time
-        if elapsed_time > REQUEST_TIMEOUT:
-            response.status_code = 408
-            response.data = json.dumps({"error": "Request timed out"})
-            response.headers['Content-Type'] = 'application/json'
-        return response
+    def record_request(response):
+        metrics.request_finished(response, time.time() - request.start_time)
+        return tracing.tag_response(response)
+
+    @app.errorhandler(deadline.DeadlineExceeded)
+    def deadline_exceeded(e):
+        """The request's budget ran out on the way; stop rather than answer after the caller gave up."""
+        return jsonify({"error": str(e)}), 504
+
+    @app.teardown_request
+    def finish_request(exc):
+        metrics.request_torn_down()
+        deadline.clear()
+        tracing.end_request(exc)
+        shard_scope = g.pop('shard_scope', None)
+        if shard_scope is not None:
+            shard_scope.__exit__(None, None, None)
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        body, content_type = metrics.render()
+        return Response(body, mimetype=content_type)
 
     @app.route('/status', methods=['GET'])
     def status():
@@ -39,11 +130,37 @@ def register_routes(app):
             "status": "Game service is running"
         }), 200
 
+    @app.route('/internal/accounts-client/stats', methods=['GET'])
+    def accounts_client_stats():
+        """Hit/miss counters of the cached accounts lookups."""
+        return jsonify(accounts_client.get_stats()), 200
+
+    @app.route('/internal/breakers', methods=['GET'])
+    def circuit_breakers():
+        """State of every circuit breaker in this process."""
+        return jsonify(breaker_states()), 200
+
+    @app.route('/internal/traces', methods=['GET'])
+    def traces():
+        """Spans of one trace (?trace_id=), or the newest request spans taking at least ?min_ms=."""
+        trace_id = request.args.get('trace_id')
+        if trace_id:
+            spans = tracing.find_trace(trace_id)
+            if not spans:
+                return jsonify({"error": "No spans recorded for this trace."}), 404
+            return jsonify({"trace_id": trace_id, "spans": spans}), 200
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        min_ms = request.args.get('min_ms', 0, type=float)
+        return jsonify({"traces": tracing.recent_traces(limit, min_ms)}), 200
+
     @app.route('/start-game/<user_id>', methods=['POST'])
+    @idempotency.idempotent
     def start_game(user_id):
-        response = requests.get(f"{USER_SERVICE_URL}/api/users/{user_id}")  
-        if response.status_code != 200:
-            return jsonify({"error": "User not found in accounts service."}), 404
+        try:
+            if not accounts_client.user_exists(user_id):
+                return jsonify({"error": "User not found in accounts service."}), 404
+        except requests.exceptions.RequestException:
+            return jsonify({"error": "Accounts service unavailable."}), 503
 
         data = request.json
         target_number = data.get('target_number')
@@ -51,75 +168,374 @@ def register_routes(app):
         if not isinstance(target_number, int) or target_number < 1 or target_number > 100:
             return jsonify({"error": "Target number must be an integer between 1 and 100."}), 400
 
-        game_data = Game(
-            status='in_progress'
-        )
-        
-        db.session.add(game_data)
-        db.session.commit() 
-
-        player_score = PlayerScore(
-            game_id=game_data.id,
-            user_id=user_id,
-            target_number=target_number
-        )
-        db.session.add(player_score)
-        db.session.commit()
+        # The shard's id sequence gives the game an id that routes back to it
+        with use_shard(new_game_shard()):
+            game_data = Game(
+                status='in_progress'
+            )
+
+            db.session.add(game_data)
+            db.session.commit()
+
+            player_score = PlayerScore(
+                game_id=game_data.id,
+                user_id=user_id,
+                target_number=target_number
+            )
+            db.session.add(player_score)
+            db.session.commit()
+
+            # Read back while still routed to the shard, the committed objects reload lazily
+            game_id = game_data.id
+            score = {"attempts": player_score.attempts, "target_number": player_score.target_number}
+            live_store = app.extensions.get('live_store')
+            if live_store:
+                live_store.adopt(game_id, game_data.status, {player_score.user_id: dict(score)})
 
         return jsonify({
             "message": "Game started!",
-            "game_id": game_data.id,
+            "game_id": game_id,
             "player_scores": {
-                user_id: {"attempts": player_score.attempts, "target_number": player_score.target_number}
+                user_id: score
             }
         }), 200
 
-    @app.route('/guess/<game_id>', methods=['POST'])
-    def make_guess(game_id):
+    def apply_guesses(pending, results):
+        """Resolve batch guesses against one shard. Fills in results, returns the games this completed."""
+        # Every game of this shard in the batch and all of its player scores, in one query
+        game_ids = {game_id for _, game_id, _, _ in pending}
+        rows = db.session.execute(
+            select(Game.id, PlayerScore.id, PlayerScore.user_id, PlayerScore.attempts, PlayerScore.target_number)
+            .outerjoin(PlayerScore, PlayerScore.game_id == Game.id)
+            .where(Game.id.in_(game_ids))
+        ).all()
+        known_games = {row[0] for row in rows}
+        scores = {(row[0], row.user_id): {"id": row[1], "attempts": row.attempts, "target_number": row.target_number}
+                  for row in rows if row.user_id is not None}
+
+        increments = {}  # player_score id -> attempts to add
+        completed = {}  # game_id -> (user_id, attempts) of the first correct guess
+        for index, game_id, user_id, guess in pending:
+            score = scores.get((game_id, user_id))
+            if game_id not in known_games:
+                results[index] = {"game_id": game_id, "user_id": user_id, "status": 404, "error": "Game not found"}
+                continue
+            if not score:
+                results[index] = {"game_id": game_id, "user_id": user_id, "status": 404,
+                                  "error": f"User {user_id} is not part of this game"}
+                continue
+            if game_id in completed:
+                # Stats and the leaderboard record the attempts of the winning guess, as make_guess does
+                results[index] = {"game_id": game_id, "user_id": user_id, "status": 409,
+                                  "error": "Game was completed earlier in this batch"}
+                continue
+            score["attempts"] += 1
+            increments[score["id"]] = increments.get(score["id"], 0) + 1
+            if guess == score["target_number"]:
+                completed[game_id] = (user_id, score["attempts"])
+            results[index] = {"game_id": game_id, "user_id": user_id, "status": 200,
+                              **evaluate_guess(guess, score["target_number"], score["attempts"])}
+
+        # Increments stay relative in SQL so concurrent single guesses are not lost
+        if increments:
+            db.session.execute(
+                update(PlayerScore.__table__)
+                .where(PlayerScore.__table__.c.id == bindparam('score_id'))
+                .values(attempts=PlayerScore.__table__.c.attempts + bindparam('delta')),
+                [{"score_id": score_id, "delta": delta} for score_id, delta in increments.items()]
+            )
+        finished = []
+        for game_id, (user_id, attempts) in completed.items():
+            if db.session.execute(
+                update(Game).where(Game.id == game_id, Game.status != 'completed')
+                .values(status='completed', winner_id=user_id, completed_at=time.time())
+            ).rowcount == 1:
+                finished.append((game_id, user_id, attempts))
+        record_completed_games([game_id for game_id, _, _ in finished])
+        db.session.commit()
+        return finished
+
+    @app.route('/guess/batch', methods=['POST'])
+    def make_guess_batch():
+        """Apply many guesses at once. Results come back in request order, one per item."""
         data = request.json
-        user_id = data.get('user_id')  
-        guess = data.get('guess')
+        items = data.get('guesses') if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return jsonify({"error": "Expected a list of {game_id, user_id, guess} objects."}), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"A batch may contain at most {MAX_BATCH_SIZE} guesses."}), 400
 
-        game = Game.query.get(game_id)
-        if not game:
+        results = [None] * len(items)
+        pending = []  # (index, game_id, user_id, guess) still to be resolved against SQLite
+        live_store = app.extensions.get('live_store')
+        for index, item in enumerate(items):
+            try:
+                game_id, user_id, guess = int(item['game_id']), int(item['user_id']), int(item['guess'])
+            except (KeyError, TypeError, ValueError):
+                results[index] = {"status": 400, "error": "Each item needs integer game_id, user_id and guess."}
+                continue
+
+            if live_store:
+                try:
+                    live_game = live_store.get_or_load(game_id)
+                except GameHandoffError as e:
+                    results[index] = {"game_id": game_id, "user_id": user_id, "status": 503, "error": str(e)}
+                    continue
+                result = live_store.guess(live_game, user_id, guess) if live_game else None
+                if result:
+                    results[index] = {"game_id": game_id, "user_id": user_id, "status": result[1], **result[0]}
+                    continue
+            pending.append((index, game_id, user_id, guess))
+
+        if pending:
+            finished = []
+            by_shard = {}
+            for entry in pending:
+                by_shard.setdefault(shard_of(entry[1]), []).append(entry)
+            for shard, shard_pending in by_shard.items():
+                if shard is None:
+                    for index, game_id, user_id, _ in shard_pending:
+                        results[index] = {"game_id": game_id, "user_id": user_id, "status": 404,
+                                          "error": "Game not found"}
+                    continue
+                with use_shard(shard):
+                    finished.extend(apply_guesses(shard_pending, results))
+            for index, game_id, user_id, _ in pending:
+                if results[index]["status"] == 200:
+                    events.emit("guess_applied", game_id=game_id, user_id=user_id,
+                                attempts=results[index]["attempts"], message=results[index]["message"])
+            for game_id, user_id, attempts in finished:
+                events.emit("game_completed", game_id=game_id, user_id=user_id, attempts=attempts)
+
+        return jsonify({"results": results}), 200
+
+    @app.route('/guess/<game_id>', methods=['POST'])
+    @idempotency.idempotent
+    def make_guess(game_id):
+        data = request.get_json(silent=True)
+        # Coerced like /guess/batch items and before anything is written, so a malformed guess never costs an attempt
+        try:
+            user_id, guess = int(data['user_id']), int(data['guess'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "Expected integer user_id and guess."}), 400
+        if not game_id.isdigit():
             return jsonify({"error": "Game not found"}), 404
 
-        # fix find player id
-        player_score = PlayerScore.query.filter_by(game_id=game_id, user_id=user_id).first()
-        if not player_score:
-            return jsonify({"error": f"User {user_id} is not part of this game"}), 404
+        live_store = app.extensions.get('live_store')
+        if live_store:
+            try:
+                live_game = live_store.get_or_load(int(game_id))
+            except GameHandoffError as e:
+                return jsonify({"error": str(e)}), 503
+            if live_game:
+                result = live_store.guess(live_game, user_id, guess)
+                if result:
+                    return jsonify(result[0]), result[1]
 
-        # update
-        player_score.attempts += 1
+        # One atomic statement on the (game_id, user_id) index: concurrent guesses from
+        # different replicas can no longer overwrite each other's increments
+        row = db.session.execute(
+            update(PlayerScore)
+            .where(PlayerScore.game_id == game_id, PlayerScore.user_id == user_id)
+            .values(attempts=PlayerScore.attempts + 1)
+            .returning(PlayerScore.attempts, PlayerScore.target_number)
+        ).first()
+        if not row:
+            db.session.rollback()
+            if not db.session.get(Game, game_id):
+                return jsonify({"error": "Game not found"}), 404
+            return jsonify({"error": f"User {user_id} is not part of this game"}), 404
 
-        
-        if guess < player_score.target_number:
-            db.session.commit()
-            return jsonify({"message": "Higher!", "attempts": player_score.attempts}), 200
-        elif guess > player_score.target_number:
-            db.session.commit()
-            return jsonify({"message": "Lower!", "attempts": player_score.attempts}), 200
-        else:
-            # finalize game
-            game.status = 'completed'
-            db.session.commit()
-            return jsonify({"message": "Correct! You've guessed the number!", "attempts": player_score.attempts}), 200
+        attempts, target_number = row
+        completed_now = False
+        if guess == target_number:
+            # finalize game, only the first correct guess wins it
+            completed_now = db.session.execute(
+                update(Game).where(Game.id == game_id, Game.status != 'completed')
+                .values(status='completed', winner_id=user_id, completed_at=time.time())
+            ).rowcount == 1
+            if completed_now:
+                record_completed_games([int(game_id)])  # Same transaction as the completion
+        db.session.commit()
+        result = evaluate_guess(guess, target_number, attempts)
+        events.emit("guess_applied", game_id=int(game_id), user_id=user_id, attempts=attempts,
+                    message=result["message"])
+        if completed_now:
+            events.emit("game_completed", game_id=int(game_id), user_id=user_id, attempts=attempts)
+        return jsonify(result), 200
 
     @app.route('/game/status/<game_id>', methods=['GET'])
     def get_game_status(game_id):
-        game = Game.query.get(game_id)
-        if not game:
+        """Status of a game. A poll with a current If-None-Match gets 304 from one Redis read."""
+        # Read before the game, so the tag is never newer than the body
+        etag = game_versions.etag(int(game_id)) if game_id.isdigit() else None
+        return not_modified(etag) or tagged(read_game_status(game_id), etag)
+
+    def read_game_status(game_id):
+        live_store = app.extensions.get('live_store')
+        live_game = live_store.get(int(game_id)) if live_store else None
+        if live_game:
+            with live_game.lock:
+                return jsonify(live_game.to_status()), 200
+
+        # game plus all of its player scores in a single query
+        rows = db.session.execute(
+            select(Game.id, Game.status, PlayerScore.user_id, PlayerScore.attempts, PlayerScore.target_number)
+            .outerjoin(PlayerScore, PlayerScore.game_id == Game.id)
+            .where(Game.id == game_id)
+        ).all()
+        if not rows:
+            # Old completed games live in the archive once the archiver has moved them
+            archived = app.extensions['game_archive'].lookup(game_id) if game_id.isdigit() else None
+            if archived:
+                return jsonify({key: archived[key] for key in ("game_id", "status", "players_scores")}), 200
             return jsonify({"error": "Game not found"}), 404
 
-        # fetch all player scored
-        player_scores = PlayerScore.query.filter_by(game_id=game_id).all()
-        scores = {ps.user_id: {"attempts": ps.attempts, "target_number": ps.target_number} for ps in player_scores}
+        scores = {row.user_id: {"attempts": row.attempts, "target_number": row.target_number}
+                  for row in rows if row.user_id is not None}
 
         return jsonify({
-            "game_id": game.id,
-            "status": game.status,
+            "game_id": rows[0].id,
+            "status": rows[0].status,
             "players_scores": scores
         }), 200
-    
-    
-   
\ No newline at end of file
+
+    @app.route('/stats/<int:user_id>', methods=['GET'])
+    def get_player_stats(user_id):
+        """Games played and won, average and best attempts, maintained as games complete."""
+        return jsonify(get_stats([user_id])[user_id]), 200
+
+    @app.route('/stats', methods=['POST'])
+    def get_player_stats_batch():
+        """Stats for many users at once, in request order."""
+        data = request.json
+        user_ids = data.get('user_ids') if isinstance(data, dict) else data
+        if not isinstance(user_ids, list):
+            return jsonify({"error": "Expected a list of user ids."}), 400
+        if len(user_ids) > MAX_STATS_BATCH:
+            return jsonify({"error": f"A batch may contain at most {MAX_STATS_BATCH} users."}), 400
+        try:
+            user_ids = [int(user_id) for user_id in user_ids]
+        except (TypeError, ValueError):
+            return jsonify({"error": "User ids must be integers."}), 400
+        stats = get_stats(set(user_ids))
+        return jsonify({"stats": [stats[user_id] for user_id in user_ids]}), 200
+
+    @app.errorhandler(TournamentError)
+    def tournament_error(e):
+        return jsonify({"error": str(e)}), e.status_code
+
+    @app.route('/tournaments', methods=['POST'])
+    def new_tournament():
+        data = request.get_json(silent=True) or {}
+        name = data.get('name')
+        group_size = data.get('group_size', DEFAULT_GROUP_SIZE)
+        if not isinstance(name, str) or not name or len(name) > 100:
+            return jsonify({"error": "A name of 1 to 100 characters is required."}), 400
+        if not isinstance(group_size, int) or not 2 <= group_size <= MAX_GROUP_SIZE:
+            return jsonify({"error": f"Group size must be an integer between 2 and {MAX_GROUP_SIZE}."}), 400
+        return jsonify(create_tournament(name, group_size)), 201
+
+    @app.route('/tournaments/<int:tournament_id>', methods=['GET'])
+    def tournament_status(tournament_id):
+        return jsonify(get_tournament(tournament_id)), 200
+
+    @app.route('/tournaments/<int:tournament_id>/join', methods=['POST'])
+    def join(tournament_id):
+        """Register one user ({"user_id"}) or many ({"user_ids"}), checked with the accounts service in bulk."""
+        data = request.get_json(silent=True) or {}
+        user_ids = data.get('user_ids', [data.get('user_id')])
+        if not isinstance(user_ids, list) or not user_ids or not all(isinstance(u, int) for u in user_ids):
+            return jsonify({"error": "Expected an integer user_id or a list of user_ids."}), 400
+        if len(user_ids) > MAX_JOIN_BATCH:
+            return jsonify({"error": f"At most {MAX_JOIN_BATCH} users can join per request."}), 400
+        try:
+            exists = accounts_client.users_exist(user_ids)
+        except requests.exceptions.RequestException:
+            return jsonify({"error": "Accounts service unavailable."}), 503
+        unknown = [user_id for user_id, found in exists.items() if not found]
+        if unknown:
+            return jsonify({"error": "Users not found in accounts service.", "unknown": unknown}), 404
+        return jsonify(join_tournament(tournament_id, user_ids)), 200
+
+    @app.route('/tournaments/<int:tournament_id>/advance', methods=['POST'])
+    def advance(tournament_id):
+        """Start the tournament, or score the current round and schedule the next."""
+        data = request.get_json(silent=True) or {}
+        return jsonify(advance_tournament(tournament_id, force=bool(data.get('force')))), 200
+
+    @app.route('/tournaments/<int:tournament_id>/players/<int:user_id>', methods=['GET'])
+    def tournament_player(tournament_id, user_id):
+        return jsonify(get_player(tournament_id, user_id)), 200
+
+    @app.route('/internal/games/<int:game_id>/release', methods=['POST'])
+    def release_game(game_id):
+        """Flush a live game and drop it so the requesting replica can take ownership."""
+        live_store = app.extensions.get('live_store')
+        if live_store:
+            live_store.release(game_id)
+        return jsonify({"message": f"Game {game_id} released"}), 200
+
+    @app.route('/matchmaking/join/<int:user_id>', methods=['POST'])
+    def join_matchmaking(user_id):
+        """Queue a player for a multi-player room. 200 once matched, 202 while waiting."""
+        try:
+            if not accounts_client.user_exists(user_id):
+                return jsonify({"error": "User not found in accounts service."}), 404
+        except requests.exceptions.RequestException:
+            return jsonify({"error": "Accounts service unavailable."}), 503
+
+        try:
+            assignment = redis_breaker.call(matchmaker.join, user_id)
+            if assignment:
+                return jsonify(assignment), 200
+            return jsonify(redis_breaker.call(matchmaker.poll, user_id) or {"status": "waiting"}), 202
+        except (redis.exceptions.RedisError, CircuitOpenError) as e:
+            return jsonify({"error": f"Matchmaking unavailable: {e}"}), 503
+
+    @app.route('/matchmaking/<int:user_id>', methods=['GET'])
+    def poll_matchmaking(user_id):
+        """Match assignment (game_id and players) or current place in the queue."""
+        try:
+            assignment = redis_breaker.call(matchmaker.poll, user_id)
+        except (redis.exceptions.RedisError, CircuitOpenError) as e:
+            return jsonify({"error": f"Matchmaking unavailable: {e}"}), 503
+        if not assignment:
+            return jsonify({"error": f"User {user_id} is not in matchmaking"}), 404
+        return jsonify(assignment), 200
+
+    @app.route('/matchmaking/<int:user_id>', methods=['DELETE'])
+    def leave_matchmaking(user_id):
+        try:
+            left = redis_breaker.call(matchmaker.leave, user_id)
+        except (redis.exceptions.RedisError, CircuitOpenError) as e:
+            return jsonify({"error": f"Matchmaking unavailable: {e}"}), 503
+        if not left:
+            return jsonify({"error": f"User {user_id} is not waiting for a match"}), 404
+        return jsonify({"message": "Left matchmaking"}), 200
+
+    @app.route('/leaderboard', methods=['GET'])
+    def get_leaderboard():
+        """Players ranked by games won, fewer total attempts first on ties."""
+        limit = min(request.args.get('limit', 10, type=int), MAX_PAGE_SIZE)
+        offset = request.args.get('offset', 0, type=int)
+        if limit < 1 or offset < 0:
+            return jsonify({"error": "limit must be positive and offset non-negative."}), 400
+        # Served from SQLite when Redis is unavailable
+        total_players, entries = leaderboard.page(offset, limit)
+        return jsonify({
+            "total_players": total_players,
+            "offset": offset,
+            "limit": limit,
+            "entries": entries
+        }), 200
+
+    @app.route('/leaderboard/rank/<int:user_id>', methods=['GET'])
+    def get_leaderboard_rank(user_id):
+        try:
+            entry = leaderboard.rank(user_id)
+        except (redis.exceptions.RedisError, CircuitOpenError) as e:
+            return jsonify({"error": f"Leaderboard unavailable: {e}"}), 503
+        if not entry:
+            return jsonify({"error": f"User {user_id} has not won any games yet"}), 404
+        return jsonify(entry), 200
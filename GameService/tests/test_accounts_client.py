@@ -0,0 +1,107 @@
+"""AccountsClient caching and fallbacks, against a stub of the accounts service's HTTP session."""
+import os
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import accounts_client  # noqa: E402
+from accounts_client import AccountsClient  # noqa: E402
+from circuitbreaker import CircuitBreaker  # noqa: E402
+
+USERS = {1, 2, 3}
+
+
+class StubResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class StubAccounts:
+    """Answers GET /api/users/<id> and POST /api/users/lookup for USERS, or fails while down."""
+
+    def __init__(self):
+        self.calls = []
+        self.down = False
+        self.release = threading.Event()
+        self.release.set()
+
+    def request(self, method, url, timeout=None, headers=None, json=None):
+        self.calls.append((method, url.rsplit('/api/users', 1)[1]))
+        self.release.wait(5)
+        if self.down:
+            raise requests.exceptions.ConnectionError("accounts is down")
+        if method == 'POST':
+            return StubResponse(200, {"users": [{"id": user_id} for user_id in json["ids"] if user_id in USERS]})
+        return StubResponse(200 if int(url.rsplit('/', 1)[1]) in USERS else 404)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(accounts_client.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def accounts():
+    return StubAccounts()
+
+
+@pytest.fixture
+def client(accounts):
+    client = AccountsClient(base_url='http://accounts', positive_ttl=300, negative_ttl=5)
+    client.session = accounts
+    client.breaker = CircuitBreaker('accounts_test', exceptions=(requests.exceptions.RequestException,))
+    return client
+
+
+def test_lookups_are_cached_for_their_ttl(client, accounts, clock):
+    assert client.user_exists(1) and client.user_exists(1)
+    assert not client.user_exists(9) and not client.user_exists(9)
+    assert len(accounts.calls) == 2
+    clock[0] += 10  # Unknown users are asked about again sooner
+    client.user_exists(1)
+    client.user_exists(9)
+    assert accounts.calls[2:] == [('GET', '/9')]
+    stats = client.get_stats()
+    assert (stats["hits"], stats["negative_hits"], stats["misses"]) == (2, 1, 3)
+
+
+def test_concurrent_lookups_for_one_user_share_a_request(client, accounts):
+    accounts.release.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.user_exists(2))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while client.get_stats()["misses"] + client.get_stats()["coalesced"] < 5:
+        time.sleep(0.001)  # Until every thread has either started the request or joined it
+    accounts.release.set()
+    for thread in threads:
+        thread.join()
+    assert results == [True] * 5 and len(accounts.calls) == 1
+
+
+def test_bulk_lookup_fetches_only_uncached_users(client, accounts):
+    client.user_exists(1)
+    assert client.users_exist([1, 2, 9, 2]) == {1: True, 2: True, 9: False}
+    assert accounts.calls == [('GET', '/1'), ('POST', '/lookup')]
+    assert client.users_exist([2, 9]) == {2: True, 9: False} and len(accounts.calls) == 2
+
+
+def test_expired_entries_are_served_while_accounts_is_down(client, accounts, clock):
+    client.users_exist([1, 9])
+    clock[0] += 600
+    accounts.down = True
+    assert client.user_exists(1) and client.users_exist([9]) == {9: False}
+    assert client.get_stats()["stale_served"] == 2
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.user_exists(3)  # Never cached
@@ -0,0 +1,52 @@
+"""Admission control token buckets against fakeredis with Lua support (pip install fakeredis lupa)."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import redis  # noqa: E402
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+redis.StrictRedis = fakeredis.FakeStrictRedis
+
+import admission  # noqa: E402
+from admission import AdmissionController, request_charges  # noqa: E402
+
+LIMITS = {"user": (1, 2), "game": (1, 3)}  # (tokens refilled per second, burst)
+
+
+@pytest.fixture
+def controller():
+    return AdmissionController(fakeredis.FakeStrictRedis(server=fakeredis.FakeServer(), decode_responses=True),
+                               limits=LIMITS)
+
+
+def test_requests_are_charged_to_their_users_and_games():
+    assert request_charges({"game_id": 5}, {"user_id": 7, "guess": 50}) == {("user", 7): 1, ("game", 5): 1}
+    assert request_charges({}, {"user_id": "7"}) == {("user", 7): 1}
+    batch = {"guesses": [{"user_id": 7, "game_id": 5}, {"user_id": 7, "game_id": 6}, "junk"]}
+    assert request_charges({}, batch) == {("user", 7): 2, ("game", 5): 1, ("game", 6): 1}
+    assert request_charges({}, None) == {}
+
+
+def test_a_rejected_request_takes_no_tokens(controller):
+    assert controller.take({("user", 1): 1, ("game", 1): 1}) == 0
+    assert controller.take({("user", 1): 1, ("game", 1): 1}) == 0
+    assert controller.take({("user", 1): 1, ("game", 1): 1}) > 0  # User 1's burst of 2 is spent
+    assert controller.take({("user", 2): 1, ("game", 1): 1}) == 0  # Game 1 still had its third token
+    assert controller.take({}) == 0
+
+
+def test_local_buckets_refill_over_time(controller, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, 'monotonic', lambda: now[0])
+    keys, args = ["admission:user:1"], [1, 2, 1]
+    assert controller._take_local(keys, args) == 0
+    assert controller._take_local(keys, args) == 0
+    assert controller._take_local(keys, args) == pytest.approx(1)
+    now[0] += 0.5
+    assert controller._take_local(keys, args) == pytest.approx(0.5)
+    now[0] += 0.5
+    assert controller._take_local(keys, args) == 0
@@ -0,0 +1,65 @@
+"""archive.py against a scratch SQLite file and archive directory."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask  # noqa: E402
+from models.database import db, configure_shards  # noqa: E402
+from migrate_db import migrate  # noqa: E402
+import archive  # noqa: E402
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE games (id INTEGER NOT NULL, status VARCHAR(50) NOT NULL, PRIMARY KEY (id))",
+    "CREATE TABLE player_scores (id INTEGER NOT NULL, game_id INTEGER NOT NULL, user_id INTEGER NOT NULL, "
+    "attempts INTEGER, target_number INTEGER NOT NULL, PRIMARY KEY (id), FOREIGN KEY(game_id) REFERENCES games (id))",
+]
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'ARCHIVE_DIR', str(tmp_path / 'archive'))
+    app = Flask('archive_test')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'game.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)
+    db.init_app(app)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+def add_game(status, user_id=7, attempts=3):
+    game_id = db.session.execute(db.text("INSERT INTO games (status) VALUES (:status) RETURNING id"),
+                                 {"status": status}).scalar()
+    db.session.execute(db.text("INSERT INTO player_scores (game_id, user_id, attempts, target_number) "
+                               "VALUES (:game_id, :user_id, :attempts, 50)"),
+                       {"game_id": game_id, "user_id": user_id, "attempts": attempts})
+    db.session.commit()
+    return game_id
+
+
+def test_archived_games_are_found_and_their_ids_not_reused_on_a_legacy_database(app):
+    with app.app_context():
+        with db.engine.begin() as conn:
+            for statement in LEGACY_SCHEMA:
+                conn.exec_driver_sql(statement)
+        db.create_all()
+        migrate(db.engine)
+
+        add_game('in_progress')
+        newest = add_game('completed', attempts=4)
+        db.session.execute(db.text("UPDATE games SET completed_at = 0 WHERE id = :id"), {"id": newest})
+        db.session.commit()
+
+        game_archive = archive.init_archive(app)
+        assert archive.archive_completed_games(game_archive, older_than_days=0)[0][0] == 1
+        assert db.session.execute(db.text("SELECT count(*) FROM games")).scalar() == 1
+
+        assert add_game('waiting') > newest
+        record = game_archive.lookup(newest)
+        assert record["status"] == 'completed'
+        assert record["players_scores"] == {"7": {"attempts": 4, "target_number": 50}}
+        assert game_archive.lookup(newest + 1) is None
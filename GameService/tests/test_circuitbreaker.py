@@ -0,0 +1,68 @@
+"""CircuitBreaker state changes, driven with a fake monotonic clock."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import circuitbreaker  # noqa: E402
+from circuitbreaker import CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN, OPEN  # noqa: E402
+
+
+class DependencyDown(Exception):
+    pass
+
+
+def fail():
+    raise DependencyDown()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuitbreaker.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def breaker(clock):
+    """A breaker tripped by two failures and just past its cooldown."""
+    breaker = CircuitBreaker('test', failure_threshold=2, retry_window=10000, cooldown_period=5,
+                             exceptions=(DependencyDown,))
+    for _ in range(2):
+        with pytest.raises(DependencyDown):
+            breaker.call(fail)
+    assert breaker.state == OPEN
+    clock[0] += 5
+    return breaker
+
+
+def test_open_circuit_fails_fast_or_falls_back(breaker, clock):
+    clock[0] -= 1
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 'called')
+    assert breaker.call(lambda: 'called', fallback=lambda: 'fallback') == 'fallback'
+
+
+def test_half_open_trial_success_closes_and_failure_reopens(breaker, clock):
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == CLOSED
+
+    for _ in range(2):
+        with pytest.raises(DependencyDown):
+            breaker.call(fail)
+    clock[0] += 5
+    with pytest.raises(DependencyDown):
+        breaker.call(fail)
+    assert breaker.state == OPEN
+
+
+def test_unrelated_error_in_a_trial_call_frees_the_slot_without_closing(breaker):
+    with pytest.raises(KeyError):
+        breaker.call(lambda: {}['missing'])
+    assert breaker.state == HALF_OPEN
+    assert not breaker.is_open()  # The next trial may go through
+    with pytest.raises(DependencyDown):
+        breaker.call(fail)
+    assert breaker.state == OPEN
@@ -0,0 +1,68 @@
+"""Request deadlines, driven with a fake monotonic clock and a scratch SQLite file."""
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import deadline  # noqa: E402
+from deadline import DEADLINE_HEADER, DeadlineExceeded  # noqa: E402
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(deadline.time, 'monotonic', lambda: now[0])
+    yield now
+    deadline.clear()
+
+
+def test_caller_budget_can_only_shorten_the_routes_own(clock):
+    assert deadline.start({DEADLINE_HEADER: '500'}, 2) == 0.5
+    assert deadline.start({DEADLINE_HEADER: '5000'}, 2) == 2
+    assert deadline.start({DEADLINE_HEADER: '300'}, None) == 0.3
+    assert deadline.start({DEADLINE_HEADER: 'soon'}, 2) == 2
+    assert deadline.start({}, None) is None
+    assert deadline.remaining() is None and deadline.cap(5) == 5
+
+
+def test_budget_is_passed_on_and_enforced(clock):
+    deadline.start({DEADLINE_HEADER: '1500'}, None)
+    clock[0] += 1
+    assert deadline.outgoing_headers() == {DEADLINE_HEADER: '500'}
+    assert deadline.cap(2) == pytest.approx(0.5)
+    assert deadline.cap(0.1) == 0.1
+    clock[0] += 0.5
+    with pytest.raises(DeadlineExceeded):
+        deadline.check()
+    with pytest.raises(DeadlineExceeded):
+        deadline.cap(2)
+
+
+def test_sqlite_statements_stop_at_the_deadline(clock, tmp_path):
+    deadline.limit_sqlite(5000)
+    engine = create_engine(f"sqlite:///{tmp_path / 'game.db'}")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        deadline.start({}, 0.35)
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 300
+        clock[0] += 1
+        with pytest.raises(DeadlineExceeded):
+            conn.execute(text("SELECT 1"))
+        deadline.clear()
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    engine.dispose()
+
+
+def test_running_sqlite_statement_is_interrupted_at_the_deadline(clock, tmp_path, monkeypatch):
+    deadline.limit_sqlite(5000)
+    engine = create_engine(f"sqlite:///{tmp_path / 'game.db'}")
+    deadline.start({}, 0.35)
+    ticks = iter(range(10 ** 9))
+    monkeypatch.setattr(deadline.time, 'monotonic', lambda: clock[0] + next(ticks) / 1000)  # 1 ms per check
+    with engine.connect() as conn, pytest.raises(DeadlineExceeded):
+        conn.execute(text("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100000000) "
+                          "SELECT count(*) FROM n"))
+    engine.dispose()
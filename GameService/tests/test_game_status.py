@@ -0,0 +1,84 @@
+"""GET /game/status/<game_id> ETags against a scratch SQLite file and fakeredis (pip install fakeredis)."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('ADMISSION_CONTROL', '0')
+
+import redis  # noqa: E402
+fakeredis = pytest.importorskip('fakeredis')
+redis.StrictRedis = fakeredis.FakeStrictRedis
+
+from flask import Flask  # noqa: E402
+from models.database import db, configure_shards  # noqa: E402
+from migrate_db import migrate  # noqa: E402
+from archive import init_archive  # noqa: E402
+from livestate import init_live_store  # noqa: E402
+from server import register_routes  # noqa: E402
+
+
+def build_app(database, name):
+    app = Flask(name)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{database}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        migrate(db.engine)
+    init_live_store(app)
+    init_archive(app)
+    register_routes(app)
+    return app
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / 'game.db'
+    app = build_app(path, 'seed')
+    with app.app_context():
+        game_id = db.session.execute(db.text("INSERT INTO games (status) VALUES ('in_progress') RETURNING id")).scalar()
+        db.session.execute(db.text("INSERT INTO player_scores (game_id, user_id, attempts, target_number) "
+                                   "VALUES (:game_id, 7, 0, 50)"), {"game_id": game_id})
+        db.session.commit()
+        db.engine.dispose()
+    return path, game_id
+
+
+def test_poll_gets_304_until_a_guess_changes_the_game(database):
+    path, game_id = database
+    client = build_app(path, 'sqlite_status').test_client()
+
+    first = client.get(f'/game/status/{game_id}')
+    assert first.status_code == 200 and first.headers['ETag']
+    assert client.get(f'/game/status/{game_id}', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    client.post(f'/guess/{game_id}', json={"user_id": 7, "guess": 10})
+    after_guess = client.get(f'/game/status/{game_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert after_guess.status_code == 200
+    assert after_guess.json["players_scores"]["7"]["attempts"] == 1
+
+
+def test_replica_without_the_live_game_stops_matching_once_the_owner_flushes(database, monkeypatch):
+    path, game_id = database
+    monkeypatch.setenv('LIVE_GAME_STATE', '1')
+    owner = build_app(path, 'owner')
+    monkeypatch.setenv('LIVE_GAME_STATE', '0')
+    other = build_app(path, 'other').test_client()
+    store = owner.extensions['live_store']
+    try:
+        assert owner.test_client().post(f'/guess/{game_id}', json={"user_id": 7, "guess": 10}).status_code == 200
+
+        # The guess is only in the owner's memory, the other replica tags the older rows
+        stale = other.get(f'/game/status/{game_id}')
+        assert stale.json["players_scores"]["7"]["attempts"] == 0
+
+        with owner.app_context():
+            store.flush()
+        fresh = other.get(f'/game/status/{game_id}', headers={'If-None-Match': stale.headers['ETag']})
+        assert fresh.status_code == 200
+        assert fresh.json["players_scores"]["7"]["attempts"] == 1
+    finally:
+        store.stop()
@@ -0,0 +1,76 @@
+"""Idempotency-Key handling against fakeredis with Lua support (pip install fakeredis lupa)."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+
+from flask import Flask, jsonify, request  # noqa: E402
+import idempotency  # noqa: E402
+from idempotency import IdempotencyStore, IDEMPOTENCY_KEY, REPLAYED_HEADER  # noqa: E402
+from circuitbreaker import CircuitBreaker  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    redis_conn = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    store = IdempotencyStore(redis_conn, CircuitBreaker('idempotency_test'))
+    app = Flask('idempotency_test')
+    app.calls = []
+
+    @app.route('/things', methods=['POST'])
+    @store.idempotent
+    def create_thing():
+        app.calls.append(request.json)
+        if request.json.get('fail'):
+            return jsonify({"error": "boom"}), 500
+        return jsonify({"id": len(app.calls)}), 201, {'Location': f"/things/{len(app.calls)}"}
+
+    app.redis = redis_conn
+    return app
+
+
+def post(client, body, key='key-1'):
+    return client.post('/things', json=body, headers={'Idempotency-Key': key} if key else {})
+
+
+def test_retry_with_the_same_key_replays_the_first_response(app):
+    client = app.test_client()
+    first = post(client, {"name": "a"})
+    retry = post(client, {"name": "a"})
+    assert len(app.calls) == 1
+    assert (retry.status_code, retry.json, retry.headers['Location']) == (201, {"id": 1}, "/things/1")
+    assert retry.headers[REPLAYED_HEADER] == 'true' and REPLAYED_HEADER not in first.headers
+
+    assert post(client, {"name": "a"}, key='key-2').json == {"id": 2}
+    assert post(client, {"name": "a"}, key=None).json == {"id": 3}
+
+
+def test_same_key_for_a_different_request_is_refused(app):
+    client = app.test_client()
+    post(client, {"name": "a"})
+    assert post(client, {"name": "b"}).status_code == 422
+    assert len(app.calls) == 1
+
+
+def test_server_errors_are_not_replayed(app):
+    client = app.test_client()
+    assert post(client, {"fail": True}).status_code == 500
+    assert post(client, {"fail": True}).status_code == 500
+    assert len(app.calls) == 2
+
+
+def test_duplicate_of_a_request_still_running_gets_409(app, monkeypatch):
+    monkeypatch.setattr(idempotency, 'MAX_WAIT', 0.1)
+    client = app.test_client()
+    post(client, {"name": "a"})
+    # As if the first request had claimed the key and not finished yet
+    app.redis.hset(IDEMPOTENCY_KEY.format(endpoint='create_thing', key='key-1'), 'state', 'pending')
+
+    duplicate = post(client, {"name": "a"})
+    assert (duplicate.status_code, duplicate.headers['Retry-After']) == (409, '1')
+    assert len(app.calls) == 1
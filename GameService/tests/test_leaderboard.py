@@ -0,0 +1,78 @@
+"""Leaderboard ranking against fakeredis with Lua support (pip install fakeredis lupa) and a scratch SQLite file."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import redis  # noqa: E402
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+redis.StrictRedis = fakeredis.FakeStrictRedis
+
+from flask import Flask  # noqa: E402
+from models.database import db, configure_shards  # noqa: E402
+from models.game import Game  # noqa: E402
+from models.playerscore import PlayerScore  # noqa: E402
+from leaderboard import Leaderboard  # noqa: E402
+
+WINS = [(1, 5), (2, 4), (3, 3), (2, 6)]  # (user_id, attempts) of each won game, in completion order
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask('leaderboard_test')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'game.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.engine.dispose()
+
+
+def new_leaderboard():
+    return Leaderboard(fakeredis.FakeStrictRedis(server=fakeredis.FakeServer(), decode_responses=True))
+
+
+def add_won_game(winner_id, scores, record_winner=True):
+    """A completed game with {user_id: attempts}; older games were stored without winner_id."""
+    game = Game(status='completed')
+    game.winner_id = winner_id if record_winner else None
+    db.session.add(game)
+    db.session.flush()
+    for user_id, attempts in scores.items():
+        score = PlayerScore(game.id, user_id, 50)
+        score.attempts = attempts
+        db.session.add(score)
+    db.session.commit()
+
+
+def test_ranking_orders_by_wins_then_fewest_attempts():
+    leaderboard = new_leaderboard()
+    for user_id, attempts in WINS:
+        leaderboard.record_win(user_id, attempts)
+
+    total, entries = leaderboard._redis_page(0, 2)
+    assert total == 3
+    assert [(entry["user_id"], entry["wins"], entry["total_attempts"]) for entry in entries] == [(2, 2, 10), (3, 1, 3)]
+    assert leaderboard._rank(1) == {"rank": 3, "user_id": 1, "wins": 1, "total_attempts": 5, "average_attempts": 5.0}
+    assert leaderboard._rank(99) is None
+    assert leaderboard._redis_page(3, 10) == (3, [])
+
+
+def test_rebuild_from_sqlite_matches_the_incremental_ranking(app):
+    incremental = new_leaderboard()
+    for user_id, attempts in WINS:
+        incremental.record_win(user_id, attempts)
+        add_won_game(user_id, {user_id: attempts, 9: attempts + 1}, record_winner=True)
+    add_won_game(4, {4: 2}, record_winner=False)  # Single-player game from before winner_id
+    add_won_game(None, {5: 1, 6: 1}, record_winner=False)  # Multi-player game without a known winner
+    incremental.record_win(4, 2)
+
+    rebuilt = new_leaderboard()
+    assert rebuilt.rebuild(batch_size=2) == 4
+    assert rebuilt._redis_page(0, 10) == incremental._redis_page(0, 10)
+    assert rebuilt._database_page(1, 2) == incremental._redis_page(1, 2)
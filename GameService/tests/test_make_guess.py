@@ -0,0 +1,117 @@
+"""POST /guess/<game_id> against a scratch SQLite file and fakeredis (pip install fakeredis)."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('ADMISSION_CONTROL', '0')
+
+import redis  # noqa: E402
+fakeredis = pytest.importorskip('fakeredis')
+redis.StrictRedis = fakeredis.FakeStrictRedis
+
+from flask import Flask  # noqa: E402
+from models.database import db, configure_shards  # noqa: E402
+from migrate_db import migrate  # noqa: E402
+from archive import init_archive  # noqa: E402
+from livestate import init_live_store  # noqa: E402
+from server import register_routes  # noqa: E402
+import events  # noqa: E402
+
+
+def build_app(tmp_path):
+    app = Flask('make_guess_test')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'game.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        migrate(db.engine)
+        db.session.execute(db.text("INSERT INTO games (id, status) VALUES (1, 'in_progress')"))
+        db.session.execute(db.text("INSERT INTO player_scores (game_id, user_id, attempts, target_number) "
+                                   "VALUES (1, 7, 0, 50)"))
+        db.session.commit()
+    init_live_store(app)
+    init_archive(app)
+    register_routes(app)
+    return app
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = build_app(tmp_path)
+    yield app.test_client()
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def live_app(tmp_path, monkeypatch):
+    monkeypatch.setenv('LIVE_GAME_STATE', '1')
+    app = build_app(tmp_path)
+    yield app
+    app.extensions['live_store'].stop()
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.mark.parametrize('body', [
+    {"user_id": 7},
+    {"user_id": 7, "guess": "five"},
+    {"user_id": 7, "guess": None},
+    {"user_id": 7, "guess": [5]},
+    {"guess": 5},
+    {"user_id": "seven", "guess": 5},
+    [7, 5],
+])
+def test_malformed_guess_is_rejected_without_costing_an_attempt(client, body):
+    assert client.post('/guess/1', json=body).status_code == 400
+    response = client.post('/guess/1', json={"user_id": 7, "guess": 50})
+    assert response.status_code == 200
+    assert response.json["attempts"] == 1
+
+
+def test_integer_strings_are_coerced_like_batch_items(client):
+    response = client.post('/guess/1', json={"user_id": "7", "guess": "10"})
+    assert response.status_code == 200
+    assert response.json == {"message": "Higher!", "attempts": 1}
+
+
+def test_live_guess_that_cannot_be_compared_is_not_counted(live_app):
+    store = live_app.extensions['live_store']
+    with live_app.app_context():
+        live_game = store.get_or_load(1)
+        with pytest.raises(TypeError):
+            store.guess(live_game, 7, "5")
+        assert live_game.players[7]["attempts"] == 0
+
+    client = live_app.test_client()
+    assert client.post('/guess/1', json={"guess": 5}).status_code == 400
+    assert client.post('/guess/1', json={"user_id": 7, "guess": 50}).json["attempts"] == 1
+    with live_app.app_context():
+        store.flush()
+        assert db.session.execute(db.text("SELECT attempts FROM player_scores WHERE user_id = 7")).scalar() == 1
+
+
+def test_batch_items_after_the_winning_guess_are_not_counted(client):
+    batch = [{"game_id": 1, "user_id": 7, "guess": guess} for guess in (10, 50, 50, 20)]
+    results = client.post('/guess/batch', json=batch).json["results"]
+    assert [result["status"] for result in results] == [200, 200, 409, 409]
+    assert results[1]["attempts"] == 2
+
+    assert client.get('/game/status/1').json["players_scores"]["7"]["attempts"] == 2
+    stats = client.get('/stats/7').json
+    assert (stats["games_played"], stats["games_won"], stats["best_attempts"]) == (1, 1, 2)
+
+
+def test_live_guess_listeners_run_after_the_game_lock_is_released(live_app, monkeypatch):
+    store = live_app.extensions['live_store']
+    held = []
+    monkeypatch.setitem(events._listeners, "guess_applied",
+                        [lambda game_id, **_: held.append(store.get(game_id).lock.locked())])
+    with live_app.app_context():
+        live_game = store.get_or_load(1)
+        assert store.guess(live_game, 7, 10)[0]["message"] == "Higher!"
+    assert held == [False]
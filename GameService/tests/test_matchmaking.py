@@ -0,0 +1,86 @@
+"""Matchmaker against fakeredis with Lua support (pip install fakeredis lupa) and a scratch SQLite file."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import redis  # noqa: E402
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+redis.StrictRedis = fakeredis.FakeStrictRedis
+
+from flask import Flask  # noqa: E402
+from models.database import db, configure_shards  # noqa: E402
+import matchmaking  # noqa: E402
+from matchmaking import Matchmaker, QUEUE_KEY, USER_KEY  # noqa: E402
+
+SKILLS = {1: 6.0, 2: 6.5, 3: 8.0, 4: 6.0}  # Buckets 3, 3, 4 and 3
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(matchmaking.time, 'time', clock.time)
+    return clock
+
+
+@pytest.fixture
+def matchmaker(tmp_path, clock):
+    app = Flask('matchmaking_test')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'game.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        client = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        matchmaker = Matchmaker(client, room_size=2, bucket_width=2, widen_after=10, max_widen=2,
+                                idle_timeout=30, max_wait=300)
+        matchmaker.skill_of = SKILLS.get
+        yield matchmaker
+        db.engine.dispose()
+
+
+def test_players_in_one_bucket_are_matched_on_join(matchmaker):
+    assert matchmaker.join(1) is None
+    assignment = matchmaker.join(2)
+    assert assignment["status"] == 'matched' and sorted(assignment["players"]) == [1, 2]
+    assert matchmaker.poll(1) == assignment
+    assert matchmaker.redis.zcard(QUEUE_KEY.format(bucket=3)) == 0
+
+
+def test_neighbouring_bucket_is_matched_once_a_player_waited_long_enough(matchmaker, clock):
+    assert matchmaker.join(1) is None
+    assert matchmaker.join(3) is None
+    clock.now += 9
+    assert matchmaker.poll(3)["status"] == 'waiting'
+    clock.now += 1
+    assert sorted(matchmaker.poll(3)["players"]) == [1, 3]
+
+
+def test_player_who_stopped_polling_is_dropped_instead_of_matched(matchmaker):
+    assert matchmaker.join(1) is None
+    assert 0 < matchmaker.redis.ttl(USER_KEY.format(user_id=1)) <= 30
+    matchmaker.redis.delete(USER_KEY.format(user_id=1))  # What the idle timeout does
+
+    assert matchmaker.join(2) is None
+    assert matchmaker.redis.zrange(QUEUE_KEY.format(bucket=3), 0, -1) == ['2']
+    assert sorted(matchmaker.join(4)["players"]) == [2, 4]
+
+
+def test_player_is_dropped_after_the_longest_wait(matchmaker, clock):
+    assert matchmaker.join(1) is None
+    clock.now += 301
+    assert matchmaker.poll(1) is None
+    assert matchmaker.redis.exists(USER_KEY.format(user_id=1)) == 0
+    assert matchmaker.join(1) is None  # Joining again queues the player afresh
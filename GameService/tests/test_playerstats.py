@@ -0,0 +1,70 @@
+"""Per-player statistics against a scratch SQLite file."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask  # noqa: E402
+from models.database import db, configure_shards  # noqa: E402
+from models.game import Game  # noqa: E402
+from models.playerscore import PlayerScore  # noqa: E402
+from playerstats import backfill, get_stats, record_completed_games  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask('playerstats_test')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'game.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.engine.dispose()
+
+
+def complete_game(winner_id, scores):
+    """Add a game with {user_id: attempts} and complete it the way the guess path does."""
+    game = Game(status='in_progress')
+    db.session.add(game)
+    db.session.flush()
+    for user_id, attempts in scores.items():
+        score = PlayerScore(game.id, user_id, 50)
+        score.attempts = attempts
+        db.session.add(score)
+    game.status, game.winner_id = 'completed', winner_id
+    db.session.flush()
+    record_completed_games([game.id])
+    db.session.commit()
+    return game.id
+
+
+def test_completed_games_are_added_to_every_players_stats(app):
+    complete_game(1, {1: 4, 2: 6})
+    complete_game(2, {1: 8, 2: 3})
+    complete_game(1, {1: 2})
+
+    stats = get_stats([1, 2, 3])
+    assert stats[1] == {"user_id": 1, "games_played": 3, "games_won": 2, "average_attempts": 4.67,
+                        "best_attempts": 2}
+    assert stats[2] == {"user_id": 2, "games_played": 2, "games_won": 1, "average_attempts": 4.5,
+                        "best_attempts": 3}
+    assert stats[3] == {"user_id": 3, "games_played": 0, "games_won": 0, "average_attempts": None,
+                        "best_attempts": None}
+
+
+def test_backfill_rebuilds_the_same_stats(app):
+    complete_game(1, {1: 4, 2: 6})
+    complete_game(2, {1: 8, 2: 3})
+    in_progress = Game(status='in_progress')
+    db.session.add(in_progress)
+    db.session.flush()
+    db.session.add(PlayerScore(in_progress.id, 1, 50))
+    db.session.commit()
+
+    incremental = get_stats([1, 2])
+    assert backfill() == {0: 2}
+    assert get_stats([1, 2]) == incremental
@@ -0,0 +1,77 @@
+"""Socket.IO game updates, in one process without a message queue, against a scratch SQLite file and fakeredis."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('ADMISSION_CONTROL', '0')
+
+import redis  # noqa: E402
+fakeredis = pytest.importorskip('fakeredis')
+redis.StrictRedis = fakeredis.FakeStrictRedis
+
+from flask import Flask  # noqa: E402
+from models.database import db, configure_shards  # noqa: E402
+from migrate_db import migrate  # noqa: E402
+from archive import init_archive  # noqa: E402
+from livestate import init_live_store  # noqa: E402
+from server import register_routes  # noqa: E402
+import realtime  # noqa: E402
+from realtime import NAMESPACE, init_realtime, socketio  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(realtime, 'MESSAGE_QUEUE', None)
+    app = Flask('realtime_test')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'game.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        migrate(db.engine)
+        app.game_id = db.session.execute(
+            db.text("INSERT INTO games (status) VALUES ('in_progress') RETURNING id")).scalar()
+        db.session.execute(db.text("INSERT INTO player_scores (game_id, user_id, attempts, target_number) "
+                                   "VALUES (:game_id, 7, 0, 50)"), {"game_id": app.game_id})
+        db.session.commit()
+    init_live_store(app)
+    init_archive(app)
+    register_routes(app)
+    init_realtime(app)
+    yield app
+    socketio.server = None  # Later tests run without Socket.IO attached, like scripts do
+    with app.app_context():
+        db.engine.dispose()
+
+
+def events(client):
+    return [(event["name"], event["args"][0]) for event in client.get_received(NAMESPACE)]
+
+
+def test_subscriber_gets_a_snapshot_then_every_guess(app):
+    socket = socketio.test_client(app, namespace=NAMESPACE)
+    socket.emit('subscribe', {"game_id": app.game_id}, namespace=NAMESPACE)
+    assert events(socket) == [('game_status', {"game_id": app.game_id, "status": "in_progress",
+                                               "players_scores": {"7": {"attempts": 0}}})]
+
+    http = app.test_client()
+    http.post(f'/guess/{app.game_id}', json={"user_id": 7, "guess": 10})
+    http.post(f'/guess/{app.game_id}', json={"user_id": 7, "guess": 50})
+    received = events(socket)
+    assert [name for name, _ in received] == ['guess', 'guess', 'game_status']
+    assert received[0][1]["attempts"] == 1
+    assert received[2][1] == {"game_id": app.game_id, "status": "completed", "winner_id": 7, "attempts": 2}
+
+    socket.emit('unsubscribe', {"game_id": app.game_id}, namespace=NAMESPACE)
+    http.post(f'/guess/{app.game_id}', json={"user_id": 7, "guess": 20})
+    assert events(socket) == []
+
+
+@pytest.mark.parametrize('data', [{}, {"game_id": "soon"}, {"game_id": 10 ** 12}])
+def test_bad_subscriptions_get_an_error(app, data):
+    socket = socketio.test_client(app, namespace=NAMESPACE)
+    socket.emit('subscribe', data, namespace=NAMESPACE)
+    assert [name for name, _ in events(socket)] == ['error']
@@ -0,0 +1,67 @@
+"""Background discovery registration, with retry delays shortened to milliseconds."""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import registration  # noqa: E402
+from registration import RegistrationWorker  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(registration, 'BACKOFF_BASE', 0.001)
+    monkeypatch.setattr(registration, 'BACKOFF_CAP', 0.01)
+
+
+class Discovery:
+    """Refuses the first `failures` registrations, then accepts every one."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.attempts = 0
+        self.deregistered = 0
+        self.heartbeats = threading.Semaphore(0)
+
+    def register(self):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError("discovery is starting")
+        self.heartbeats.release()
+        return True
+
+    def deregister(self):
+        self.deregistered += 1
+
+
+def test_registration_is_retried_then_repeated_as_a_heartbeat():
+    discovery = Discovery(failures=3)
+    worker = RegistrationWorker(discovery.register, discovery.deregister, heartbeat_interval=0.001).start()
+    assert worker.registered.wait(5)
+    for _ in range(2):
+        assert discovery.heartbeats.acquire(timeout=5)
+    worker.stop()
+    assert discovery.attempts >= 5 and discovery.deregistered == 1
+    assert not worker.registered.is_set()
+
+
+def test_stop_does_not_deregister_a_replica_that_never_registered():
+    discovery = Discovery(failures=10 ** 9)
+    worker = RegistrationWorker(discovery.register, discovery.deregister).start()
+    worker.stop()
+    assert discovery.deregistered == 0
+
+
+def test_only_the_registering_process_deregisters(monkeypatch):
+    discovery = Discovery(failures=0)
+    worker = RegistrationWorker(discovery.register, discovery.deregister, heartbeat_interval=60).start()
+    assert worker.registered.wait(5)
+    with monkeypatch.context() as forked:
+        forked.setattr(registration.os, 'getpid', lambda: -1)  # As in a forked gunicorn worker
+        worker.stop()
+    assert discovery.deregistered == 0
+    worker.stop()
+    assert discovery.deregistered == 1
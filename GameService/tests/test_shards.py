@@ -0,0 +1,87 @@
+"""Game database sharding against scratch SQLite files and fakeredis (pip install fakeredis)."""
+import os
+import sys
+import sqlite3
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('ADMISSION_CONTROL', '0')
+
+import redis  # noqa: E402
+fakeredis = pytest.importorskip('fakeredis')
+redis.StrictRedis = fakeredis.FakeStrictRedis
+
+from flask import Flask  # noqa: E402
+from models import database  # noqa: E402
+from models.database import (db, configure_shards, create_shards, shard_bind_key, shard_of, use_shard,  # noqa: E402
+                             SHARD_ID_SPAN)
+from models.game import Game  # noqa: E402
+from models.playerscore import PlayerScore  # noqa: E402
+from migrate_db import migrate  # noqa: E402
+from archive import init_archive  # noqa: E402
+from server import register_routes  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'SHARD_COUNT', 3)
+    app = Flask('shards_test')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'game.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        create_shards()
+        for engine in db.engines.values():
+            migrate(engine)
+    init_archive(app)
+    register_routes(app)
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    for shard in range(1, 3):
+        db.metadatas.pop(shard_bind_key(shard), None)  # init_app() registered them for every later app
+
+
+def add_game(shard, user_id=7):
+    with use_shard(shard):
+        game = Game(status='in_progress')
+        db.session.add(game)
+        db.session.flush()
+        db.session.add(PlayerScore(game.id, user_id, 50))
+        db.session.commit()
+        return game.id
+
+
+def test_shard_of_reads_the_shard_from_the_id(monkeypatch):
+    monkeypatch.setattr(database, 'SHARD_COUNT', 3)
+    assert shard_of(17) == 0
+    assert shard_of(SHARD_ID_SPAN + 1) == 1
+    assert shard_of(3 * SHARD_ID_SPAN - 1) == 2
+    assert shard_of(3 * SHARD_ID_SPAN) is None
+
+
+def test_each_shard_hands_out_ids_from_its_own_range(app, tmp_path):
+    with app.app_context():
+        ids = [add_game(shard) for shard in (0, 1, 2, 2)]
+        assert ids == [1, SHARD_ID_SPAN + 1, 2 * SHARD_ID_SPAN + 1, 2 * SHARD_ID_SPAN + 2]
+        create_shards()  # Running it again must not move a sequence back
+        assert add_game(2) == 2 * SHARD_ID_SPAN + 3
+
+    with sqlite3.connect(tmp_path / 'game_shard2.db') as conn:
+        assert conn.execute("SELECT count(*) FROM games").fetchone()[0] == 3
+    with sqlite3.connect(tmp_path / 'game.db') as conn:
+        assert conn.execute("SELECT max(id) FROM games").fetchone()[0] == 1
+
+
+def test_routes_read_and_write_the_shard_named_by_the_game_id(app):
+    with app.app_context():
+        game_id = add_game(1)
+    client = app.test_client()
+    assert client.post(f'/guess/{game_id}', json={"user_id": 7, "guess": 10}).json["attempts"] == 1
+    status = client.get(f'/game/status/{game_id}').json
+    assert status["game_id"] == game_id and status["players_scores"]["7"]["attempts"] == 1
+    assert client.get(f'/game/status/{3 * SHARD_ID_SPAN + 5}').status_code == 404
@@ -0,0 +1,18 @@
+"""Modules both services ship must stay identical: edit one copy, then copy it over the other."""
+import os
+
+import pytest
+
+SHARED_MODULES = ("circuitbreaker", "deadline", "tracing", "idempotency", "registration", "httpcache", "responses")
+
+SERVICES_DIR = os.path.join(os.path.dirname(__file__), '..', '..')
+
+
+@pytest.mark.parametrize('module', SHARED_MODULES)
+def test_module_matches_the_accounts_service_copy(module):
+    accounts_copy = os.path.join(SERVICES_DIR, 'AccountsService', f"{module}.py")
+    if not os.path.exists(accounts_copy):
+        pytest.skip("AccountsService is not checked out next to GameService")
+    with open(os.path.join(SERVICES_DIR, 'GameService', f"{module}.py"), 'rb') as game, \
+            open(accounts_copy, 'rb') as accounts:
+        assert game.read() == accounts.read(), f"GameService/{module}.py and AccountsService/{module}.py differ"
@@ -0,0 +1,82 @@
+"""Tournament seating and scoring, against a scratch SQLite file."""
+import os
+import sys
+from array import array
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask  # noqa: E402
+from models.database import db, configure_shards  # noqa: E402
+from tournaments import (TournamentError, advance_tournament, create_tournament, get_player,  # noqa: E402
+                         join_tournament, rank_round, snake_groups)
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask('tournaments_test')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'game.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.engine.dispose()
+
+
+def win_every_game(tournament_id, attempts):
+    """Complete each round game, won by its lowest seed, with attempts[user_id] for every player."""
+    players = db.session.execute(db.text(
+        "SELECT user_id, game_id FROM tournament_players WHERE tournament_id = :id AND eliminated_round IS NULL "
+        "ORDER BY seed"), {"id": tournament_id}).all()
+    winners = {}
+    for user_id, game_id in players:
+        winners.setdefault(game_id, user_id)
+        db.session.execute(db.text("UPDATE player_scores SET attempts = :attempts "
+                                   "WHERE game_id = :game_id AND user_id = :user_id"),
+                           {"attempts": attempts[user_id], "game_id": game_id, "user_id": user_id})
+    for game_id, user_id in winners.items():
+        db.session.execute(db.text("UPDATE games SET status = 'completed', winner_id = :user_id WHERE id = :id"),
+                           {"user_id": user_id, "id": game_id})
+    db.session.commit()
+
+
+def test_snake_groups_deals_serpentine():
+    assert snake_groups(7, 3) == [0, 1, 2, 2, 1, 0, 0]
+
+
+def test_rank_round_orders_winners_by_attempts_then_seed():
+    seeds = array('q', [1, 2, 3, 4])
+    attempts = array('q', [5, 3, 3, 9])
+    won = array('b', [1, 1, 1, 0])
+    assert rank_round(seeds, attempts, won) == [1, 2, 0]
+
+
+def test_games_never_exceed_the_group_size(app):
+    tournament_id = create_tournament("Cup", group_size=4)["tournament_id"]
+    join_tournament(tournament_id, list(range(1, 8)))
+    summary = advance_tournament(tournament_id)
+    assert summary["games_created"] == 2
+    sizes = Counter(get_player(tournament_id, user_id)["game_id"] for user_id in range(1, 8))
+    assert sorted(sizes.values()) == [3, 4]
+
+
+def test_rounds_advance_until_one_player_is_left(app):
+    tournament_id = create_tournament("Cup", group_size=2)["tournament_id"]
+    join_tournament(tournament_id, [1, 2, 3, 4])
+    advance_tournament(tournament_id)
+    with pytest.raises(TournamentError):
+        advance_tournament(tournament_id)  # Round 1 games are still in progress
+
+    win_every_game(tournament_id, {1: 6, 2: 4, 3: 5, 4: 7})
+    summary = advance_tournament(tournament_id)
+    assert (summary["advanced"], summary["eliminated"], summary["games_created"]) == (2, 2, 1)
+    assert get_player(tournament_id, 2)["seed"] == 1  # Fewer attempts than player 1
+
+    win_every_game(tournament_id, {1: 3, 2: 8})
+    summary = advance_tournament(tournament_id)
+    assert summary["status"] == 'finished'
+    assert summary["winner_id"] == 2
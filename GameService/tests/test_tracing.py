@@ -0,0 +1,72 @@
+"""Trace context propagation and span recording, within one process."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import tracing  # noqa: E402
+from tracing import TRACE_HEADER  # noqa: E402
+
+TRACE_ID = 'ab' * 16
+PARENT_ID = 'cd' * 8
+
+
+@pytest.fixture(autouse=True)
+def in_memory(monkeypatch):
+    monkeypatch.setattr(tracing, 'TRACE_FILE', '')
+    monkeypatch.setattr(tracing, '_sampled_traces', tracing._RateLimit(100))
+    monkeypatch.setattr(tracing, '_buffer', tracing.collections.deque(maxlen=100))
+    yield
+    tracing._current.set(None)
+
+
+def test_sampled_caller_trace_is_continued_and_recorded():
+    tracing.start_request({TRACE_HEADER: f"00-{TRACE_ID}-{PARENT_ID}-01"}, 'POST /guess')
+    with tracing.span('validate', game_id=5) as outer:
+        with tracing.span('lookup'):
+            downstream = tracing.outgoing_headers()[TRACE_HEADER]
+    tracing.end_request()
+
+    spans = {span["name"]: span for span in tracing.find_trace(TRACE_ID)}
+    assert set(spans) == {'POST /guess', 'validate', 'lookup'}
+    assert spans['POST /guess']["parent_id"] == PARENT_ID
+    assert spans['validate']["parent_id"] == spans['POST /guess']["span_id"] == outer.parent_id
+    assert spans['lookup']["parent_id"] == outer.span_id
+    assert downstream == f"00-{TRACE_ID}-{spans['lookup']['span_id']}-01"
+    assert spans['validate']["attributes"] == {"game_id": 5}
+    assert [span["name"] for span in tracing.recent_traces(10)] == ['POST /guess']
+
+
+def test_unsampled_request_passes_its_trace_on_but_records_nothing():
+    tracing.start_request({TRACE_HEADER: f"00-{TRACE_ID}-{PARENT_ID}-00"}, 'GET /game/status')
+    with tracing.span('lookup') as span:
+        assert span is None
+    assert tracing.outgoing_headers()[TRACE_HEADER].startswith(f"00-{TRACE_ID}-")
+    assert tracing.outgoing_headers()[TRACE_HEADER].endswith('-00')
+    tracing.end_request()
+    assert tracing.find_trace(TRACE_ID) == []
+
+
+def test_sampled_traces_are_capped_per_second(monkeypatch):
+    monkeypatch.setattr(tracing, '_sampled_traces', tracing._RateLimit(2))
+    monkeypatch.setattr(tracing.time, 'monotonic', lambda: 1000.0)
+    sampled = []
+    for _ in range(3):
+        tracing.start_request({TRACE_HEADER: f"00-{TRACE_ID}-{PARENT_ID}-01"}, 'GET /')
+        sampled.append(tracing._current.get().trace.sampled)
+        tracing.end_request()
+    assert sampled == [True, True, False]
+
+
+def test_spans_beyond_the_limit_are_only_counted(monkeypatch):
+    monkeypatch.setattr(tracing, 'MAX_SPANS_PER_TRACE', 3)
+    tracing.start_request({TRACE_HEADER: f"00-{TRACE_ID}-{PARENT_ID}-01"}, 'GET /')
+    for index in range(4):
+        with tracing.span(f"query {index}"):
+            pass
+    tracing.end_request()
+    spans = tracing.find_trace(TRACE_ID)
+    assert [span["name"] for span in spans] == ['GET /', 'query 0', 'query 1', 'query 2']
+    assert spans[0]["attributes"] == {"dropped_spans": 1}
@@ -0,0 +1,240 @@
+# tournaments.py
+import os
+import time
+import random
+from array import array
+from itertools import compress, repeat
+from operator import add, eq, mul
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models.database import db, new_game_shard, shard_of, use_shard
+from models.game import Game
+from models.playerscore import PlayerScore
+from models.tournament import Tournament
+from models.tournamentplayer import TournamentPlayer
+
+# Configuration Constants
+DEFAULT_GROUP_SIZE = int(os.getenv('TOURNAMENT_GROUP_SIZE', '4'))  # Players per game in a round
+MAX_GROUP_SIZE = 16
+MAX_JOIN_BATCH = 1000  # Most users added by one join call
+SEED_SCALE = 1 << 32  # Attempts dominate the ranking key, the previous seed breaks ties
+
+
+class TournamentError(Exception):
+    """A tournament request that cannot be applied. status_code is the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=409):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def rank_round(seeds, attempts, won):
+    """Positions of the players going through to the next round, best first.
+
+    Arguments are equal-length arrays with one slot per player. Game winners
+    go through, ordered by fewest attempts and then by their previous seed.
+    The key (attempts * SEED_SCALE + seed) is built into an array with map()
+    and operator functions, so no Python-level function runs per player;
+    the winners' positions are then sorted by it with sorted().
+    """
+    keys = array('q', map(add, map(mul, attempts, repeat(SEED_SCALE)), seeds))
+    return sorted(compress(range(len(keys)), won), key=keys.__getitem__)
+
+
+def snake_groups(players, groups):
+    """Group number for each seed position, serpentine (0, 1, .., n-1, n-1, .., 0) to spread strong seeds."""
+    period = list(range(groups)) + list(range(groups - 1, -1, -1))
+    return (period * (players // len(period) + 1))[:players]
+
+
+def _tournament_shard(tournament_id):
+    shard = shard_of(tournament_id)
+    if shard is None:
+        raise TournamentError("Tournament not found", 404)
+    return shard
+
+
+def _load(tournament_id):
+    tournament = db.session.execute(
+        select(Tournament.id, Tournament.name, Tournament.status, Tournament.round, Tournament.group_size,
+               Tournament.winner_id)
+        .where(Tournament.id == tournament_id)
+    ).first()
+    if tournament is None:
+        raise TournamentError("Tournament not found", 404)
+    return tournament
+
+
+def create_tournament(name, group_size=DEFAULT_GROUP_SIZE):
+    """New tournament open for registration. Its games are created in the same shard as it."""
+    with use_shard(new_game_shard()):
+        tournament = Tournament(name=name, status='registering', round=0, group_size=group_size,
+                                created_at=time.time())
+        db.session.add(tournament)
+        db.session.commit()
+        tournament_id = tournament.id
+    return get_tournament(tournament_id)
+
+
+def join_tournament(tournament_id, user_ids):
+    """Register players (joining twice is a no-op). Returns the tournament summary."""
+    with use_shard(_tournament_shard(tournament_id)):
+        if _load(tournament_id).status != 'registering':
+            raise TournamentError("Registration is closed, the tournament has started")
+        db.session.execute(
+            sqlite_insert(TournamentPlayer).on_conflict_do_nothing(),
+            [{"tournament_id": tournament_id, "user_id": user_id} for user_id in dict.fromkeys(user_ids)]
+        )
+        db.session.commit()
+    return get_tournament(tournament_id)
+
+
+def advance_tournament(tournament_id, force=False):
+    """Score the current round and schedule the next one; the first call starts round 1.
+
+    Everything happens in one transaction on the tournament's shard. A round
+    with unfinished games is only scored with force, and then nobody from
+    those games goes through.
+    """
+    with use_shard(_tournament_shard(tournament_id)):
+        tournament = _load(tournament_id)
+        if tournament.status == 'finished':
+            raise TournamentError("Tournament already finished")
+        current = tournament.round
+        try:
+            # Claim the round first, a concurrent advance of the same round then updates nothing
+            claimed = db.session.execute(
+                update(Tournament).where(Tournament.id == tournament_id, Tournament.round == current)
+                .values(round=current + 1, status='running')
+            ).rowcount
+            if not claimed:
+                raise TournamentError("Tournament is being advanced by another request")
+
+            if current == 0:
+                advancing = db.session.execute(
+                    select(TournamentPlayer.user_id).where(TournamentPlayer.tournament_id == tournament_id)
+                    .order_by(TournamentPlayer.id)
+                ).scalars().all()
+                if len(advancing) < 2:
+                    raise TournamentError("A tournament needs at least 2 players")
+                eliminated = 0
+            else:
+                advancing, eliminated = _score_round(tournament_id, current, force)
+
+            if len(advancing) > 1:
+                games = _schedule_round(tournament_id, advancing, tournament.group_size)
+            else:
+                games = 0
+                db.session.execute(
+                    update(Tournament).where(Tournament.id == tournament_id)
+                    .values(status='finished', round=current, winner_id=advancing[0] if advancing else None)
+                )
+                db.session.execute(
+                    update(TournamentPlayer)
+                    .where(TournamentPlayer.tournament_id == tournament_id, TournamentPlayer.user_id.in_(advancing))
+                    .values(seed=1, game_id=None, eliminated_round=None)
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    summary = get_tournament(tournament_id)
+    summary.update(advanced=len(advancing), eliminated=eliminated, games_created=games)
+    return summary
+
+
+def _score_round(tournament_id, current, force):
+    """(user_ids going through in seed order, number eliminated). Marks everyone else eliminated."""
+    rows = db.session.execute(
+        select(TournamentPlayer.user_id, TournamentPlayer.seed, TournamentPlayer.game_id,
+               PlayerScore.attempts, Game.winner_id, Game.status)
+        .join(PlayerScore, (PlayerScore.game_id == TournamentPlayer.game_id)
+              & (PlayerScore.user_id == TournamentPlayer.user_id))
+        .join(Game, Game.id == TournamentPlayer.game_id)
+        .where(TournamentPlayer.tournament_id == tournament_id, TournamentPlayer.eliminated_round.is_(None))
+    ).all()
+    if not rows:
+        return [], 0
+    # One tuple per column; every step below works on whole columns
+    user_ids, seeds, game_ids, attempts, winner_ids, statuses = zip(*rows)
+    unfinished = len(set(compress(game_ids, (status != 'completed' for status in statuses))))
+    if unfinished and not force:
+        raise TournamentError(f"{unfinished} games of round {current} are still in progress")
+
+    order = rank_round(array('q', seeds), array('q', attempts), array('b', map(eq, user_ids, winner_ids)))
+    db.session.execute(
+        update(TournamentPlayer)
+        .where(TournamentPlayer.tournament_id == tournament_id, TournamentPlayer.eliminated_round.is_(None))
+        .values(eliminated_round=current)
+    )
+    return list(map(user_ids.__getitem__, order)), len(rows) - len(order)
+
+
+def _schedule_round(tournament_id, user_ids, group_size):
+    """Create the round's games and player scores in bulk and seat the players. Returns the game count.
+
+    Enough games are created that none has more than group_size players;
+    snake_groups() then keeps their sizes within one of each other.
+    """
+    groups = -(-len(user_ids) // group_size)
+    game_ids = db.session.execute(
+        insert(Game).returning(Game.id, sort_by_parameter_order=True),
+        [{"status": "in_progress"}] * groups
+    ).scalars().all()
+    targets = [random.randint(1, 100) for _ in range(groups)]
+    seats = snake_groups(len(user_ids), groups)
+
+    db.session.execute(insert(PlayerScore), [
+        {"game_id": game_ids[group], "user_id": user_id, "attempts": 0, "target_number": targets[group]}
+        for user_id, group in zip(user_ids, seats)
+    ])
+    players = TournamentPlayer.__table__
+    db.session.execute(
+        update(players)
+        .where(players.c.tournament_id == tournament_id, players.c.user_id == bindparam('player'))
+        .values(seed=bindparam('new_seed'), game_id=bindparam('new_game'), eliminated_round=None),
+        [{"player": user_id, "new_seed": seed, "new_game": game_ids[group]}
+         for seed, (user_id, group) in enumerate(zip(user_ids, seats), start=1)]
+    )
+    return groups
+
+
+def get_tournament(tournament_id):
+    with use_shard(_tournament_shard(tournament_id)):
+        tournament = _load(tournament_id)
+        players, remaining, games = db.session.execute(
+            select(func.count(TournamentPlayer.id),
+                   func.count(TournamentPlayer.id).filter(TournamentPlayer.eliminated_round.is_(None)),
+                   func.count(TournamentPlayer.game_id.distinct())
+                   .filter(TournamentPlayer.eliminated_round.is_(None)))
+            .where(TournamentPlayer.tournament_id == tournament_id)
+        ).one()
+    return {
+        "tournament_id": tournament.id,
+        "name": tournament.name,
+        "status": tournament.status,
+        "round": tournament.round,
+        "group_size": tournament.group_size,
+        "players": players,
+        "remaining": remaining,
+        "round_games": games if tournament.status == 'running' else 0,
+        "winner_id": tournament.winner_id,
+    }
+
+
+def get_player(tournament_id, user_id):
+    """A player's seed and current game, or where they were eliminated."""
+    with use_shard(_tournament_shard(tournament_id)):
+        player = db.session.execute(
+            select(TournamentPlayer.seed, TournamentPlayer.game_id, TournamentPlayer.eliminated_round)
+            .where(TournamentPlayer.tournament_id == tournament_id, TournamentPlayer.user_id == user_id)
+        ).first()
+    if player is None:
+        raise TournamentError(f"User {user_id} is not part of this tournament", 404)
+    return {
+        "tournament_id": tournament_id,
+        "user_id": user_id,
+        "seed": player.seed,
+        "game_id": player.game_id,
+        "eliminated_round": player.eliminated_round,
+    }
@@ -0,0 +1,304 @@
+# tracing.py
+import os
+import re
+import json
+import time
+import random
+import logging
+import threading
+import contextvars
+import collections
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Configuration Constants
+TRACE_HEADER = 'traceparent'  # W3C Trace Context: 00-<trace id>-<parent span id>-<flags>
+TRACE_ID_HEADER = 'X-Trace-Id'  # Set on sampled responses, the id to look up under /internal/traces
+SERVICE_NAME = os.getenv('SERVICE_NAME', 'unknown')
+SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))  # Share of requests without a sampled parent traced
+MAX_TRACES_PER_SECOND = int(os.getenv('TRACE_MAX_PER_SECOND', '20'))  # Per process, sampled parents included
+MAX_SPANS_PER_TRACE = 256  # Spans beyond this (an N+1 loop, say) are only counted
+BUFFER_SPANS = int(os.getenv('TRACE_BUFFER_SPANS', '20000'))  # Spans kept in memory for /internal/traces
+TRACE_FILE = os.getenv('TRACE_FILE', '')  # Also append spans here as JSON lines, shared by all workers
+TRACE_FILE_MAX_BYTES = 64 * 1024 * 1024  # The file is moved to TRACE_FILE.1 beyond this
+TRACE_FILE_SCAN_BYTES = 16 * 1024 * 1024  # Lookups read at most this much of the end of the file
+MAX_STATEMENT_LENGTH = 200  # SQL kept per span
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_current = contextvars.ContextVar('trace_span', default=None)  # Innermost open Span of this request
+_buffer = collections.deque(maxlen=BUFFER_SPANS)
+_buffer_lock = threading.Lock()
+_file_lock = threading.Lock()
+_sqlalchemy_traced = False
+
+
+class _Trace:
+    """The spans one request records, handed to the buffer together when it ends."""
+
+    __slots__ = ('trace_id', 'sampled', 'spans', 'dropped')
+
+    def __init__(self, trace_id, sampled):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans = []
+        self.dropped = 0
+
+    def finish(self, span, keep=False):
+        """Record the finished span, unless the trace is full; keep=True records it regardless."""
+        span.duration_ms = (time.perf_counter() - span.started) * 1000
+        if keep or len(self.spans) < MAX_SPANS_PER_TRACE:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'start', 'started', 'duration_ms',
+                 'attributes', 'error')
+
+    def __init__(self, trace, parent_id, name, kind, attributes=None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.duration_ms = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    def to_dict(self):
+        return {"trace_id": self.trace.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+                "service": SERVICE_NAME, "name": self.name, "kind": self.kind, "start": self.start,
+                "duration_ms": self.duration_ms, "attributes": self.attributes, "error": self.error}
+
+
+class _RateLimit:
+    """At most `limit` admissions per wall-clock second."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.second = None
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        second = int(time.monotonic())
+        with self.lock:
+            if second != self.second:
+                self.second, self.count = second, 0
+            if self.count >= self.limit:
+                return False
+            self.count += 1
+            return True
+
+
+_sampled_traces = _RateLimit(MAX_TRACES_PER_SECOND)
+
+
+def start_request(headers, name):
+    """Open the span of the current request, continuing the caller's trace if it sent TRACE_HEADER.
+
+    A caller's sampling decision is kept, so a trace is recorded in every
+    service or in none; requests arriving without one are sampled at
+    SAMPLE_RATE. Either way MAX_TRACES_PER_SECOND bounds the work. An
+    unsampled request still passes its trace id on, but records nothing.
+    """
+    match = TRACEPARENT.match(headers.get(TRACE_HEADER, ''))
+    if match and match.group(1) != '0' * 32:
+        trace_id, parent_id, sampled = match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1
+    else:
+        trace_id, parent_id, sampled = os.urandom(16).hex(), None, random.random() < SAMPLE_RATE
+    sampled = sampled and _sampled_traces.allow()
+    _current.set(Span(_Trace(trace_id, sampled), parent_id, name, 'server'))
+
+
+def end_request(error=None):
+    """Close the request's span and keep what the request recorded, if it was sampled."""
+    root = _current.get()
+    _current.set(None)
+    if root is None or not root.trace.sampled:
+        return
+    trace = root.trace
+    if error is not None:
+        root.error = repr(error)
+    if trace.dropped:
+        root.attributes['dropped_spans'] = trace.dropped
+    trace.finish(root, keep=True)  # Lookups and recent_traces() start from the request span
+    with _buffer_lock:
+        _buffer.extend(trace.spans)
+    if TRACE_FILE:
+        _append_to_file(trace.spans)
+
+
+def tag_response(response):
+    """Record the response status on the request's span and tell the caller which trace it is in."""
+    root = _current.get()
+    if root is not None and root.trace.sampled:
+        root.attributes['status'] = response.status_code
+        response.headers[TRACE_ID_HEADER] = root.trace.trace_id
+    return response
+
+
+class span:
+    """Context manager timing a block as a child of the innermost open span.
+
+    Spans opened inside it become its children. Outside a sampled request it
+    records nothing and yields None.
+    """
+
+    __slots__ = ('name', 'kind', 'attributes', 'span', 'token')
+
+    def __init__(self, name, kind='internal', **attributes):
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.span = None
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is None or not parent.trace.sampled:
+            return None
+        self.span = Span(parent.trace, parent.span_id, self.name, self.kind, self.attributes)
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is None:
+            return
+        _current.reset(self.token)
+        if exc is not None:
+            self.span.error = repr(exc)
+        self.span.trace.finish(self.span)
+
+
+def outgoing_headers():
+    """Headers continuing the current trace in the service being called, from the innermost open span."""
+    span = _current.get()
+    if span is None:
+        return {}
+    flags = '01' if span.trace.sampled else '00'
+    return {TRACE_HEADER: f"00-{span.trace.trace_id}-{span.span_id}-{flags}"}
+
+
+def _leaf(func, name, attributes=None):
+    """Call func(), recorded as a span without children when the request is sampled."""
+    parent = _current.get()
+    if parent is None or not parent.trace.sampled:
+        return func()
+    child = Span(parent.trace, parent.span_id, name, 'client', attributes)
+    try:
+        return func()
+    except BaseException as e:
+        child.error = repr(e)
+        raise
+    finally:
+        parent.trace.finish(child)
+
+
+def trace_redis(client):
+    """Record every command, script and pipeline the Redis client runs for a sampled request."""
+    execute_command = client.execute_command
+    pipeline = client.pipeline
+
+    def traced_execute_command(*args, **options):
+        return _leaf(lambda: execute_command(*args, **options), f"redis {args[0]}")
+
+    def traced_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def traced_execute(*execute_args, **execute_kwargs):
+            commands = [str(command[0][0]) for command in pipe.command_stack]
+            return _leaf(lambda: execute(*execute_args, **execute_kwargs), "redis PIPELINE",
+                         {"commands": " ".join(commands)})
+
+        pipe.execute = traced_execute
+        return pipe
+
+    client.execute_command = traced_execute_command
+    client.pipeline = traced_pipeline
+    return client
+
+
+def trace_sqlalchemy():
+    """Record every statement run for a sampled request, on any engine."""
+    global _sqlalchemy_traced
+    if _sqlalchemy_traced:
+        return
+    _sqlalchemy_traced = True
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _statement_started(conn, cursor, statement, parameters, context, executemany):
+        parent = _current.get()
+        if parent is None or not parent.trace.sampled or context is None:
+            return
+        context.trace_span = Span(parent.trace, parent.span_id, statement.lstrip().split(' ', 1)[0].upper(),
+                                  'client', {"db": os.path.basename(conn.engine.url.database or ''),
+                                             "statement": statement[:MAX_STATEMENT_LENGTH]})
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+        child = getattr(context, 'trace_span', None)
+        if child is not None:
+            context.trace_span = None
+            child.trace.finish(child)
+
+    @event.listens_for(Engine, 'handle_error')
+    def _statement_failed(exception_context):
+        child = getattr(exception_context.execution_context, 'trace_span', None)
+        if child is not None:
+            exception_context.execution_context.trace_span = None
+            child.error = repr(exception_context.original_exception)
+            child.trace.finish(child)
+
+
+def _append_to_file(spans):
+    lines = "".join(json.dumps(span.to_dict()) + "\n" for span in spans)
+    try:
+        with _file_lock:
+            # Workers rotating at the same moment can lose a batch; this is a debugging aid, not a log of record
+            if os.path.exists(TRACE_FILE) and os.path.getsize(TRACE_FILE) > TRACE_FILE_MAX_BYTES:
+                os.replace(TRACE_FILE, f"{TRACE_FILE}.1")
+            with open(TRACE_FILE, 'a') as f:
+                f.write(lines)
+    except OSError as e:
+        logging.warning(f"Could not write spans to {TRACE_FILE}: {e}")
+
+
+def _spans_in_file():
+    """Span dicts from the end of TRACE_FILE, oldest first."""
+    try:
+        with open(TRACE_FILE, 'rb') as f:
+            f.seek(max(0, os.path.getsize(TRACE_FILE) - TRACE_FILE_SCAN_BYTES))
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    spans = []
+    for line in lines:
+        try:
+            spans.append(json.loads(line))
+        except ValueError:
+            continue  # The partial first line, or a batch being written
+    return spans
+
+
+def recorded_spans():
+    """Every span still held, oldest first: TRACE_FILE's (all workers) when set, else this process's."""
+    if TRACE_FILE:
+        return _spans_in_file()
+    with _buffer_lock:
+        return [span.to_dict() for span in _buffer]
+
+
+def find_trace(trace_id):
+    """The spans of one trace recorded by this service, in start order."""
+    return sorted((span for span in recorded_spans() if span["trace_id"] == trace_id), key=lambda s: s["start"])
+
+
+def recent_traces(limit, min_ms=0):
+    """Request spans of the latest traces taking at least min_ms, newest first."""
+    requests = [span for span in recorded_spans() if span["kind"] == 'server' and span["duration_ms"] >= min_ms]
+    return requests[::-1][:limit]
@@ -0,0 +1,4 @@
+# wsgi.py -- entry point for gunicorn (see gunicorn.conf.py)
+from app import create_app
+
+app = create_app()
@@ -1,5 +1,7 @@
 const express = require('express');
 const axios = require('axios');
+const crypto = require('crypto');
+const { AsyncLocalStorage } = require('async_hooks');
 const rateLimit = require('express-rate-limit');
 
 const app = express();
@@ -14,6 +16,37 @@ const limiter = rateLimit({
 });
 app.use(limiter);
 
+// Tracing: a request continues the caller's W3C traceparent or starts a trace, sampled at
+// TRACE_SAMPLE_RATE. Every attempt at a service call is a span of it, and the services continue it
+const TRACE_SAMPLE_RATE = parseFloat(process.env.TRACE_SAMPLE_RATE || '0.01');
+const MAX_GATEWAY_SPANS = 5000; // Attempt spans kept in memory for /traces/:trace_id
+const TRACEPARENT = /^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$/;
+const traceContext = new AsyncLocalStorage();
+const gatewaySpans = [];
+
+const randomHex = (bytes) => crypto.randomBytes(bytes).toString('hex');
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Wait before retrying a 408, or a 409 for an Idempotency-Key whose first attempt is still running
+const RETRY_BACKOFF_MS = 250;
+
+const recordSpan = (span) => {
+    if (gatewaySpans.push(span) > MAX_GATEWAY_SPANS) {
+        gatewaySpans.shift();
+    }
+};
+
+app.use((req, res, next) => {
+    const match = TRACEPARENT.exec(req.get('traceparent') || '');
+    const trace = match
+        ? { traceId: match[1], parentId: match[2], sampled: (parseInt(match[3], 16) & 1) === 1 }
+        : { traceId: randomHex(16), parentId: null, sampled: Math.random() < TRACE_SAMPLE_RATE };
+    if (trace.sampled) {
+        res.set('X-Trace-Id', trace.traceId);
+    }
+    traceContext.run(trace, next);
+});
+
 const getServiceURLs = async (serviceNameBase, maxIndex = 3) => {
     const serviceURLs = [];
     for (let i = 1; i <= maxIndex; i++) {
@@ -44,22 +77,58 @@ const tryServiceCall = async (serviceNameBase, url, method, data, retriesPerInst
         return { success: false, error: `No reachable instances for ${serviceNameBase}` };
     }
 
+    // Every retry of a write carries the same key, so the services apply it once and replay the result
+    const headers = { 'X-Request-Budget-Ms': String(timeout) };
+    if (method !== 'GET') {
+        headers['Idempotency-Key'] = crypto.randomUUID();
+    }
+
+    const trace = traceContext.getStore();
+    const flags = trace.sampled ? '01' : '00';
     let totalRetries = 0; // Counter for total retries
     for (let retry = 0; retry < retriesPerInstance; retry++) {
         for (const serviceURL of serviceURLs) {
             totalRetries++;
+            // Each attempt is its own span, so retries show up in the trace as separate requests
+            const span = {
+                trace_id: trace.traceId, span_id: randomHex(8), parent_id: trace.parentId, service: 'gateway',
+                name: `${method} ${serviceNameBase}`, kind: 'client', start: Date.now() / 1000, duration_ms: null,
+                attributes: { url: `${serviceURL}${url}`, attempt: totalRetries }, error: null,
+            };
+            const started = process.hrtime.bigint();
+            let backoff = false;
             try {
-                console.log(`Trying service instance: ${serviceURL}, Retry #${totalRetries}`);
+                console.log(`Trying service instance: ${serviceURL}, Retry #${totalRetries}, trace ${trace.traceId}`);
                 const response = await axios({
                     method,
                     url: `${serviceURL}${url}`,
                     data,
                     timeout,
+                    // The budget header makes the service stop once this attempt has timed out here
+                    headers: { ...headers, traceparent: `00-${trace.traceId}-${span.span_id}-${flags}` },
                 });
                 console.log(`Service call succeeded after ${totalRetries} retries.`);
+                span.attributes.status = response.status;
                 return { success: true, data: response.data }; // Return successful response
             } catch (error) {
                 console.error(`Error with ${serviceURL} (Retry #${totalRetries}): ${error.message}`);
+                span.error = error.message;
+                const status = error.response?.status;
+                // A 409 with Retry-After is the idempotency layer saying an earlier attempt is still running
+                backoff = status === 408 || (status === 409 && Boolean(error.response.headers['retry-after']));
+                if (status >= 400 && status < 500 && !backoff) {
+                    // The service answered: the request itself was refused (e.g. 429 from admission control).
+                    // Another instance would say the same, and retrying adds the load it is shedding
+                    throw error;
+                }
+            } finally {
+                span.duration_ms = Number(process.hrtime.bigint() - started) / 1e6;
+                if (trace.sampled) {
+                    recordSpan(span);
+                }
+            }
+            if (backoff) {
+                await sleep(RETRY_BACKOFF_MS);
             }
         }
     }
@@ -68,6 +137,18 @@ const tryServiceCall = async (serviceNameBase, url, method, data, retriesPerInst
     return { success: false, error: `All instances of ${serviceNameBase} failed.` };
 };
 
+// Pass a service's 4xx on with its body and Retry-After; anything else is the gateway's own failure
+const sendServiceError = (res, error, msg = error.message) => {
+    if (!error.response) {
+        return res.status(500).json({ msg });
+    }
+    const retryAfter = error.response.headers['retry-after'];
+    if (retryAfter) {
+        res.set('Retry-After', retryAfter);
+    }
+    res.status(error.response.status).json(error.response.data);
+};
+
 // Account Sign-up endpoint
 app.post('/accounts/sign-up', async (req, res) => {
     try {
@@ -77,7 +158,7 @@ app.post('/accounts/sign-up', async (req, res) => {
         res.status(201).json(data);
     } catch (error) {
         console.error(error); // Log the error for further investigation
-        res.status(500).json({ msg: `All instances of accounts_service_ failed: ${error.message}` });
+        sendServiceError(res, error, `All instances of accounts_service_ failed: ${error.message}`);
     }
 });
 
@@ -88,7 +169,7 @@ app.post('/accounts/login', async (req, res) => {
         const data = await tryServiceCall(serviceNameBase, '/api/users/login', 'POST', req.body);
         res.status(200).json(data);
     } catch (error) {
-        res.status(error.response?.status || 500).json({ msg: error.message });
+        sendServiceError(res, error);
     }
 });
 
@@ -99,7 +180,7 @@ app.post('/game/start/:user_id', async (req, res) => {
         const data = await tryServiceCall(serviceNameBase, `/start-game/${req.params.user_id}`, 'POST', req.body);
         res.status(201).json(data);
     } catch (error) {
-        res.status(error.response?.status || 500).json({ msg: error.message });
+        sendServiceError(res, error);
     }
 });
 
@@ -110,7 +191,7 @@ app.post('/game/guess/:game_id', async (req, res) => {
         const data = await tryServiceCall(serviceNameBase, `/guess/${req.params.game_id}`, 'POST', req.body);
         res.status(200).json(data);
     } catch (error) {
-        res.status(error.response?.status || 500).json({ msg: error.message });
+        sendServiceError(res, error);
     }
 });
 
@@ -121,7 +202,7 @@ app.get('/game/status/:game_id', async (req, res) => {
         const data = await tryServiceCall(serviceNameBase, `/game/status/${req.params.game_id}`, 'GET');
         res.status(200).json(data);
     } catch (error) {
-        res.status(error.response?.status || 500).json({ msg: error.message });
+        sendServiceError(res, error);
     }
 });
 
@@ -143,6 +224,25 @@ app.get('/service-status', async (req, res) => {
     }
 });
 
+// Every span of a trace: the gateway's attempts plus what each game and accounts instance recorded
+app.get('/traces/:trace_id', async (req, res) => {
+    const traceId = req.params.trace_id;
+    const spans = gatewaySpans.filter((span) => span.trace_id === traceId);
+    const serviceURLs = [...await getServiceURLs('game_service_'), ...await getServiceURLs('accounts_service_')];
+    const results = await Promise.allSettled(serviceURLs.map((serviceURL) =>
+        axios.get(`${serviceURL}/internal/traces`, { params: { trace_id: traceId }, timeout: 2000 })));
+    for (const result of results) {
+        if (result.status === 'fulfilled') {
+            spans.push(...result.value.data.spans);
+        }
+    }
+    if (spans.length === 0) {
+        return res.status(404).json({ msg: `No spans recorded for trace ${traceId}` });
+    }
+    spans.sort((a, b) => a.start - b.start);
+    res.status(200).json({ trace_id: traceId, spans });
+});
+
 // Gateway status endpoint (simple health check)
 app.get('/status', (req, res) => {
     res.json({ status: 'Gateway is up and running!' });
@@ -0,0 +1,66 @@
+"""Cold-start check: create_app() must be serving in well under a second.
+
+Runs each service's create_app() in a fresh interpreter with service discovery
+pointed at a closed port (the worst case the old startup loop waited on
+forever), then times create_app() and the first GET /status. Exits non-zero
+when either service is over the budget.
+
+    python benchmarks/cold_start.py --budget 1.0
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+status = app.test_client().get('/status').status_code
+served = time.perf_counter()
+registered = app.extensions['registration'].registered.is_set()
+print("COLD_START " + json.dumps({"import_s": imported - start, "create_app_s": created - imported,
+                  "first_request_s": served - created, "status": status, "registered": registered}), flush=True)
+"""
+
+
+def probe(service, database_dir):
+    env = dict(os.environ,
+               DISCOVERY_HOST='http://127.0.0.1:9',  # nothing listens there
+               DATABASE_URI=f"sqlite:///{os.path.join(database_dir, service + '.db')}",
+               SOCKETIO_MESSAGE_QUEUE='')
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=os.path.join(ROOT, service), env=env,
+                            capture_output=True, text=True, timeout=60, check=True).stdout
+    # the registration thread may be logging to the same stdout
+    return json.loads(output.split("COLD_START ", 1)[1].splitlines()[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=float, default=1.0, help='seconds allowed for create_app + first request')
+    args = parser.parse_args()
+
+    over_budget = False
+    with tempfile.TemporaryDirectory() as database_dir:
+        for service in ('AccountsService', 'GameService'):
+            result = probe(service, database_dir)
+            ready = result["create_app_s"] + result["first_request_s"]
+            over_budget |= ready > args.budget or result["status"] != 200
+            print(f"{service:<16} imports {result['import_s']:.3f}s  create_app {result['create_app_s']:.3f}s  "
+                  f"first request {result['first_request_s']:.3f}s (HTTP {result['status']})  "
+                  f"registered={result['registered']}  -> ready in {ready:.3f}s")
+    if over_budget:
+        print(f"FAIL: a service took longer than {args.budget}s to serve its first request")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
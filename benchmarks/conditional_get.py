@@ -0,0 +1,134 @@
+"""Polling GET /game/status with and without ETags, with the stdlib and orjson encoders.
+
+Builds a GameService app against a scratch SQLite file and fakeredis
+(pip install fakeredis), loads --games games of --players players each, then
+runs a closed loop of requests through the Flask test client: a --write-ratio
+share are guesses, the rest status polls of random games. With ETags a poller
+sends back the ETag it last saw for that game, as a browser or the gateway
+would, and unchanged games answer 304 from one Redis read.
+
+    python benchmarks/conditional_get.py --games 1000 --requests 20000 --write-ratio 0.05
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'GameService'))
+os.environ.setdefault('ADMISSION_CONTROL', '0')  # The loop guesses far faster than the per-user limit
+
+import redis  # noqa: E402
+try:
+    import fakeredis
+except ImportError:
+    sys.exit("This benchmark needs fakeredis (pip install fakeredis)")
+redis.StrictRedis = fakeredis.FakeStrictRedis
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+from models.database import db, configure_shards  # noqa: E402
+from server import register_routes  # noqa: E402
+from migrate_db import migrate  # noqa: E402
+from archive import init_archive  # noqa: E402
+from responses import OrjsonProvider, init_responses, orjson  # noqa: E402
+
+queries = [0]
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_query(*args):
+    queries[0] += 1
+
+
+def build_app(path):
+    app = Flask('conditional_get_bench')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        migrate(db.engine)
+    init_archive(app)
+    init_responses(app)
+    register_routes(app)
+    return app
+
+
+def populate(path, games, players):
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO games (id, status) VALUES (?, 'in_progress')",
+                     ((i,) for i in range(1, games + 1)))
+    conn.executemany("INSERT INTO player_scores (game_id, user_id, attempts, target_number) VALUES (?, ?, 0, 100)",
+                     ((game, game * 100 + player) for game in range(1, games + 1) for player in range(players)))
+    conn.commit()
+    conn.close()
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def run(client, games, players, requests, write_ratio, use_etags, rng):
+    etags, poll_ms, sent = {}, [], 0
+    not_modified = 0
+    queries[0] = 0
+    for _ in range(requests):
+        game_id = rng.randint(1, games)
+        if rng.random() < write_ratio:
+            client.post(f'/guess/{game_id}', json={'user_id': game_id * 100 + rng.randrange(players), 'guess': 1})
+            continue
+        headers = {'If-None-Match': etags[game_id]} if use_etags and game_id in etags else {}
+        start = time.perf_counter()
+        response = client.get(f'/game/status/{game_id}', headers=headers)
+        poll_ms.append((time.perf_counter() - start) * 1000)
+        sent += len(response.data)
+        if response.status_code == 304:
+            not_modified += 1
+        elif response.headers.get('ETag'):
+            etags[game_id] = response.headers['ETag'].removeprefix('W/').strip('"')
+    polls = len(poll_ms)
+    return {"polls_per_s": polls / (sum(poll_ms) / 1000), "p50": statistics.median(poll_ms),
+            "p95": percentile(poll_ms, 95), "not_modified": not_modified / polls, "bytes": sent / polls,
+            "queries": queries[0] / polls}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--write-ratio', type=float, default=0.05, help="Share of requests that are guesses")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    encoders = [("stdlib", DefaultJSONProvider)] + ([("orjson", OrjsonProvider)] if orjson else [])
+    print(f"{'mode':<16} {'polls/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'304s':>6} {'bytes/poll':>11} "
+          f"{'queries/poll':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'game.db')
+        app = build_app(path)
+        populate(path, args.games, args.players)
+        client = app.test_client()
+        for encoder, provider in encoders:
+            app.json = provider(app)
+            for use_etags in (False, True):
+                # Same request sequence for every mode; the first pass also warms the caches
+                result = run(client, args.games, args.players, args.requests, args.write_ratio, use_etags,
+                             random.Random(args.seed))
+                print(f"{encoder + (' + etag' if use_etags else ''):<16} {result['polls_per_s']:9.0f} "
+                      f"{result['p50']:8.3f} {result['p95']:8.3f} {result['not_modified']:6.0%} "
+                      f"{result['bytes']:11.1f} {result['queries']:13.2f}")
+        with app.app_context():
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Latency of make_guess / get_game_status as player_scores grows.
+
+Builds a GameService app against a scratch SQLite file and fakeredis
+(pip install fakeredis), so Redis (ETag versions, admission control) costs no
+network round trips, bulk-loads N games with one player each, then times
+guesses and status reads through the Flask test client. With --compare-unindexed the same run is repeated after dropping
+ix_player_scores_game_user, which is what existing game.db files looked like
+before migration 1.
+
+    python benchmarks/guess_path.py --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'GameService'))
+os.environ.setdefault('ADMISSION_CONTROL', '0')  # The loop guesses far faster than the per-user limit
+
+import redis  # noqa: E402
+try:
+    import fakeredis
+except ImportError:
+    sys.exit("This benchmark needs fakeredis (pip install fakeredis)")
+redis.StrictRedis = fakeredis.FakeStrictRedis
+
+from flask import Flask  # noqa: E402
+from models.database import db  # noqa: E402
+from server import register_routes  # noqa: E402
+from migrate_db import migrate  # noqa: E402
+
+
+def build_app(path):
+    app = Flask('guess_path_bench')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        migrate()
+    register_routes(app)
+    return app
+
+
+def populate(path, size):
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO games (id, status) VALUES (?, 'in_progress')",
+                     ((i,) for i in range(1, size + 1)))
+    conn.executemany("INSERT INTO player_scores (game_id, user_id, attempts, target_number) VALUES (?, ?, 0, 100)",
+                     ((i, i) for i in range(1, size + 1)))
+    conn.commit()
+    conn.close()
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def measure(client, size, requests_per_size):
+    guess_ms, status_ms = [], []
+    for _ in range(requests_per_size):
+        game_id = random.randint(1, size)
+        start = time.perf_counter()
+        client.post(f'/guess/{game_id}', json={'user_id': game_id, 'guess': 1})
+        guess_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        client.get(f'/game/status/{game_id}')
+        status_ms.append((time.perf_counter() - start) * 1000)
+    return guess_ms, status_ms
+
+
+def report(label, size, guess_ms, status_ms):
+    print(f"{label:<10} {size:>10}  guess p50 {statistics.median(guess_ms):7.2f}ms "
+          f"p95 {percentile(guess_ms, 95):7.2f}ms  status p50 {statistics.median(status_ms):7.2f}ms "
+          f"p95 {percentile(status_ms, 95):7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--compare-unindexed', action='store_true')
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'game.db')
+            app = build_app(path)
+            populate(path, size)
+            client = app.test_client()
+
+            report('indexed', size, *measure(client, size, args.requests))
+            if args.compare_unindexed:
+                conn = sqlite3.connect(path)
+                conn.execute("DROP INDEX ix_player_scores_game_user")
+                conn.close()
+                report('unindexed', size, *measure(client, size, max(20, args.requests // 10)))
+            with app.app_context():
+                db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
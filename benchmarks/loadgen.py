@@ -0,0 +1,358 @@
+"""End-to-end load generator: register -> login -> start-game -> guess until correct -> status.
+
+Every virtual user runs that flow back to back (closed loop), guessing by
+binary search. Latency is recorded per endpoint and the summary (throughput,
+p50/p95/p99) is printed and written to a JSON file, so runs before and after a
+change can be compared with --baseline.
+
+Targets:
+
+    # Both apps in this process through the Flask test client. Discovery points
+    # at a closed port and Redis is fakeredis (pip install fakeredis) unless
+    # --redis is given. The game service's accounts lookups are answered by the
+    # in-process accounts app.
+    python benchmarks/loadgen.py --users 8 --duration 30
+
+    # A running stack, calling the services directly
+    python benchmarks/loadgen.py --accounts-url http://localhost:5001 --game-url http://localhost:5006
+
+    # A running stack through the gateway
+    python benchmarks/loadgen.py --gateway http://localhost:5004
+
+    python benchmarks/loadgen.py --output after.json --baseline before.json
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ENDPOINTS = ("register", "login", "start_game", "guess", "status")
+MAX_GUESSES = 10  # Binary search over 1-100 never needs more than 7
+
+# (method, path) per endpoint, relative to the accounts/game base URLs or to the gateway
+DIRECT_ROUTES = {
+    "register": ("POST", "{accounts}/api/users"),
+    "login": ("POST", "{accounts}/api/users/login"),
+    "start_game": ("POST", "{game}/start-game/{user_id}"),
+    "guess": ("POST", "{game}/guess/{game_id}"),
+    "status": ("GET", "{game}/game/status/{game_id}"),
+}
+GATEWAY_ROUTES = {
+    "register": ("POST", "{gateway}/accounts/sign-up"),
+    "login": ("POST", "{gateway}/accounts/login"),
+    "start_game": ("POST", "{gateway}/game/start/{user_id}"),
+    "guess": ("POST", "{gateway}/game/guess/{game_id}"),
+    "status": ("GET", "{gateway}/game/status/{game_id}"),
+}
+
+
+class HttpTransport:
+    """Calls a running stack, one keep-alive session per virtual user."""
+
+    def __init__(self, routes, bases, timeout=10):
+        self.routes = routes
+        self.bases = bases
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def call(self, endpoint, body=None, **params):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        method, path = self.routes[endpoint]
+        response = session.request(method, path.format(**self.bases, **params), json=body, timeout=self.timeout)
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        # The gateway wraps service responses as {"success": true, "data": {...}}
+        if isinstance(payload, dict) and "success" in payload and "data" in payload:
+            payload = payload["data"]
+        return response.status_code, payload
+
+
+class InProcessTransport:
+    """Calls the accounts and game apps through their Flask test clients."""
+
+    def __init__(self, accounts_app, game_app):
+        self.apps = {"accounts": accounts_app, "game": game_app}
+        self.local = threading.local()
+
+    def call(self, endpoint, body=None, **params):
+        clients = getattr(self.local, 'clients', None)
+        if clients is None:
+            clients = self.local.clients = {name: app.test_client() for name, app in self.apps.items()}
+        method, path = DIRECT_ROUTES[endpoint]
+        service = "accounts" if path.startswith("{accounts}") else "game"
+        url = path.format(accounts="", game="", **params)
+        response = clients[service].open(url, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+
+class _AccountsOverTestClient:
+    """Stands in for the game service's requests.Session, answered by the in-process accounts app."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def request(self, method, url, timeout=None, headers=None, json=None):
+        return self.app.test_client().open(urlsplit(url).path, method=method, headers=headers, json=json)
+
+    def close(self):
+        pass
+
+
+def _load_service(name, env):
+    """Import a service's app module and call create_app().
+
+    Both services use the same top-level module names (app, server, metrics,
+    models, ...), so the previous service's modules are dropped from
+    sys.modules first. Objects already created keep working through their own
+    module references.
+    """
+    from prometheus_client import REGISTRY
+    from prometheus_client.metrics import MetricWrapperBase
+
+    path = os.path.join(ROOT, name)
+    own_modules = {os.path.splitext(entry)[0] for entry in os.listdir(path)}
+    previous_metrics = sys.modules.get('metrics')
+    if previous_metrics is not None:
+        # The second service registers the same metric names again
+        for value in vars(previous_metrics).values():
+            if isinstance(value, MetricWrapperBase):
+                REGISTRY.unregister(value)
+    for module in list(sys.modules):
+        if module.split('.')[0] in own_modules:
+            del sys.modules[module]
+
+    os.environ.update(env)
+    # Left on sys.path: the password hashing pool imports credentials in its worker processes
+    sys.path.insert(0, path)
+    app = importlib.import_module('app').create_app()
+    return app, {module: sys.modules[module] for module in own_modules if module in sys.modules}
+
+
+def in_process_transport(workdir, redis_url):
+    import redis
+    if redis_url:
+        redis.StrictRedis = lambda *args, **kwargs: redis.Redis.from_url(
+            redis_url, decode_responses=kwargs.get('decode_responses', False))
+    else:
+        try:
+            import fakeredis
+        except ImportError:
+            sys.exit("In-process mode needs fakeredis (pip install fakeredis) or --redis redis://host:port/0")
+        redis.StrictRedis = fakeredis.FakeStrictRedis
+
+    common = {"DISCOVERY_HOST": "http://127.0.0.1:9",  # Nothing listens there, registration just retries
+              "SOCKETIO_MESSAGE_QUEUE": "",
+              "ADMISSION_CONTROL": "0"}  # Closed-loop users guess far faster than the per-user limit
+    accounts_app, _ = _load_service('AccountsService', dict(
+        common, DATABASE_URI=f"sqlite:///{os.path.join(workdir, 'user.db')}"))
+    game_app, game_modules = _load_service('GameService', dict(
+        common, DATABASE_URI=f"sqlite:///{os.path.join(workdir, 'game.db')}"))
+    game_modules['accounts_client'].accounts_client.session = _AccountsOverTestClient(accounts_app)
+    return InProcessTransport(accounts_app, game_app)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {endpoint: [] for endpoint in ENDPOINTS}
+        self.errors = {endpoint: 0 for endpoint in ENDPOINTS}
+        self.flows_completed = 0
+        self.flows_failed = 0
+        self.lock = threading.Lock()
+
+    def timed(self, transport, endpoint, expected, body=None, **params):
+        """Make one call; returns the payload, or None after counting an error."""
+        start = time.perf_counter()
+        try:
+            status, payload = transport.call(endpoint, body, **params)
+        except requests.exceptions.RequestException:
+            status, payload = None, None
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            if status in expected:
+                self.latencies[endpoint].append(elapsed)
+                return payload if payload is not None else {}
+            self.errors[endpoint] += 1
+        return None
+
+    def flow_done(self, completed):
+        with self.lock:
+            if completed:
+                self.flows_completed += 1
+            else:
+                self.flows_failed += 1
+
+
+def run_flow(transport, recorder, name, rng):
+    credentials = {"name": name, "password": "load-test-password"}
+    if recorder.timed(transport, "register", (200, 201), credentials) is None:
+        return False
+    login = recorder.timed(transport, "login", (200,), credentials)
+    if not login or "user_id" not in login:
+        return False
+    user_id = login["user_id"]
+
+    game = recorder.timed(transport, "start_game", (200, 201), {"target_number": rng.randint(1, 100)},
+                          user_id=user_id)
+    if not game or "game_id" not in game:
+        return False
+    game_id = game["game_id"]
+
+    low, high = 1, 100
+    for _ in range(MAX_GUESSES):
+        guess = (low + high) // 2
+        result = recorder.timed(transport, "guess", (200,), {"user_id": user_id, "guess": guess}, game_id=game_id)
+        if not result:
+            return False
+        message = result.get("message", "")
+        if message.startswith("Correct"):
+            break
+        if message.startswith("Higher"):
+            low = guess + 1
+        else:
+            high = guess - 1
+    else:
+        return False
+
+    return recorder.timed(transport, "status", (200,), game_id=game_id) is not None
+
+
+def virtual_user(transport, recorder, index, run_id, deadline, remaining):
+    rng = random.Random(f"{run_id}-{index}")
+    flow = 0
+    while time.perf_counter() < deadline:
+        if remaining is not None:
+            with recorder.lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+        recorder.flow_done(run_flow(transport, recorder, f"load-{run_id}-{index}-{flow}", rng))
+        flow += 1
+
+
+def percentile(samples, pct):
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))] if samples else None
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for endpoint in ENDPOINTS:
+        samples = sorted(recorder.latencies[endpoint])
+        endpoints[endpoint] = {
+            "requests": len(samples),
+            "errors": recorder.errors[endpoint],
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "mean_ms": round(statistics.fmean(samples), 3) if samples else None,
+            "p50_ms": round(percentile(samples, 50), 3) if samples else None,
+            "p95_ms": round(percentile(samples, 95), 3) if samples else None,
+            "p99_ms": round(percentile(samples, 99), 3) if samples else None,
+            "max_ms": round(samples[-1], 3) if samples else None,
+        }
+    return endpoints
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result, baseline=None):
+    print(f"{result['flows_completed']} flows completed, {result['flows_failed']} failed, "
+          f"{result['flows_per_second']:.1f} flows/s over {result['duration_s']:.1f}s ({result['target']})")
+    print(f"{'endpoint':<11} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for endpoint, stats in result["endpoints"].items():
+        if not stats["requests"]:
+            print(f"{endpoint:<11} {'-':>8} {'-':>8} {'-':>8} {'-':>8} {stats['errors']:>7}")
+            continue
+        line = (f"{endpoint:<11} {stats['throughput_rps']:>8.1f} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} "
+                f"{stats['p99_ms']:>8.2f} {stats['errors']:>7}")
+        before = (baseline or {}).get("endpoints", {}).get(endpoint)
+        if before and before.get("requests"):
+            line += (f"   vs baseline: req/s {_change(before['throughput_rps'], stats['throughput_rps'])}, "
+                     f"p50 {_change(before['p50_ms'], stats['p50_ms'])}, p99 {_change(before['p99_ms'], stats['p99_ms'])}")
+        print(line)
+
+
+def _change(before, after):
+    return f"{(after - before) / before * 100:+.0f}%" if before else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=8, help='Virtual users running flows concurrently')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+    parser.add_argument('--flows', type=int, default=None, help='Stop after this many flows (overall)')
+    parser.add_argument('--accounts-url', help='Accounts service base URL (with --game-url)')
+    parser.add_argument('--game-url', help='Game service base URL (with --accounts-url)')
+    parser.add_argument('--gateway', help='Gateway base URL')
+    parser.add_argument('--redis', help='Redis URL for in-process mode instead of fakeredis')
+    parser.add_argument('--output', default='loadgen-results.json')
+    parser.add_argument('--baseline', help='Earlier --output file to compare against')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.gateway:
+            transport, target = HttpTransport(GATEWAY_ROUTES, {"gateway": args.gateway.rstrip('/')}), args.gateway
+        elif args.accounts_url and args.game_url:
+            transport = HttpTransport(DIRECT_ROUTES, {"accounts": args.accounts_url.rstrip('/'),
+                                                      "game": args.game_url.rstrip('/')})
+            target = f"{args.accounts_url} + {args.game_url}"
+        elif args.accounts_url or args.game_url:
+            parser.error("--accounts-url and --game-url go together")
+        else:
+            transport, target = in_process_transport(workdir, args.redis), "in-process"
+
+        recorder = Recorder()
+        run_id = uuid.uuid4().hex[:8]
+        remaining = [args.flows] if args.flows else None
+        start = time.perf_counter()
+        users = [threading.Thread(target=virtual_user,
+                                  args=(transport, recorder, index, run_id, start + args.duration, remaining))
+                 for index in range(args.users)]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        elapsed = time.perf_counter() - start
+
+    result = {
+        "target": target,
+        "git_commit": git_commit(),
+        "started_at": time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(time.time() - elapsed)),
+        "users": args.users,
+        "duration_s": round(elapsed, 3),
+        "flows_completed": recorder.flows_completed,
+        "flows_failed": recorder.flows_failed,
+        "flows_per_second": round(recorder.flows_completed / elapsed, 2),
+        "endpoints": summarize(recorder, elapsed),
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    print_report(result, baseline)
+    with open(args.output, 'w') as output:
+        json.dump(result, output, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Login throughput per core at each password hashing cost.
+
+For every PBKDF2 iteration count, measures how many verifications one core can
+do (a login is one verification) and how many the CredentialHasher process
+pool sustains with --workers processes under --clients concurrent requests.
+
+    python benchmarks/password_hashing.py --iterations 50000,100000,200000,400000
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'AccountsService'))
+
+from credentials import CredentialHasher, _derive  # noqa: E402
+
+
+def per_core_rate(iterations, duration):
+    count, start = 0, time.perf_counter()
+    while time.perf_counter() - start < duration:
+        _derive("correct horse battery staple", b"0123456789abcdef", iterations)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def pool_rate(iterations, workers, clients, duration):
+    hasher = CredentialHasher(iterations=iterations, workers=workers, max_pending=clients)
+    stored = hasher.hash_password("correct horse battery staple")  # also warms the pool up
+    done = []
+    deadline = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            hasher.verify_password("correct horse battery staple", stored)
+            done.append(1)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    hasher.shutdown()
+    return len(done) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', default='50000,100000,200000,400000')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(f"{'iterations':>10}  {'ms/login':>8}  {'logins/s/core':>13}  {'pool logins/s':>13} ({args.workers} workers)")
+    for iterations in (int(i) for i in args.iterations.split(',')):
+        rate = per_core_rate(iterations, args.duration)
+        pooled = pool_rate(iterations, args.workers, args.clients, args.duration)
+        print(f"{iterations:>10}  {1000 / rate:8.1f}  {rate:13.1f}  {pooled:13.1f}")
+
+
+if __name__ == "__main__":
+    main()
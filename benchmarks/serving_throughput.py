@@ -0,0 +1,63 @@
+"""Closed-loop HTTP throughput against a running service.
+
+Each client thread keeps one keep-alive session and sends requests back to
+back for --duration seconds; the report is requests/s and latency percentiles.
+Used to compare `flask run` with the gunicorn setup in gunicorn.conf.py.
+
+    python benchmarks/serving_throughput.py http://localhost:5002/game/status/1 --clients 16
+    python benchmarks/serving_throughput.py http://localhost:5002/guess/1 --method POST \\
+        --json '{"user_id": 1, "guess": 1}'
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+
+import requests
+
+
+def run_client(url, method, body, deadline, latencies, errors):
+    session = requests.Session()
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, json=body, timeout=10)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+        except requests.exceptions.RequestException as e:
+            errors.append(str(e))
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('url')
+    parser.add_argument('--method', default='GET')
+    parser.add_argument('--json', default=None, help='request body for POST requests')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    body = json.loads(args.json) if args.json else None
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    clients = [threading.Thread(target=run_client, args=(args.url, args.method, body, deadline, latencies, errors))
+               for _ in range(args.clients)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+
+    if not latencies:
+        print(f"no successful requests, {len(errors)} errors")
+        return
+    latencies.sort()
+    print(f"{len(latencies) / args.duration:8.1f} req/s  p50 {statistics.median(latencies):6.1f}ms  "
+          f"p95 {latencies[int(len(latencies) * 0.95)]:6.1f}ms  p99 {latencies[int(len(latencies) * 0.99)]:6.1f}ms  "
+          f"errors {len(errors)}")
+
+
+if __name__ == "__main__":
+    main()
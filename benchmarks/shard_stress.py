@@ -0,0 +1,136 @@
+"""Guess throughput under write contention, by journal mode and shard count.
+
+Starts several processes (standing in for game_service replicas sharing one
+instance folder), each with several threads sending POST /guess/<id> through
+the Flask test client for a fixed time. Every run uses fresh database files
+under a scratch directory; games are spread evenly over the shards.
+
+    python benchmarks/shard_stress.py --shards 1,2,4 --journal delete,wal
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+GAME_SERVICE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'GameService')
+
+
+def build_app(directory):
+    # Imported here: GAME_DB_SHARDS and SQLITE_JOURNAL_MODE are read when models.database is imported
+    sys.path.insert(0, GAME_SERVICE)
+    from flask import Flask
+    from models.database import db, configure_shards, create_shards
+    from server import register_routes
+    from migrate_db import migrate
+
+    app = Flask('shard_stress')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(directory, "game.db")}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_shards(app)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        create_shards()
+        for engine in db.engines.values():
+            migrate(engine)
+    register_routes(app)
+    return app
+
+
+def populate(directory, shards, games_per_shard):
+    """Games with one player each, target 100, so the guesses below never finish them."""
+    from models.database import SHARD_ID_SPAN
+    game_ids = []
+    for shard in range(shards):
+        name = "game.db" if shard == 0 else f"game_shard{shard}.db"
+        ids = [shard * SHARD_ID_SPAN + i for i in range(1, games_per_shard + 1)]
+        conn = sqlite3.connect(os.path.join(directory, name))
+        conn.executemany("INSERT INTO games (id, status) VALUES (?, 'in_progress')", ((i,) for i in ids))
+        conn.executemany("INSERT INTO player_scores (game_id, user_id, attempts, target_number) VALUES (?, ?, 0, 100)",
+                         ((i, 1) for i in ids))
+        conn.commit()
+        conn.close()
+        game_ids.extend(ids)
+    return game_ids
+
+
+def replica(directory, game_ids, threads, duration, start_at, results):
+    app = build_app(directory)
+    counts = {"ok": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        ok = errors = 0
+        while time.time() < start_at:
+            time.sleep(0.001)
+        while time.time() < start_at + duration:
+            response = client.post(f'/guess/{random.choice(game_ids)}', json={'user_id': 1, 'guess': 1})
+            if response.status_code == 200:
+                ok += 1
+            else:
+                errors += 1
+        with lock:
+            counts["ok"] += ok
+            counts["errors"] += errors
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(counts)
+
+
+def run(shards, journal, processes, threads, duration, games_per_shard):
+    os.environ['GAME_DB_SHARDS'] = str(shards)
+    os.environ['SQLITE_JOURNAL_MODE'] = journal
+    with tempfile.TemporaryDirectory() as directory:
+        context = multiprocessing.get_context('spawn')  # Fresh interpreters pick up the settings above
+        setup = context.Process(target=build_app, args=(directory,))
+        setup.start()
+        setup.join()
+        sys.path.insert(0, GAME_SERVICE)
+        game_ids = populate(directory, shards, games_per_shard)
+
+        results = context.Queue()
+        start_at = time.time() + 3  # Let every replica finish importing before the clock starts
+        workers = [context.Process(target=replica, args=(directory, game_ids, threads, duration, start_at, results))
+                   for _ in range(processes)]
+        for process in workers:
+            process.start()
+        totals = {"ok": 0, "errors": 0}
+        for _ in workers:
+            counts = results.get()
+            totals["ok"] += counts["ok"]
+            totals["errors"] += counts["errors"]
+        for process in workers:
+            process.join()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shards', default='1,2,4')
+    parser.add_argument('--journal', default='delete,wal')
+    parser.add_argument('--processes', type=int, default=3, help='Replicas writing at once')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per replica')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--games-per-shard', type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{args.processes} replicas x {args.threads} threads, {args.duration:.0f}s per run")
+    print(f"{'journal':<8} {'shards':>6} {'guesses/s':>10} {'failed':>8}")
+    for journal in args.journal.split(','):
+        for shards in (int(value) for value in args.shards.split(',')):
+            totals = run(shards, journal, args.processes, args.threads, args.duration, args.games_per_shard)
+            print(f"{journal:<8} {shards:>6} {totals['ok'] / args.duration:>10.1f} {totals['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()